@@ -0,0 +1,171 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Performance tests for the blond_common.fitting.batch module, compared to
+fitting the profiles one by one with the blond_common.fitting.profile module
+
+:Authors: **Alexandre Lasheen**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import numpy as np
+import os
+import time
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.interfaces.beam.analytic_distribution import (
+    gaussian, binomialAmplitudeN)
+from blond_common.fitting.profile import gaussian_fit, binomial_amplitudeN_fit
+from blond_common.fitting.batch import batch_profile_fit
+
+
+class TestBatchFitting(object):
+
+    # Initialization ----------------------------------------------------------
+
+    def __init__(self, iterations=10, n_profiles=1000):
+        '''
+        We generate n_profiles noisy Gaussian and Binomial profiles with
+        random amplitudes and positions
+        '''
+
+        self.iterations = iterations
+        self.n_profiles = n_profiles
+
+        # Base time array
+        self.time_array = np.arange(0, 25e-9, 0.1e-9)
+
+        rng = np.random.default_rng(0)
+        amplitude = rng.uniform(0.8, 1.2, (n_profiles, 1))
+        position = rng.normal(12.5e-9, 1e-9, (n_profiles, 1))
+        noise = rng.normal(0, 0.01, (n_profiles, len(self.time_array)))
+
+        self.position = position[:, 0]
+        self.gaussian_profiles = gaussian(
+            self.time_array, amplitude, position, 2e-9) + noise
+        self.binom_profiles = binomialAmplitudeN(
+            self.time_array, amplitude, position, 7e-9, 2.7) + noise
+
+    def _find_tests(self):
+        '''
+        The routine find all the object attributes starting with test_*
+        '''
+
+        self.alltests = []
+        for att in dir(self):
+            if 'test_' in att:
+                self.alltests.append(att)
+
+    def run_tests(self):
+        '''
+        The routine to run all the tests
+        '''
+
+        if not hasattr(self, 'test_list'):
+            self._find_tests()
+
+        dict_results = {}
+
+        for test in self.alltests:
+            (mean_runtime, std_runtime,
+             mean_result, std_result) = self._runtest(
+                 getattr(self, test))
+            print('%s - Runtime: %.5e +- %.5e - Result: %.5e +- %.5e' %
+                  (test, mean_runtime, std_runtime, mean_result, std_result))
+            dict_results[test] = {'mean_runtime': mean_runtime,
+                                  'std_runtime': std_runtime,
+                                  'mean_result': mean_result,
+                                  'std_result': std_result}
+
+        return dict_results
+
+    # Test template -----------------------------------------------------------
+    def _runtest(self, test_function):
+
+        runtime = np.zeros(self.iterations)
+        result = np.zeros(self.iterations)
+
+        for iteration in range(self.iterations):
+
+            runtime[iteration], result[iteration] = test_function()
+
+        mean_runtime = np.mean(runtime)
+        std_runtime = np.std(runtime)
+        mean_result = np.mean(result)
+        std_result = np.std(result)
+
+        return mean_runtime, std_runtime, mean_result, std_result
+
+    # Tests for the Gaussian fit ----------------------------------------------
+
+    def test_gaussian_fit_loop(self):
+
+        t0 = time.perf_counter()
+        positions = [gaussian_fit(self.time_array, profile)[1]
+                     for profile in self.gaussian_profiles]
+        t1 = time.perf_counter()
+
+        runtime = t1-t0
+        result = np.std((np.array(positions)-self.position)/self.position)
+
+        return runtime, result
+
+    def test_gaussian_fit_batch(self):
+
+        t0 = time.perf_counter()
+        positions = batch_profile_fit(self.time_array, self.gaussian_profiles,
+                                      'gaussian')[0][:, 1]
+        t1 = time.perf_counter()
+
+        runtime = t1-t0
+        result = np.std((positions-self.position)/self.position)
+
+        return runtime, result
+
+    # Tests for the Binomial fit ----------------------------------------------
+
+    def test_binomial_amplitudeN_fit_loop(self):
+
+        t0 = time.perf_counter()
+        positions = [binomial_amplitudeN_fit(self.time_array, profile)[1]
+                     for profile in self.binom_profiles]
+        t1 = time.perf_counter()
+
+        runtime = t1-t0
+        result = np.std((np.array(positions)-self.position)/self.position)
+
+        return runtime, result
+
+    def test_binomial_amplitudeN_fit_batch(self):
+
+        t0 = time.perf_counter()
+        positions = batch_profile_fit(self.time_array, self.binom_profiles,
+                                      'binomialAmplitudeN')[0][:, 1]
+        t1 = time.perf_counter()
+
+        runtime = t1-t0
+        result = np.std((positions-self.position)/self.position)
+
+        return runtime, result
+
+
+if __name__ == '__main__':
+
+    tests = TestBatchFitting()
+    dict_results = tests.run_tests()
@@ -0,0 +1,319 @@
+# coding: utf8
+# Copyright 2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Benchmark suite of blond_common, the results are saved to JSON and can be
+compared against a baseline, e.g.
+
+python run_benchmarks.py --output baseline.json
+python run_benchmarks.py --baseline baseline.json --threshold 0.2
+python run_benchmarks.py --select 'fitting*' 'induced*' --quick
+
+The script exits with status 1 if a regression is found.
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import argparse
+import warnings
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../'))
+
+from blond_common.devtools.benchmark import (
+    BenchmarkSuite, save_results, load_results, compare_results,
+    format_comparison)
+from blond_common.interfaces.beam.beam import Proton
+from blond_common.interfaces.machine_parameters.ring import Ring, RingSection
+from blond_common.interfaces.machine_parameters.rf_parameters import RFStation
+from blond_common.interfaces.beam.beam_parameters import Beam_Parameters
+from blond_common.interfaces.beam.analytic_distribution import (
+    gaussian, binomialAmplitudeN)
+from blond_common.interfaces.impedances.impedance_sources import Resonators
+from blond_common.interfaces.induced_voltage.induced_voltage import (
+    calc_induced_freq, calc_induced_time)
+from blond_common.interfaces.induced_voltage.resonator_recursion import (
+    ResonatorRecursion)
+from blond_common.interfaces.induced_voltage.multi_resolution import (
+    MultiResolutionInducedVoltage)
+from blond_common.interfaces.induced_voltage.harmonic_domain import (
+    HarmonicInducedVoltage)
+from blond_common.rf_functions.potential import (
+    rf_potential_generation, find_potential_wells_cubic,
+    potential_well_cut_cubic, synchrotron_frequency_cubic,
+    synchrotron_frequency_hybrid)
+from blond_common.beam_dynamics.bucket import Bucket
+from blond_common.fitting.profile import FWHM, gaussian_fit
+from blond_common.fitting.batch import batch_profile_fit
+
+
+# Machine used in all the cases, based on the SPS with protons at flat
+# bottom with Q26 optics, with a slow momentum ramp
+ring_length = 6911.5038
+gamma_transition = 22.77422954
+momentum_start = 25.92e9
+momentum_increment = 20e3
+harmonic = 4620
+voltage = 0.9e6
+
+
+def _ring(n_turns):
+    '''
+    SPS ring with a small momentum ramp of n_turns
+    '''
+
+    momentum = momentum_start + momentum_increment*np.arange(n_turns+1)
+    return Ring(Proton(), RingSection(ring_length, 1/gamma_transition**2,
+                                      momentum))
+
+
+def _potential_well(n_points):
+    '''
+    The potential well of one bucket, sampled with about n_points
+    '''
+
+    ring = _ring(1)
+    t_rf = ring.t_rev[0]/harmonic
+
+    time_array, potential_array = rf_potential_generation(
+        n_points, ring.t_rev[0], [voltage], [harmonic], [0.], ring.eta_0[0, 0],
+        ring.Particle.charge, 0, time_bounds=[-0.5*t_rf, 1.5*t_rf])
+
+    max_locations = find_potential_wells_cubic(time_array, potential_array,
+                                               mest=200)[0]
+    time_list, well_list = potential_well_cut_cubic(
+        time_array, potential_array, max_locations)
+
+    return ring, time_list[0], well_list[0]
+
+
+def define_suite(quick=False, repeat=10):
+    '''
+    The benchmark cases, with smaller sizes if quick
+    '''
+
+    suite = BenchmarkSuite(repeat=repeat)
+
+    def sizes(*values):
+        return values[:1] if quick else values
+
+    # Machine parameters -----------------------------------------------------
+
+    @suite.case(sizes=sizes(1000, 100000))
+    def ring_construction(n_turns):
+        momentum = momentum_start + momentum_increment*np.arange(n_turns+1)
+
+        def function():
+            Ring(Proton(), RingSection(ring_length, 1/gamma_transition**2,
+                                       momentum))
+        return function
+
+    @suite.case(sizes=sizes(1000, 100000))
+    def rf_station(n_turns):
+        ring = _ring(n_turns)
+        return lambda: RFStation(ring, [harmonic], [voltage], [0.])
+
+    @suite.case(sizes=sizes(1, 10))
+    def beam_parameters(n_samples):
+        ring = _ring(n_samples)
+        rf = RFStation(ring, [harmonic], [voltage], [0.])
+
+        return lambda: Beam_Parameters(ring, rf,
+                                       use_samples=list(range(n_samples)),
+                                       harmonic_divide=harmonic,
+                                       bunch_emittance=0.3)
+
+    # RF functions -----------------------------------------------------------
+
+    @suite.case(sizes=sizes(1000, 10000))
+    def find_potential_wells(n_points):
+        ring = _ring(1)
+        t_rf = ring.t_rev[0]/harmonic
+        time_array, potential_array = rf_potential_generation(
+            n_points, ring.t_rev[0], [voltage], [harmonic], [0.],
+            ring.eta_0[0, 0], ring.Particle.charge, 0,
+            time_bounds=[-2*t_rf, 2*t_rf])
+
+        return lambda: find_potential_wells_cubic(time_array,
+                                                  potential_array, mest=200)
+
+    @suite.case('synchrotron_frequency_cubic', sizes=sizes(500, 2000))
+    def sync_freq_cubic(n_points):
+        ring, time_array, well_array = _potential_well(n_points)
+
+        return lambda: synchrotron_frequency_cubic(
+            time_array, well_array, ring.eta_0[0, 0], ring.beta[0, 0],
+            ring.energy[0, 0])
+
+    @suite.case('synchrotron_frequency_hybrid', sizes=sizes(500, 2000))
+    def sync_freq_hybrid(n_points):
+        ring, time_array, well_array = _potential_well(n_points)
+
+        return lambda: synchrotron_frequency_hybrid(
+            time_array, well_array, ring.eta_0[0, 0], ring.beta[0, 0],
+            ring.energy[0, 0])
+
+    # Buckets ----------------------------------------------------------------
+
+    @suite.case(sizes=sizes(500, 2000))
+    def bucket_outline(n_points):
+        ring, time_array, well_array = _potential_well(n_points)
+        bucket = Bucket(time_array, well_array - np.min(well_array),
+                        ring.beta[0, 0], ring.energy[0, 0], ring.eta_0[0, 0])
+
+        def function():
+            bucket.outline_from_length(0.5*bucket.length)
+            bucket.outline_from_emittance(0.5*bucket.area)
+        return function
+
+    # Fitting ----------------------------------------------------------------
+
+    def _profiles(n_profiles, distribution=gaussian, length=2e-9, *extra):
+        time_array = np.arange(0, 25e-9, 0.1e-9)
+        rng = np.random.default_rng(0)
+        profiles = distribution(
+            time_array, rng.uniform(0.8, 1.2, (n_profiles, 1)),
+            rng.normal(12.5e-9, 1e-9, (n_profiles, 1)), length, *extra) \
+            + rng.normal(0, 0.01, (n_profiles, len(time_array)))
+        return time_array, profiles
+
+    @suite.case(sizes=sizes(100, 1000))
+    def fitting_gaussian_loop(n_profiles):
+        time_array, profiles = _profiles(n_profiles)
+        return lambda: [gaussian_fit(time_array, profile)
+                        for profile in profiles]
+
+    @suite.case(sizes=sizes(100, 1000))
+    def fitting_batch_binomial(n_profiles):
+        time_array, profiles = _profiles(n_profiles, binomialAmplitudeN,
+                                         7e-9, 2.7)
+        return lambda: batch_profile_fit(time_array, profiles,
+                                         'binomialAmplitudeN')
+
+    @suite.case(sizes=sizes(1000, 10000))
+    def fitting_FWHM(n_profiles):
+        time_array, profiles = _profiles(n_profiles)
+        return lambda: FWHM(time_array, profiles)
+
+    # Induced voltage --------------------------------------------------------
+
+    def _beam(n_points):
+        time_array = np.linspace(0, 25e-9, n_points)
+        profile = gaussian(time_array, 1e11, 12.5e-9, 2e-9)
+        resonators = Resonators([1e6, 5e6], [200e6, 800e6], [100, 10])
+        return time_array, profile, resonators
+
+    @suite.case(sizes=sizes(2**10, 2**14, 2**18))
+    def induced_voltage_freq(n_points):
+        time_array, profile, resonators = _beam(n_points)
+        frequency_array = np.fft.rfftfreq(n_points,
+                                          time_array[1]-time_array[0])
+
+        def function():
+            resonators.imped_calc(frequency_array)
+            calc_induced_freq(np.fft.rfft(profile), resonators.impedance)
+        return function
+
+    @suite.case(sizes=sizes(2**10, 2**14))
+    def induced_voltage_time(n_points):
+        time_array, profile, resonators = _beam(n_points)
+
+        def function():
+            resonators.wake_calc(time_array)
+            calc_induced_time(profile, resonators.wake)
+        return function
+
+    @suite.case(sizes=sizes(2**10, 2**14, 2**18))
+    def induced_voltage_recursive(n_points):
+        time_array, profile, resonators = _beam(n_points)
+        recursion = ResonatorRecursion(resonators,
+                                       time_array[1]-time_array[0])
+        return lambda: recursion.induced_voltage(profile)
+
+    @suite.case(sizes=sizes(12, 288))
+    def induced_voltage_multi_resolution(n_bunches):
+        time_array = np.arange(2000) * 2e-12
+        profiles = np.tile(gaussian(time_array, 1e11, 2e-9, 0.3e-9),
+                           (n_bunches, 1))
+        induced = MultiResolutionInducedVoltage(
+            [Resonators([1e6, 5e6], [200e6, 800e6], [100, 10])], 2e-12, 20)
+        return lambda: induced.calc_induced(np.arange(n_bunches)*25e-9,
+                                            profiles)
+
+    @suite.case(sizes=sizes(2**10, 2**14, 2**18))
+    def induced_voltage_harmonic(n_points):
+        time_array, profile, resonators = _beam(n_points)
+        ring = _ring(10)
+        harmonic = HarmonicInducedVoltage([resonators], 1e9, ring=ring)
+
+        def function():
+            for sample in range(2):
+                harmonic.update(sample=sample)
+                harmonic.induced_voltage(time_array, profile)
+        return function
+
+    return suite
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark suite of blond_common')
+    parser.add_argument('--output', default=None,
+                        help='JSON file in which the results are saved')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON file of the baseline results')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative increase of the runtime considered ' +
+                        'as a regression')
+    parser.add_argument('--memory-threshold', type=float, default=0.1,
+                        help='Relative increase of the peak memory ' +
+                        'considered as a regression')
+    parser.add_argument('--select', nargs='+', default=None,
+                        help='Patterns of the names of the cases to run')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of timed calls per case')
+    parser.add_argument('--quick', action='store_true',
+                        help='Only the smallest size of each case')
+    arguments = parser.parse_args(argv)
+
+    suite = define_suite(quick=arguments.quick, repeat=arguments.repeat)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = suite.run(select=arguments.select)
+
+    if arguments.output is not None:
+        save_results(results, arguments.output)
+
+    if arguments.baseline is not None:
+        baseline = load_results(arguments.baseline)[0]
+        comparison = compare_results(
+            results, baseline, time_threshold=arguments.threshold,
+            memory_threshold=arguments.memory_threshold)
+        print(format_comparison(comparison))
+        if any(case['regression'] for case in comparison):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Test datatypes.compressed.py
+
+'''
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import numpy.testing as npTest
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+
+import blond_common.datatypes.compressed as cprog
+from blond_common.maths import interpolation as interp
+from blond_common.devtools import exceptions
+
+
+class test_compressed(unittest.TestCase):
+
+    def setUp(self):
+
+        # Flat bottom, parabolic-linear-parabolic ramp, flat top
+        samples = np.arange(100000)
+        ramp = np.clip((samples - 20000) / 60000, 0, 1)
+        self.program = 26E9 + 4E9 * ramp**2 * (3 - 2 * ramp)
+        self.tolerance = 1E-6
+
+    def test_knots(self):
+
+        knots = interp.piecewise_linear_knots(self.program,
+                                              self.tolerance*30E9)
+        self.assertEqual(knots[0], 0)
+        self.assertEqual(knots[-1], len(self.program) - 1)
+
+        reconstructed = np.interp(np.arange(len(self.program)), knots,
+                                  self.program[knots])
+        self.assertLessEqual(np.max(np.abs(reconstructed - self.program)),
+                             self.tolerance*30E9)
+
+        line = np.linspace(0, 1, 1000)
+        npTest.assert_equal(interp.piecewise_linear_knots(line), [0, 999])
+
+    def test_error_bound(self):
+
+        compressed = cprog.compressed_program(self.program, self.tolerance)
+
+        self.assertLess(compressed.nbytes, self.program.nbytes / 10)
+        self.assertEqual(compressed.shape, self.program.shape)
+
+        error = np.max(np.abs(np.asarray(compressed) - self.program))
+        self.assertLessEqual(error,
+                             self.tolerance * np.max(np.abs(self.program)))
+
+    def test_indexing(self):
+
+        program = np.array([self.program, -self.program])
+        compressed = cprog.compressed_program(program, self.tolerance)
+
+        for key in [(0, 12345), (1, -1), (slice(None), 50000),
+                    (0, slice(10, 20)), (1, [5, 70000])]:
+            with self.subTest(key=key):
+                npTest.assert_allclose(compressed[key], program[key],
+                                       rtol=0, atol=self.tolerance*30E9)
+
+        npTest.assert_allclose(compressed[1], program[1],
+                               rtol=0, atol=self.tolerance*30E9)
+        npTest.assert_allclose(compressed * 2, program * 2,
+                               rtol=0, atol=self.tolerance*60E9)
+
+        with self.assertRaises(IndexError):
+            compressed[0, 100000]
+
+        with self.assertRaises(exceptions.InputError):
+            compressed.sample(10)
+
+    def test_inverse(self):
+
+        cycle_time = np.cumsum(np.full(1000, 1E-6))
+        compressed = cprog.compressed_program(cycle_time, self.tolerance)
+
+        self.assertEqual(len(compressed.knots[0][0]), 2)
+        npTest.assert_allclose(compressed.inverse(cycle_time[[10, 500]]),
+                               [10, 500])
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,98 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Test datatypes._storage.py
+
+'''
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+import tempfile
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+
+import blond_common.datatypes._storage as storage
+import blond_common.datatypes.ring_programs as rProg
+
+
+class test_storage(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.storage_dir = self.tempDir.name
+
+    def tearDown(self):
+
+        self.tempDir.cleanup()
+
+    def test_zeros(self):
+
+        inMemory = storage.zeros((2, 10))
+        self.assertNotIsInstance(inMemory, np.memmap)
+
+        onDisk = storage.zeros((2, 10), self.storage_dir, 'test')
+        self.assertIsInstance(onDisk, np.memmap)
+        self.assertEqual(onDisk.shape, (2, 10))
+        np.testing.assert_equal(onDisk, 0)
+
+        program = rProg.momentum_program.zeros(
+            (1, 10), {'timebase': 'by_turn'}, storage_dir=self.storage_dir)
+        self.assertIsInstance(program, rProg.momentum_program)
+        self.assertEqual(program.timebase, 'by_turn')
+
+    def test_store(self):
+
+        array = np.random.rand(3, 2*storage.chunk_size + 5)
+        self.assertIs(storage.store(array), array)
+
+        stored = storage.store(array, self.storage_dir)
+        self.assertIsInstance(stored, np.memmap)
+        np.testing.assert_equal(stored, array)
+
+        program = rProg.momentum_program(1, 2, 3, n_turns=2)
+        storedProgram = storage.store(program, self.storage_dir)
+        self.assertIsInstance(storedProgram, rProg.momentum_program)
+        self.assertEqual(storedProgram.data_type, program.data_type)
+        np.testing.assert_equal(np.asarray(storedProgram),
+                                np.asarray(program))
+
+    def test_sample_buffer(self):
+
+        nSamples = 2*storage.chunk_size + 10
+
+        buffer = storage.sample_buffer(0., self.storage_dir)
+        for i in range(1, nSamples):
+            buffer.append(float(i))
+
+        self.assertEqual(len(buffer), nSamples)
+        self.assertEqual(buffer[-1], nSamples - 1)
+        self.assertEqual(buffer[10], 10)
+
+        samples = storage.as_array(buffer)
+        self.assertIsInstance(samples, np.memmap)
+        np.testing.assert_equal(samples, np.arange(nSamples))
+
+        self.assertIsInstance(storage.sample_buffer(0.), list)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
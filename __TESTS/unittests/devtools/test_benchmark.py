@@ -0,0 +1,124 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.devtools.benchmark module
+
+:Authors: **Simon Albright**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import tempfile
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.devtools.benchmark import (
+    measure, BenchmarkSuite, save_results, load_results, compare_results)
+import blond_common.devtools.exceptions as excpt
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+
+        self.suite = BenchmarkSuite(repeat=3)
+
+        @self.suite.case(sizes=[10, 10000])
+        def ones(size):
+            return lambda: np.ones(size)
+
+        self.suite.add_case('sum', lambda: (lambda: sum(range(100))))
+
+    def test_measure(self):
+
+        calls = []
+        result = measure(lambda: calls.append(np.ones(10000)), repeat=5,
+                         warmup=2)
+
+        # Warmup, timed calls and memory call
+        self.assertEqual(len(calls), 8)
+        self.assertEqual(result['repeat'], 5)
+        self.assertLessEqual(result['min'], result['median'])
+        self.assertLessEqual(result['median'], result['max'])
+        self.assertGreaterEqual(result['iqr'], 0)
+        self.assertGreaterEqual(result['peak_memory'], 80000)
+
+        self.assertIsNone(measure(lambda: None, memory=False)['peak_memory'])
+
+        with self.assertRaises(excpt.InputError):
+            measure(lambda: None, repeat=0)
+
+    def test_suite(self):
+
+        results = self.suite.run(verbose=False)
+
+        self.assertEqual(sorted(results), ['ones[10000]', 'ones[10]', 'sum'])
+        self.assertEqual(results['ones[10000]']['size'], 10000)
+        self.assertGreater(results['ones[10000]']['peak_memory'],
+                           results['ones[10]']['peak_memory'])
+
+        results = self.suite.run(select='on*', verbose=False)
+        self.assertEqual(sorted(results), ['ones[10000]', 'ones[10]'])
+
+        with self.assertRaises(excpt.InputError):
+            self.suite.run(select='missing', verbose=False)
+        with self.assertRaises(excpt.InputError):
+            self.suite.add_case('sum', lambda: None)
+
+    def test_save_compare(self):
+
+        results = self.suite.run(verbose=False)
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'results.json')
+            save_results(results, file_name, {'commit': 'abc'})
+            baseline, metadata = load_results(file_name)
+
+        self.assertEqual(baseline, results)
+        self.assertEqual(metadata['commit'], 'abc')
+
+        comparison = compare_results(results, baseline)
+        self.assertEqual(len(comparison), 3)
+        self.assertFalse(any(case['regression'] for case in comparison))
+
+        # Slower and larger results
+        slower = {key: dict(value) for key, value in results.items()}
+        slower['sum']['median'] = 2*baseline['sum']['median'] + \
+            baseline['sum']['iqr']
+        slower['ones[10000]']['peak_memory'] *= 2
+        slower.pop('ones[10]')
+
+        comparison = {case['key']: case
+                      for case in compare_results(slower, baseline)}
+        self.assertEqual(sorted(comparison), ['ones[10000]', 'sum'])
+        self.assertTrue(comparison['sum']['regression'])
+        self.assertTrue(comparison['ones[10000]']['regression'])
+
+        comparison = {case['key']: case
+                      for case in compare_results(slower, baseline,
+                                                  memory_threshold=None,
+                                                  thresholds={'s*': 10.})}
+        self.assertFalse(comparison['sum']['regression'])
+        self.assertFalse(comparison['ones[10000]']['regression'])
+
+
+if __name__ == '__main__':
+
+    unittest.main()
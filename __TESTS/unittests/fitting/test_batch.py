@@ -0,0 +1,132 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.fitting.batch module
+
+:Authors: **Alexandre Lasheen**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.interfaces.beam import analytic_distribution
+from blond_common.fitting.batch import batch_profile_fit
+from blond_common.fitting.profile import binomial_amplitudeN_fit
+from blond_common.devtools.exceptions import InputError
+
+
+class TestBatchFit(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_array = np.arange(0, 25e-9, 0.1e-9)
+        self.n_profiles = 50
+
+        rng = np.random.default_rng(7)
+        self.amplitude = rng.uniform(0.8, 1.2, self.n_profiles)
+        self.position = rng.normal(12.5e-9, 1e-9, self.n_profiles)
+
+    def _profiles(self, distribution, *other_parameters):
+
+        parameters = np.stack(
+            [self.amplitude, self.position] +
+            [np.full(self.n_profiles, p) for p in other_parameters], axis=1)
+
+        data_arrays = getattr(analytic_distribution, distribution)(
+            self.time_array, *parameters.T[..., np.newaxis])
+
+        return parameters, data_arrays
+
+    def test_broadcast_profiles(self):
+
+        parameters, data_arrays = self._profiles('binomialAmplitudeN',
+                                                 6e-9, 2.3)
+
+        self.assertEqual(data_arrays.shape,
+                         (self.n_profiles, len(self.time_array)))
+        for index in [0, self.n_profiles-1]:
+            np.testing.assert_array_equal(
+                data_arrays[index], analytic_distribution.binomialAmplitudeN(
+                    self.time_array, *parameters[index]))
+
+    def test_distributions(self):
+
+        cases = {'gaussian': [2e-9],
+                 'generalizedGaussian': [2e-9, 2.5],
+                 'waterbag': [7e-9],
+                 'parabolicLine': [7e-9],
+                 'parabolicAmplitude': [7e-9],
+                 'binomialAmplitude2': [7e-9],
+                 'binomialAmplitudeN': [7e-9, 2.7],
+                 'cosine': [7e-9],
+                 'cosineSquared': [7e-9]}
+
+        for distribution, other_parameters in cases.items():
+            with self.subTest(distribution):
+                parameters, data_arrays = self._profiles(distribution,
+                                                         *other_parameters)
+
+                fitted_parameters, status = batch_profile_fit(
+                    self.time_array, data_arrays, distribution)
+
+                np.testing.assert_array_equal(status, 1)
+                np.testing.assert_allclose(fitted_parameters, parameters,
+                                           rtol=1e-4)
+
+    def test_compare_single_fit(self):
+
+        parameters, data_arrays = self._profiles('binomialAmplitudeN',
+                                                 6e-9, 2.3)
+        data_arrays += np.random.default_rng(3).normal(
+            0, 0.01, data_arrays.shape)
+
+        fitted_parameters = batch_profile_fit(
+            self.time_array, data_arrays, 'binomialAmplitudeN')[0]
+
+        for index in range(5):
+            np.testing.assert_allclose(
+                fitted_parameters[index],
+                binomial_amplitudeN_fit(self.time_array, data_arrays[index]),
+                rtol=1e-3)
+
+    def test_user_function(self):
+
+        parameters, data_arrays = self._profiles('gaussian', 2e-9)
+
+        with self.assertRaises(InputError):
+            batch_profile_fit(self.time_array, data_arrays,
+                              analytic_distribution.gaussian)
+
+        with self.assertRaises(InputError):
+            batch_profile_fit(self.time_array, data_arrays, 'unknown')
+
+        fitted_parameters, status = batch_profile_fit(
+            self.time_array, data_arrays, analytic_distribution.gaussian,
+            initial_parameters=parameters*1.05)
+
+        np.testing.assert_array_equal(status, 1)
+        np.testing.assert_allclose(fitted_parameters, parameters, rtol=1e-4)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,133 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.fitting.multibunch module
+
+:Authors: **Alexandre Lasheen**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.interfaces.beam.analytic_distribution import (
+    gaussian, binomialAmplitudeN)
+from blond_common.fitting.multibunch import bunch_windows, multi_bunch_fit
+from blond_common.fitting.profile import (
+    FitOptions, gaussian_fit, binomial_amplitudeN_fit)
+from blond_common.devtools.exceptions import InputDataError
+
+
+class TestMultiBunch(unittest.TestCase):
+
+    def setUp(self):
+
+        self.n_bunches = 12
+        self.bunch_spacing = 25e-9
+        self.time_array = np.arange(0, self.n_bunches*self.bunch_spacing,
+                                    0.1e-9)
+
+        rng = np.random.default_rng(5)
+        self.parameters = np.stack(
+            [rng.uniform(0.5, 1.5, self.n_bunches),
+             (np.arange(self.n_bunches) + 0.5) * self.bunch_spacing +
+             rng.normal(0, 0.5e-9, self.n_bunches),
+             rng.uniform(1.5e-9, 2e-9, self.n_bunches)], axis=1)
+
+        self.profile = np.sum(gaussian(self.time_array,
+                                       *self.parameters.T[..., np.newaxis]),
+                              axis=0)
+
+    def test_bunch_windows(self):
+
+        windows, peak_indices = bunch_windows(self.time_array, self.profile)
+
+        self.assertEqual(windows.shape, (self.n_bunches, 2))
+
+        # Each window contains its bunch and does not overlap the others
+        np.testing.assert_array_less(self.time_array[windows[:, 0]],
+                                     self.parameters[:, 1])
+        np.testing.assert_array_less(self.parameters[:, 1],
+                                     self.time_array[windows[:, 1]-1])
+        np.testing.assert_array_less(windows[:-1, 1], windows[1:, 0]+1)
+
+        np.testing.assert_allclose(self.time_array[peak_indices],
+                                   self.parameters[:, 1], atol=0.1e-9)
+
+        # Bunch below the threshold
+        windows = bunch_windows(self.time_array, self.profile,
+                                threshold=0.5)[0]
+        self.assertEqual(len(windows), np.sum(
+            self.parameters[:, 0] > 0.5*np.max(self.profile)))
+
+        with self.assertRaises(InputDataError):
+            bunch_windows(self.time_array, np.zeros(len(self.time_array)))
+
+    def test_noise(self):
+
+        rng = np.random.default_rng(9)
+        profile = self.profile + 0.02*rng.standard_normal(
+            len(self.time_array))
+
+        windows = bunch_windows(self.time_array, profile,
+                                fitOpt=FitOptions(nPointsNoise=20))[0]
+
+        self.assertEqual(len(windows), self.n_bunches)
+
+    def test_multi_bunch_fit(self):
+
+        fitted_parameters, windows = multi_bunch_fit(
+            self.time_array, self.profile, n_workers=4)
+
+        # The precision is limited by the tails of the neighbouring bunches
+        # and by the baseline removal at the edges of the windows
+        self.assertEqual(len(windows), self.n_bunches)
+        np.testing.assert_allclose(fitted_parameters, self.parameters,
+                                   rtol=1e-4)
+
+        for index in [0, 5]:
+            start, stop = windows[index]
+            np.testing.assert_allclose(
+                fitted_parameters[index],
+                gaussian_fit(self.time_array[start:stop],
+                             self.profile[start:stop]))
+
+        # Binomial bunches, with a full length of 5 times the rms length
+        # used above
+        exponents = np.linspace(1., 3., self.n_bunches)
+        amplitudes, positions, rms_lengths = self.parameters.T[..., np.newaxis]
+        profile = np.sum(binomialAmplitudeN(
+            self.time_array, amplitudes, positions, 5*rms_lengths,
+            exponents[:, np.newaxis]), axis=0)
+
+        fitOpt = FitOptions()
+        fitted_parameters = multi_bunch_fit(
+            self.time_array, profile, binomial_amplitudeN_fit,
+            fitOpt=fitOpt, margin=0.5)[0]
+
+        np.testing.assert_allclose(fitted_parameters[:, 3], exponents,
+                                   rtol=1e-5)
+        self.assertIsNone(fitOpt.fitInitialParameters)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
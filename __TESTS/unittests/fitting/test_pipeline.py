@@ -0,0 +1,122 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.fitting.pipeline module
+
+:Authors: **Simon Albright**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import tempfile
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.interfaces.beam.analytic_distribution import gaussian
+from blond_common.fitting.pipeline import open_archive, process_archive
+from blond_common.fitting.batch import batch_profile_fit
+from blond_common.fitting.profile import FWHM, RMS, gaussian_fit
+from blond_common.devtools.exceptions import InputDataError
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_array = np.arange(0, 25e-9, 0.1e-9)
+        self.n_profiles = 37
+
+        rng = np.random.default_rng(3)
+        self.parameters = np.stack(
+            [rng.uniform(0.8, 1.2, self.n_profiles),
+             rng.normal(12.5e-9, 0.5e-9, self.n_profiles),
+             rng.uniform(1.2e-9, 1.8e-9, self.n_profiles)], axis=1)
+
+        self.profiles = gaussian(self.time_array,
+                                 *self.parameters.T[..., np.newaxis])
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = os.path.join(self.directory.name, 'profiles.npy')
+        np.save(self.archive, self.profiles)
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def _output(self, name='results.npy'):
+
+        return os.path.join(self.directory.name, name)
+
+    def test_npy_archive(self):
+
+        results = process_archive(self.time_array, self.archive,
+                                  self._output(), chunk_profiles=5,
+                                  n_workers=3)
+
+        self.assertIsInstance(results, np.memmap)
+        np.testing.assert_array_equal(
+            results, np.stack(FWHM(self.time_array, self.profiles), axis=1))
+
+        # The results are written in a standard npy file
+        np.testing.assert_array_equal(np.load(self._output()), results)
+
+        results = process_archive(self.time_array, self.archive,
+                                  self._output('rms.npy'), RMS, n_workers=2)
+        np.testing.assert_array_equal(
+            results, np.stack(RMS(self.time_array, self.profiles), axis=1))
+
+    def test_raw_archive(self):
+
+        raw_file = os.path.join(self.directory.name, 'profiles.bin')
+        with open(raw_file, 'wb') as archive:
+            archive.write(b'header' * 10)
+            self.profiles.astype(np.float32).tofile(archive)
+
+        profiles = open_archive(raw_file, len(self.time_array),
+                                dtype=np.float32, header_size=60)
+        np.testing.assert_array_equal(profiles,
+                                      self.profiles.astype(np.float32))
+
+        results = process_archive(
+            self.time_array, profiles, self._output(), batch_profile_fit,
+            chunk_profiles=8, distribution='gaussian')
+
+        np.testing.assert_array_equal(results[:, 3], 1)
+        np.testing.assert_allclose(results[:, :3], self.parameters,
+                                   rtol=1e-5)
+
+        with self.assertRaises(InputDataError):
+            open_archive(raw_file)
+        with self.assertRaises(InputDataError):
+            open_archive(raw_file, len(self.time_array), dtype=np.float32,
+                         header_size=50)
+
+    def test_profile_by_profile(self):
+
+        results = process_archive(self.time_array, self.archive,
+                                  self._output(), gaussian_fit,
+                                  vectorized=False, chunk_profiles=10)
+
+        np.testing.assert_allclose(results, self.parameters, rtol=1e-6)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
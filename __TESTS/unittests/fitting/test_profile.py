@@ -33,13 +33,15 @@ if os.path.abspath(this_directory + '../../../../') not in sys.path:
     sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
 
 from blond_common.interfaces.beam.analytic_distribution import (
-    Gaussian, generalizedGaussian, waterbag, parabolicAmplitude, parabolicLine,
+    Gaussian, gaussian, generalizedGaussian, waterbag, parabolicAmplitude, parabolicLine,
     binomialAmplitude2, binomialAmplitudeN, cosine, cosineSquared,
     _binomial_full_to_rms, _binomial_full_to_fwhm, _binomial_integral)
 
 from blond_common.fitting.profile import (FitOptions, PlotOptions,
     RMS, FWHM, peak_value, integrated_profile,
     binomial_from_width_ratio, binomial_from_width_LUT_generation,
+    cached_binomial_from_width_LUT, cached_binomial_from_width_LUT_info,
+    cached_binomial_from_width_LUT_clear,
     gaussian_fit, generalized_gaussian_fit, waterbag_fit, parabolic_line_fit,
     parabolic_amplitude_fit, binomial_amplitude2_fit, binomial_amplitudeN_fit,
     cosine_fit, cosine_squared_fit, arbitrary_profile_fit)
@@ -206,6 +208,22 @@ class TestFittingProfile(unittest.TestCase):
         fitOpt = FitOptions()
         RMS(self.time_array, self.parabamp_dist, fitOpt=fitOpt)
 
+    def test_RMS_stack(self):
+        '''
+        Checking that the mean,rms obtained for a 2D array of profiles are
+        the ones obtained for each profile separately
+        '''
+
+        stack = np.array([self.gaussian_dist, self.parabamp_dist,
+                          self.binom_dist])
+
+        mean_stack, rms_stack = RMS(self.time_array, stack)
+
+        for index, profile in enumerate(stack):
+            mean, rms = RMS(self.time_array, profile)
+            self.assertEqual(mean_stack[index], mean)
+            self.assertEqual(rms_stack[index], rms)
+
     # Tests for FWHM ----------------------------------------------------------
     '''
     Testing the FWHM function on the three profiles, the absolute precision
@@ -363,6 +381,35 @@ class TestFittingProfile(unittest.TestCase):
         with self.assertWarns(Warning):
             FWHM(self.time_array, parabline_dist)
 
+    def test_FWHM_stack(self):
+        '''
+        Checking that the maximum,center,fwhm obtained for a 2D array of
+        profiles are the ones obtained for each profile separately, and that
+        a profile at the edge of the frame raises the warning
+        '''
+
+        stack = np.array([self.gaussian_dist, self.parabamp_dist,
+                          self.binom_dist])
+
+        fitOpt = FitOptions(bunchLengthFactor='parabolic_amplitude')
+        maximum_stack, center_stack, fwhm_stack = FWHM(
+            self.time_array, stack, fitOpt=fitOpt)
+
+        self.assertEqual(fwhm_stack.shape, (3,))
+
+        for index, profile in enumerate(stack):
+            maximum, center, fwhm = FWHM(self.time_array, profile,
+                                         fitOpt=fitOpt)
+            self.assertEqual(maximum_stack[index], maximum)
+            self.assertEqual(center_stack[index], center)
+            self.assertEqual(fwhm_stack[index], fwhm)
+
+        parabline_dist = parabolicLine(self.time_array,
+                                       *[2.5, self.time_array[0], 7e-9])
+
+        with self.assertWarns(Warning):
+            FWHM(self.time_array, np.vstack((stack, parabline_dist)))
+
     def test_FWHM_plot(self):
         '''
         Checking that the plots are not returning any error
@@ -449,6 +496,23 @@ class TestFittingProfile(unittest.TestCase):
         fitOpt = FitOptions()
         peak_value(self.time_array, self.parabamp_dist, fitOpt=fitOpt)
 
+    def test_peak_value_stack(self):
+        '''
+        Checking that the position,peak obtained for a 2D array of profiles
+        are the ones obtained for each profile separately
+        '''
+
+        stack = np.array([self.gaussian_dist, self.parabamp_dist,
+                          self.binom_dist])
+
+        position_stack, peak_stack = peak_value(self.time_array, stack,
+                                                level=0.9)
+
+        for index, profile in enumerate(stack):
+            position, peak = peak_value(self.time_array, profile, level=0.9)
+            self.assertEqual(position_stack[index], position)
+            self.assertEqual(peak_stack[index], peak)
+
     def test_peak_value_plot(self):
         '''
         Checking that the plots are not returning any error
@@ -545,6 +609,25 @@ class TestFittingProfile(unittest.TestCase):
         fitOpt = FitOptions()
         integrated_profile(self.time_array, self.parabamp_dist, fitOpt=fitOpt)
 
+    def test_integrated_profile_stack(self):
+        '''
+        Checking that the integrals obtained for a 2D array of profiles are
+        the ones obtained for each profile separately
+        '''
+
+        stack = np.array([self.gaussian_dist, self.parabamp_dist,
+                          self.binom_dist])
+
+        for method in ['sum', 'trapz']:
+            integrated_stack = integrated_profile(self.time_array, stack,
+                                                  method=method)
+
+            for index, profile in enumerate(stack):
+                self.assertEqual(
+                    integrated_stack[index],
+                    integrated_profile(self.time_array, profile,
+                                       method=method))
+
     def test_integrated_profile_plot(self):
         '''
         Checking that the plots are not returning any error
@@ -685,6 +768,26 @@ class TestFittingProfile(unittest.TestCase):
         binomial_from_width_ratio(self.time_array, self.parabamp_dist,
                                   fitOpt=fitOpt)
 
+    def test_binomial_from_width_ratio_stack(self):
+        '''
+        Checking that the binomial parameters obtained for a 2D array of
+        profiles are the ones obtained for each profile separately
+        '''
+
+        stack = np.array([self.gaussian_dist, self.parabamp_dist,
+                          self.binom_dist])
+
+        ratio_LUT = binomial_from_width_LUT_generation()
+
+        results_stack = binomial_from_width_ratio(self.time_array, stack,
+                                                  ratio_LUT=ratio_LUT)
+
+        for index, profile in enumerate(stack):
+            results = binomial_from_width_ratio(self.time_array, profile,
+                                                ratio_LUT=ratio_LUT)
+            for result_stack, result in zip(results_stack, results):
+                self.assertEqual(result_stack[index], result)
+
     def test_binomial_from_width_ratio_plot(self):
         '''
         Checking that the plots are not returning any error
@@ -786,6 +889,39 @@ class TestFittingProfile(unittest.TestCase):
         with self.assertRaises(InputError):
             binomial_from_width_LUT_generation(exponent_distrib='jimmy')
 
+    def test_cached_binomial_from_width_LUT(self):
+        '''
+        Checking that the lookup tables are generated once and reused, and
+        that the interpolated exponent matches the analytical one
+        '''
+
+        cached_binomial_from_width_LUT_clear()
+
+        ratio_LUT, exponent_from_ratio = cached_binomial_from_width_LUT(
+            [0.2, 0.8])
+        binomial_from_width_ratio(self.time_array, self.binom_dist)
+
+        cache_info = cached_binomial_from_width_LUT_info()
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(cache_info.hits, 1)
+
+        self.assertIs(cached_binomial_from_width_LUT()[0], ratio_LUT)
+        self.assertIsNot(cached_binomial_from_width_LUT(
+            exponent_npoints=100)[0], ratio_LUT)
+
+        with self.assertRaises(ValueError):
+            ratio_LUT[0][0] = 1.
+
+        exponents = np.array([0.6, 1.5, 3.7, 9.2])
+        ratios = np.sqrt((1-0.8**(1/exponents))/(1-0.2**(1/exponents)))
+        np.testing.assert_allclose(exponent_from_ratio(ratios), exponents,
+                                   rtol=1e-6)
+
+        # Outside of the table, the edge values are returned
+        np.testing.assert_allclose(
+            exponent_from_ratio([0., 1.]), [ratio_LUT[0][0], ratio_LUT[0][-1]],
+            rtol=1e-12)
+
     # Test fitting ------------------------------------------------------------
     '''
     Testing all fitting functions, the absolute precision is presenty set
@@ -1471,6 +1607,78 @@ class TestFittingProfile(unittest.TestCase):
                 Gaussian(*fitOpt.fitInitialParameters).profile,
                 fitOpt=fitOpt)
 
+    def test_arbitrary_profile_fit_jacobian(self):
+        '''
+        Checking that the fits with the analytic Jacobian give the same
+        results as with finite differences.
+        '''
+
+        cases = [(gaussian_fit, self.gaussian_dist),
+                 (parabolic_line_fit, self.parabline_dist),
+                 (binomial_amplitudeN_fit, self.binom_dist)]
+
+        for fit_function, profile in cases:
+            with self.subTest(fit_function.__name__):
+                reference = fit_function(self.time_array, profile)
+                fitted = fit_function(self.time_array, profile,
+                                      fitOpt=FitOptions(jacobian='analytic'))
+                np.testing.assert_allclose(fitted, reference, rtol=1e-6)
+
+        fitted = binomial_amplitudeN_fit(
+            self.time_array, self.binom_dist,
+            fitOpt=FitOptions(fittingRoutine='minimize', method='BFGS',
+                              jacobian='analytic'))
+        np.testing.assert_allclose(fitted, self.initial_params_binom,
+                                   rtol=1e-4)
+
+        fitOpt = FitOptions(jacobian='analytic')
+        fitOpt.fitInitialParameters = self.initial_params_gauss
+        with self.assertRaises(InputError):
+            arbitrary_profile_fit(self.time_array, self.gaussian_dist,
+                                  lambda time, *params: gaussian(
+                                      time, *params), fitOpt=fitOpt)
+
+        fitOpt = FitOptions(jacobian='numeric')
+        fitOpt.fitInitialParameters = self.initial_params_gauss
+        with self.assertRaises(InputError):
+            arbitrary_profile_fit(self.time_array, self.gaussian_dist,
+                                  gaussian, fitOpt=fitOpt)
+
+    def test_moments_fit(self):
+        '''
+        Checking the parameters obtained from the moments of the profiles,
+        the precision is limited by the sampling of the profiles
+        '''
+
+        fitOpt = FitOptions(fittingRoutine='moments')
+
+        cases = [(gaussian_fit, self.gaussian_dist,
+                  self.initial_params_gauss, 1e-6),
+                 (parabolic_line_fit, self.parabline_dist,
+                  self.initial_params_parabline, 1e-2),
+                 (parabolic_amplitude_fit, self.parabamp_dist,
+                  self.initial_params_parabamp, 1e-3),
+                 (binomial_amplitudeN_fit, self.binom_dist,
+                  self.initial_params_binom, 1e-3)]
+
+        for fit_function, profile, initial_params, rtol in cases:
+            with self.subTest(fit_function.__name__):
+                fitted_params = fit_function(self.time_array, profile,
+                                             fitOpt=fitOpt)
+                np.testing.assert_allclose(fitted_params, initial_params,
+                                           rtol=rtol)
+
+        # Tails heavier than a Gaussian profile
+        fitted_params = binomial_amplitudeN_fit(
+            self.time_array,
+            generalizedGaussian(self.time_array, 1., 12.5e-9, 1.5e-9, 1.),
+            fitOpt=fitOpt)
+        np.testing.assert_equal(fitted_params[2:], np.inf)
+
+        plotOpt = PlotOptions(interactive=False)
+        gaussian_fit(self.time_array, self.gaussian_dist, fitOpt=fitOpt,
+                     plotOpt=plotOpt)
+
     def test_arbitrary_profile_fit_plot(self):
         '''
         Checking that the plots are not returning any error
@@ -0,0 +1,116 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.fitting.sequence module
+
+:Authors: **Alexandre Lasheen**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.interfaces.beam.analytic_distribution import (
+    gaussian, binomialAmplitudeN)
+from blond_common.fitting.sequence import sequence_fit
+from blond_common.fitting.profile import (
+    FitOptions, gaussian_fit, binomial_amplitudeN_fit)
+
+
+class TestSequenceFit(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_array = np.arange(0, 25e-9, 0.1e-9)
+        self.n_turns = 20
+
+        turns = np.arange(self.n_turns)
+        self.parameters = np.stack(
+            [1 + 0.05*np.sin(turns/5), 12e-9 + 0.2e-9*np.sin(turns/3),
+             8e-9 * (1 + 0.02*np.cos(turns/4)), 1.5 + 0.1*np.sin(turns/6)],
+            axis=1)
+
+        self.profiles = binomialAmplitudeN(
+            self.time_array, *self.parameters.T[..., np.newaxis])
+
+    def test_warm_start(self):
+
+        results = list(sequence_fit(
+            self.time_array, self.profiles, binomial_amplitudeN_fit,
+            full_output=True))
+
+        fit_parameters = np.array([result[0] for result in results])
+        warm_started = [result[1] for result in results]
+
+        self.assertEqual(warm_started, [False] + [True]*(self.n_turns-1))
+
+        np.testing.assert_allclose(fit_parameters, self.parameters,
+                                   rtol=1e-6)
+
+        for turn in [0, 7, 19]:
+            np.testing.assert_allclose(
+                fit_parameters[turn],
+                binomial_amplitudeN_fit(self.time_array, self.profiles[turn]),
+                rtol=1e-6)
+
+    def test_divergence(self):
+
+        # Bunch appearing in the middle of the sequence at another position
+        profiles = [gaussian(self.time_array, 1., 10e-9, 1e-9),
+                    gaussian(self.time_array, 1., 10.01e-9, 1e-9),
+                    gaussian(self.time_array, 3., 18e-9, 2e-9),
+                    gaussian(self.time_array, 3., 18.01e-9, 2e-9)]
+
+        results = list(sequence_fit(self.time_array, iter(profiles),
+                                    full_output=True))
+
+        self.assertEqual([result[1] for result in results],
+                         [False, True, False, True])
+
+        np.testing.assert_allclose(results[2][0], [3., 18e-9, 2e-9],
+                                   rtol=1e-6)
+
+    def test_options(self):
+
+        fitOpt = FitOptions(fitInitialParameters=[1.1, 12.1e-9, 7e-9, 1.4])
+
+        fit_parameters = list(sequence_fit(
+            self.time_array, self.profiles[:3], binomial_amplitudeN_fit,
+            fitOpt=fitOpt))
+
+        np.testing.assert_allclose(fit_parameters, self.parameters[:3],
+                                   rtol=1e-6)
+
+        # The options of the user are not modified
+        self.assertEqual(fitOpt.fitInitialParameters,
+                         [1.1, 12.1e-9, 7e-9, 1.4])
+
+        fitOpt = FitOptions(fittingRoutine='minimize', method='BFGS')
+        fit_parameters = list(sequence_fit(
+            self.time_array, self.profiles[:3, :], gaussian_fit,
+            fitOpt=fitOpt))
+        self.assertEqual(len(fit_parameters), 3)
+        self.assertIsNone(fitOpt.residualFunction)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
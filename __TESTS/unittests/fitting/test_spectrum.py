@@ -0,0 +1,92 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.fitting.spectrum module
+
+:Authors: **Alexandre Lasheen**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.interfaces.beam import analytic_distribution
+from blond_common.fitting.spectrum import spectrum_profile_fit
+from blond_common.fitting.profile import FitOptions
+from blond_common.devtools.exceptions import InputError
+
+
+class TestSpectrumFit(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_array = np.arange(0, 25e-9, 0.1e-9)
+        self.baseline = 0.3
+
+    def test_gaussian(self):
+
+        parameters = [1., 12.3e-9, 2e-9]
+        data_array = analytic_distribution.gaussian(
+            self.time_array, *parameters) + self.baseline
+
+        np.testing.assert_allclose(
+            spectrum_profile_fit(self.time_array, data_array), parameters,
+            rtol=1e-8)
+
+    def test_distributions(self):
+        # The precision is limited by the aliasing of the spectrum of the
+        # sampled profiles with a discontinuous derivative
+
+        tests = [('parabolicAmplitude', [1., 12.3e-9, 8e-9], 1e-4),
+                 ('binomialAmplitudeN', [1., 12.3e-9, 8e-9, 1.7], 1e-3),
+                 ('cosineSquared', [1., 12.3e-9, 8e-9], 1e-6)]
+
+        for name, parameters, rtol in tests:
+            with self.subTest(name):
+                data_array = getattr(analytic_distribution, name)(
+                    self.time_array, *parameters) + self.baseline
+
+                np.testing.assert_allclose(
+                    spectrum_profile_fit(self.time_array, data_array, name),
+                    parameters, rtol=rtol)
+
+    def test_options(self):
+
+        parameters = [1., 12.3e-9, 8e-9, 1.7]
+        data_array = analytic_distribution.binomialAmplitudeN(
+            self.time_array, *parameters)
+
+        fitOpt = FitOptions(fitInitialParameters=[0.9, 12e-9, 7e-9, 2.])
+        np.testing.assert_allclose(
+            spectrum_profile_fit(self.time_array, data_array,
+                                 'binomialAmplitudeN', n_harmonics=10,
+                                 fitOpt=fitOpt),
+            parameters, rtol=1e-3)
+        self.assertEqual(fitOpt.fitInitialParameters, [0.9, 12e-9, 7e-9, 2.])
+
+        with self.assertRaises(InputError):
+            spectrum_profile_fit(self.time_array, data_array,
+                                 'generalizedGaussian')
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -143,6 +143,122 @@ class TestDistributionsGaussianClass(unittest.TestCase):
         self.assertTrue(hasattr(test, 'computed_profile'))
 
 
+
+class TestJacobians(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time = np.linspace(0, 1, 251)
+        self.parameters = {
+            'gaussian': [1.2, 0.5, 0.08],
+            'generalizedGaussian': [1.2, 0.5, 0.06, 2.5],
+            'waterbag': [1.2, 0.5, 0.3],
+            'parabolicLine': [1.2, 0.5, 0.3],
+            'parabolicAmplitude': [1.2, 0.5, 0.3],
+            'binomialAmplitude2': [1.2, 0.5, 0.3],
+            'binomialAmplitudeN': [1.2, 0.5, 0.3, 2.7],
+            'cosine': [1.2, 0.5, 0.3],
+            'cosineSquared': [1.2, 0.5, 0.3]}
+
+    def test_finite_differences(self):
+        # Jacobian compared to central finite differences, also for the
+        # negative parameters for which the abs is taken
+
+        step = 1e-7
+
+        for name, parameters in self.parameters.items():
+            profile_function = getattr(analytic_distribution, name)
+            jacobian_function = analytic_distribution.get_jacobian(
+                profile_function)
+            self.assertIs(jacobian_function,
+                          getattr(analytic_distribution, name + '_jacobian'))
+
+            for sign in [1, -1]:
+                with self.subTest(name + ' - sign %d' % sign):
+                    parameters = np.array(parameters)
+                    parameters[2:] *= sign
+
+                    shifts = step*np.eye(len(parameters))
+                    expected = np.stack(
+                        [(profile_function(self.time, *(parameters+shift))
+                          - profile_function(self.time,
+                                             *(parameters-shift)))/(2*step)
+                         for shift in shifts], axis=-1)
+
+                    np.testing.assert_allclose(
+                        jacobian_function(self.time, *parameters), expected,
+                        rtol=0, atol=1e-7)
+
+    def test_broadcast(self):
+        # Jacobian of several profiles at once
+
+        parameters = np.array(self.parameters['binomialAmplitudeN'])
+        allParameters = parameters * np.array([[1.], [1.1], [0.9]])
+
+        jacobian = analytic_distribution.binomialAmplitudeN_jacobian(
+            self.time, *allParameters.T[..., np.newaxis])
+
+        self.assertEqual(jacobian.shape, (3, len(self.time), 4))
+        np.testing.assert_array_equal(
+            jacobian[1], analytic_distribution.binomialAmplitudeN_jacobian(
+                self.time, *allParameters[1]))
+
+    def test_gaussian_object(self):
+
+        self.assertIs(analytic_distribution.get_jacobian(
+            analytic_distribution.Gaussian(1, 0.5, 0.1).profile),
+            analytic_distribution.gaussian_jacobian)
+        self.assertIsNone(analytic_distribution.get_jacobian(np.sin))
+
+
+class TestSpectra(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time = np.linspace(0, 1, 10001)
+        self.parameters = {
+            'gaussian': [1.2, 0.5, 0.08],
+            'waterbag': [1.2, 0.5, 0.3],
+            'parabolicLine': [1.2, 0.5, 0.3],
+            'parabolicAmplitude': [1.2, 0.5, 0.3],
+            'binomialAmplitude2': [1.2, 0.5, 0.3],
+            'binomialAmplitudeN': [1.2, 0.5, 0.3, 2.7],
+            'cosine': [1.2, 0.5, 0.3],
+            'cosineSquared': [1.2, 0.5, 0.3]}
+
+    def test_numerical_fft(self):
+        # Analytic spectra compared to the scaled DFT of the sampled profiles
+
+        time_step = self.time[1] - self.time[0]
+        frequency = np.fft.rfftfreq(len(self.time), time_step)[:50]
+
+        for name, parameters in self.parameters.items():
+            with self.subTest(name):
+                profile_function = getattr(analytic_distribution, name)
+                spectrum_function = analytic_distribution.spectra[
+                    profile_function]
+                self.assertIs(spectrum_function,
+                              getattr(analytic_distribution,
+                                      name + '_spectrum'))
+
+                expected = np.fft.rfft(
+                    profile_function(self.time, *parameters))[:50]*time_step
+
+                np.testing.assert_allclose(
+                    spectrum_function(frequency, *parameters), expected,
+                    rtol=0, atol=1e-5)
+
+    def test_cosine_limit(self):
+
+        bunchLength = 0.3
+        frequency = 1/(2*bunchLength) * np.array([1-1e-6, 1, 1+1e-6])
+
+        np.testing.assert_allclose(
+            analytic_distribution.cosine_spectrum(frequency, 1., 0.,
+                                                  bunchLength),
+            bunchLength/2, rtol=1e-5)
+
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -214,6 +214,103 @@ class TestImpedanceSources(unittest.TestCase):
                                 'excepted WrongCalcError exception', [1, 2, 3])
 
 
+class TestMultiModeEvaluation(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(3)
+        self.n_modes = 7
+        self.R_S = rng.uniform(1e3, 1e6, self.n_modes)
+        self.frequency_R = rng.uniform(1e8, 1e9, self.n_modes)
+        self.Q = rng.uniform(1, 1e3, self.n_modes)
+        self.a_factor = rng.uniform(1e-8, 1e-7, self.n_modes)
+
+        self.frequency_array = np.linspace(0, 2e9, 1001)
+        self.time_array = np.linspace(-1e-8, 2e-7, 1001)
+
+        # Small blocks to also cover the splitting in modes and points
+        self.block_size = impSource.block_size
+        impSource.block_size = 300
+
+    def tearDown(self):
+
+        impSource.block_size = self.block_size
+
+    def test_resonators(self):
+
+        imp = impSource.Resonators(self.R_S, self.frequency_R, self.Q)
+        imp.imped_calc(self.frequency_array)
+        imp.wake_calc(self.time_array)
+
+        impedance = np.zeros(len(self.frequency_array), complex)
+        wake = np.zeros(len(self.time_array))
+        for i in range(self.n_modes):
+            mode = impSource.Resonators(self.R_S[i], self.frequency_R[i],
+                                        self.Q[i])
+            mode.imped_calc(self.frequency_array)
+            mode.wake_calc(self.time_array)
+            impedance += mode.impedance
+            wake += mode.wake
+
+        np.testing.assert_allclose(imp.impedance, impedance, rtol=1e-12)
+        np.testing.assert_allclose(imp.wake, wake, rtol=1e-12,
+                                   atol=1e-12*np.max(np.abs(wake)))
+        self.assertEqual(imp.impedance[0], 0)
+        np.testing.assert_array_equal(imp.wake[self.time_array < 0], 0)
+
+        # Single mode, compared to the analytic expressions
+        mode = impSource.Resonators(self.R_S[0], self.frequency_R[0],
+                                    self.Q[0])
+        mode.imped_calc(self.frequency_array[1:])
+        np.testing.assert_allclose(
+            mode.impedance, self.R_S[0] / (1 + 1j * self.Q[0] * (
+                self.frequency_array[1:] / self.frequency_R[0] -
+                self.frequency_R[0] / self.frequency_array[1:])),
+            rtol=1e-12)
+
+    def test_traveling_wave(self):
+
+        imp = impSource.TravelingWaveCavity(self.R_S, self.frequency_R,
+                                            self.a_factor)
+        imp.imped_calc(self.frequency_array)
+        imp.wake_calc(self.time_array)
+
+        impedance = np.zeros(len(self.frequency_array), complex)
+        wake = np.zeros(len(self.time_array))
+        for i in range(self.n_modes):
+            mode = impSource.TravelingWaveCavity(
+                self.R_S[i], self.frequency_R[i], self.a_factor[i])
+            mode.imped_calc(self.frequency_array)
+            mode.wake_calc(self.time_array)
+            impedance += mode.impedance
+            wake += mode.wake
+
+        np.testing.assert_allclose(imp.impedance, impedance, rtol=1e-12)
+        np.testing.assert_allclose(imp.wake, wake, rtol=1e-12,
+                                   atol=1e-12*np.max(np.abs(wake)))
+
+        # Single mode, compared to the analytic expressions
+        a_factor = self.a_factor[0]
+        u_minus = a_factor * (self.frequency_array - self.frequency_R[0])
+        u_plus = a_factor * (self.frequency_array + self.frequency_R[0])
+        expected = self.R_S[0] * sum(
+            (np.sin(u / 2) / (u / 2))**2 - 2j * (u - np.sin(u)) / u**2
+            for u in [u_minus, u_plus])
+        a_tilde = a_factor / (2 * np.pi)
+        expected_wake = np.where(
+            (self.time_array >= 0) & (self.time_array <= a_tilde),
+            (np.sign(self.time_array) + 1) * 2 * self.R_S[0] / a_tilde *
+            (1 - self.time_array / a_tilde) *
+            np.cos(2 * np.pi * self.frequency_R[0] * self.time_array), 0)
+
+        mode = impSource.TravelingWaveCavity(self.R_S[0], self.frequency_R[0],
+                                             a_factor)
+        mode.imped_calc(self.frequency_array)
+        mode.wake_calc(self.time_array)
+        np.testing.assert_allclose(mode.impedance, expected, rtol=1e-12)
+        np.testing.assert_allclose(mode.wake, expected_wake, rtol=1e-12,
+                                   atol=1e-12*np.max(np.abs(expected_wake)))
+
     
 if __name__ == '__main__':
     
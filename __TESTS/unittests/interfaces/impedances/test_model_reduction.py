@@ -0,0 +1,116 @@
+# coding: utf8
+# Copyright 2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for model_reduction.py
+:Authors: **Simon Albright**
+"""
+
+# General imports
+# ---------------
+import sys
+import os
+import unittest
+import warnings
+import numpy as np
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../../'))
+
+import blond_common.interfaces.impedances.impedance_sources as impSource
+import blond_common.interfaces.impedances.model_reduction as modRed
+import blond_common.devtools.exceptions as exceptions
+
+
+class TestModelReduction(unittest.TestCase):
+
+    def setUp(self):
+
+        self.resonators = impSource.Resonators([5E3, 1E4, 2E3],
+                                               [200E6, 650E6, 1.2E9],
+                                               [300, 20, 2])
+
+    def _assert_resonators(self, fitted):
+
+        order = np.argsort(fitted.frequency_R)
+        np.testing.assert_allclose(fitted.R_S[order], self.resonators.R_S,
+                                   rtol=1E-6)
+        np.testing.assert_allclose(fitted.frequency_R[order],
+                                   self.resonators.frequency_R, rtol=1E-6)
+        np.testing.assert_allclose(fitted.Q[order], self.resonators.Q,
+                                   rtol=1E-6)
+
+    def test_impedance_table(self):
+
+        frequency = np.linspace(0, 2E9, 100001)
+        self.resonators.imped_calc(frequency)
+        table = impSource.ImpedanceTable(frequency,
+                                         self.resonators.impedance.real,
+                                         self.resonators.impedance.imag)
+
+        fitted = modRed.fit_resonators(table, tolerance=1E-6)
+        self._assert_resonators(fitted)
+
+    def test_wake_table(self):
+
+        time = np.arange(20000) * 1E-10
+        self.resonators.wake_calc(time)
+        table = impSource.WakefieldTable(time, self.resonators.wake)
+
+        fitted = modRed.fit_resonators(table, tolerance=1E-6)
+        self._assert_resonators(fitted)
+
+    def test_tolerance(self):
+
+        # Not a sum of resonators
+        twc = impSource.TravelingWaveCavity(1E5, 200.01234E6, 0.5E-6)
+        frequency = np.linspace(150E6, 250E6, 10001)
+        twc.imped_calc(frequency)
+        table = impSource.ImpedanceTable(frequency, twc.impedance.real,
+                                         twc.impedance.imag)
+        reference = np.linalg.norm(twc.impedance)
+
+        fitted = modRed.fit_resonators(table, tolerance=0.2)
+        fitted.imped_calc(frequency)
+        error = np.linalg.norm(fitted.impedance - twc.impedance) / reference
+        self.assertLessEqual(error, 0.2)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            fitted = modRed.fit_resonators(table, tolerance=1E-3,
+                                           max_resonators=2)
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(fitted.n_resonators, 2)
+
+        fitted.imped_calc(frequency)
+        self.assertGreater(np.linalg.norm(fitted.impedance - twc.impedance)
+                           / reference, 1E-3)
+
+    def test_exceptions(self):
+
+        with self.assertRaises(exceptions.InputDataError):
+            modRed.fit_resonators(self.resonators)
+
+        with self.assertRaises(exceptions.InputDataError):
+            modRed.fit_resonators(impSource.ImpedanceTable(
+                [1E6, 2E6, 3E6], [1, np.nan, 1], [0, 0, 0]))
+
+        # No positive resistance
+        with self.assertRaises(exceptions.InputDataError):
+            modRed.fit_resonators(impSource.ImpedanceTable(
+                [1E6, 2E6, 3E6], [-1, -1, -1], [0, 0, 0]))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
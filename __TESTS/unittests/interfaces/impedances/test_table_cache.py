@@ -0,0 +1,185 @@
+# coding: utf8
+# Copyright 2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for table_cache.py
+:Authors: **Simon Albright**
+"""
+
+# General imports
+# ---------------
+import sys
+import os
+import unittest
+import unittest.mock as mk
+import tempfile
+import numpy as np
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../../'))
+
+import blond_common.interfaces.impedances.impedance_sources as impSource
+import blond_common.interfaces.impedances.table_cache as tabCache
+import blond_common.devtools.exceptions as exceptions
+
+
+class TestTableCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tempDir.name, 'cache')
+
+        self.frequency = np.linspace(1E6, 1E9, 1000)
+        self.impedance_file = os.path.join(self.tempDir.name, 'imped.txt')
+        np.savetxt(self.impedance_file,
+                   np.stack([self.frequency, np.cos(self.frequency/1E8),
+                             np.sin(self.frequency/1E8)], axis=1),
+                   header='frequency real imag')
+
+        self.time = np.linspace(0, 1E-6, 500)
+        self.wake_file = os.path.join(self.tempDir.name, 'wake.txt')
+        np.savetxt(self.wake_file, np.stack([self.time, np.exp(-self.time
+                                                               / 1E-7)],
+                                            axis=1), delimiter=',')
+
+    def tearDown(self):
+
+        self.tempDir.cleanup()
+
+    def _load_impedance(self):
+
+        return tabCache.load_impedance_table(self.impedance_file,
+                                             self.cache_dir, skiprows=1)
+
+    def test_impedance_table(self):
+
+        reference = impSource.ImpedanceTable(
+            *np.loadtxt(self.impedance_file, unpack=True))
+
+        for call in range(2):
+            table = self._load_impedance()
+
+            np.testing.assert_array_equal(table.frequency_array_loaded,
+                                          reference.frequency_array_loaded)
+            np.testing.assert_array_equal(table.Re_Z_array_loaded,
+                                          reference.Re_Z_array_loaded)
+            np.testing.assert_array_equal(table.Im_Z_array_loaded,
+                                          reference.Im_Z_array_loaded)
+
+            # Views of the memory-mapped cache
+            self.assertIsInstance(table.frequency_array_loaded.base,
+                                  np.memmap)
+            self.assertFalse(table.Re_Z_array_loaded.flags.writeable)
+
+        # Nothing computed on the table grid before imped_calc
+        self.assertEqual(table.impedance, 0)
+        self.assertIsNone(table._impedance_loaded)
+        np.testing.assert_array_equal(
+            table.impedance_loaded,
+            table.Re_Z_array_loaded + 1j*table.Im_Z_array_loaded)
+
+        table.imped_calc(self.frequency)
+        reference.imped_calc(self.frequency)
+        np.testing.assert_array_equal(table.impedance, reference.impedance)
+
+    def test_copy(self):
+
+        # The tables built directly keep copies of the inputs
+        frequency = np.linspace(0, 1E9, 10)
+        real = np.ones(10)
+        table = impSource.ImpedanceTable(frequency, real, real)
+        wake_table = impSource.WakefieldTable(frequency, real)
+        real[:] = 2
+        np.testing.assert_array_equal(table.Re_Z_array_loaded, 1)
+        np.testing.assert_array_equal(wake_table.wake_array_loaded, 1)
+
+        table = impSource.ImpedanceTable(frequency, real, real, copy=False)
+        self.assertIs(table.Re_Z_array_loaded, real)
+
+    def test_impedance_loaded(self):
+
+        # Same impedance_loaded with and without copies, with the (0, 0)
+        # point added as in the frequency_array_loaded
+        frequency = np.linspace(1E6, 1E9, 10)
+        real = np.cos(frequency/1E8)
+        imag = np.sin(frequency/1E8)
+
+        copied = impSource.ImpedanceTable(frequency, real, imag)
+        table = impSource.ImpedanceTable(frequency, real, imag, copy=False)
+        self.assertEqual(len(copied.impedance_loaded), 11)
+        np.testing.assert_array_equal(table.impedance_loaded,
+                                      copied.impedance_loaded)
+
+        reference = impSource.ImpedanceTable(
+            *np.loadtxt(self.impedance_file, unpack=True))
+        np.testing.assert_array_equal(self._load_impedance().impedance_loaded,
+                                      reference.impedance_loaded)
+
+    def test_wake_table(self):
+
+        table = tabCache.load_wake_table(self.wake_file, delimiter=',')
+        reference = impSource.WakefieldTable(
+            *np.loadtxt(self.wake_file, delimiter=',', unpack=True))
+
+        np.testing.assert_array_equal(table.time_array_loaded,
+                                      reference.time_array_loaded)
+        np.testing.assert_array_equal(table.wake_array_loaded,
+                                      reference.wake_array_loaded)
+
+        # The cache is next to the text file by default
+        self.assertEqual(len([name for name in os.listdir(self.tempDir.name)
+                              if name.endswith('.npy')]), 1)
+
+    def test_invalidation(self):
+
+        self._load_impedance()
+        data = np.loadtxt(self.impedance_file)
+        data[:, 1] *= 2
+
+        with mk.patch.object(tabCache.np, 'loadtxt',
+                             wraps=np.loadtxt) as loadtxt:
+
+            # Same size and modification time, the file is not hashed
+            with mk.patch.object(tabCache, '_file_digest') as digest:
+                self._load_impedance()
+            digest.assert_not_called()
+
+            # New modification time and same content, not parsed
+            stat = os.stat(self.impedance_file)
+            os.utime(self.impedance_file,
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self._load_impedance()
+            loadtxt.assert_not_called()
+
+            # New content
+            np.savetxt(self.impedance_file, data, header='new')
+            table = self._load_impedance()
+            self.assertEqual(loadtxt.call_count, 1)
+
+        np.testing.assert_array_equal(table.Re_Z_array_loaded[1:],
+                                      2*np.cos(self.frequency/1E8))
+
+    def test_exceptions(self):
+
+        with self.assertRaises(exceptions.InputDataError):
+            tabCache.load_impedance_table(self.impedance_file,
+                                          usecols=(0, 1))
+
+        with self.assertRaises(exceptions.InputDataError):
+            tabCache.load_wake_table(self.wake_file, usecols=(0, 1, 2))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
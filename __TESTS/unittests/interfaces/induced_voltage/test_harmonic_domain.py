@@ -0,0 +1,196 @@
+# coding: utf8
+# Copyright 2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for harmonic_domain.py
+:Authors: **Simon Albright**
+"""
+
+# General imports
+# ---------------
+import sys
+import os
+import unittest
+import unittest.mock as mk
+import numpy as np
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../../'))
+
+import blond_common.interfaces.impedances.impedance_sources as impSource
+import blond_common.interfaces.induced_voltage.induced_voltage as indVolt
+import blond_common.interfaces.induced_voltage.harmonic_domain as harmDom
+import blond_common.interfaces.beam.analytic_distribution as analDist
+from blond_common.interfaces.machine_parameters.ring import Ring, \
+    RingSection
+from blond_common.interfaces.beam.beam import Proton
+import blond_common.devtools.exceptions as exceptions
+
+
+class TestHarmonicDomain(unittest.TestCase):
+
+    def setUp(self):
+
+        self.f_rev = 1E6
+        self.max_frequency = 150E6
+
+        # One turn, with the cutoff below the Nyquist frequency
+        self.n_points = 1000
+        self.time = np.arange(self.n_points) / (self.f_rev * self.n_points)
+        self.profile = analDist.gaussian(self.time, 1, 0.3E-6, 10E-9)
+
+        self.resonators = impSource.Resonators([1E3, 2E3], [15E6, 40E6],
+                                               [30, 5])
+
+    def _reference(self, profile):
+
+        frequency = np.fft.rfftfreq(self.n_points,
+                                    self.time[1] - self.time[0])
+        self.resonators.imped_calc(frequency)
+        return indVolt.calc_induced_freq(
+            np.fft.rfft(profile), self.resonators.impedance
+            * (frequency <= self.max_frequency))
+
+    def _assert_close(self, actual, expected):
+
+        np.testing.assert_allclose(actual, expected, rtol=0,
+                                   atol=1E-10*np.max(np.abs(expected)))
+
+    def test_one_turn(self):
+
+        harmonic = harmDom.HarmonicInducedVoltage([self.resonators],
+                                                  self.max_frequency)
+        harmonic.update(self.f_rev)
+        self.assertEqual(harmonic.n_harmonics, 151)
+
+        self._assert_close(harmonic.induced_voltage(self.time, self.profile),
+                           self._reference(self.profile))
+
+        # Profile shorter than one turn, zero elsewhere
+        short = self.profile[200:500]
+        self._assert_close(harmonic.induced_voltage(self.time[200:500],
+                                                    short),
+                           self._reference(self.profile)[200:500])
+
+        # Stack of profiles
+        profiles = np.stack([self.profile, np.roll(self.profile, 100)])
+        induced = harmonic.induced_voltage(self.time, profiles)
+        for profile, profile_induced in zip(profiles, induced):
+            self._assert_close(profile_induced, self._reference(profile))
+
+    def test_output_time(self):
+
+        harmonic = harmDom.HarmonicInducedVoltage([self.resonators],
+                                                  self.max_frequency)
+        harmonic.update(self.f_rev)
+        induced = harmonic.induced_voltage(self.time, self.profile)
+
+        # Direct transform on the grid and one turn later
+        for shift in [0, 1/self.f_rev]:
+            self._assert_close(harmonic.induced_voltage(
+                self.time, self.profile, self.time + shift), induced)
+
+        # Off the grid, the induced voltage is periodic
+        output_time = np.linspace(0, 3/self.f_rev, 777)
+        off_grid = harmonic.induced_voltage(self.time, self.profile,
+                                            output_time)
+        self._assert_close(off_grid[output_time >= 1/self.f_rev][:50],
+                           harmonic.induced_voltage(
+                               self.time, self.profile,
+                               output_time[output_time >= 1/self.f_rev][:50]
+                               - 1/self.f_rev))
+
+        with mk.patch.object(harmDom, 'block_size', 300):
+            self._assert_close(harmonic.induced_voltage(
+                self.time, self.profile, output_time), off_grid)
+
+    def test_ring(self):
+
+        ring = Ring(Proton(), [RingSection(628, 1E-3,
+                                           [1E9, 1.5E9, 2E9, 2E9])])
+
+        harmonic = harmDom.HarmonicInducedVoltage(
+            [self.resonators], self.max_frequency, ring=ring)
+
+        with mk.patch.object(self.resonators, 'imped_calc',
+                             wraps=self.resonators.imped_calc) as imped:
+            for sample in range(4):
+                harmonic.update(sample=sample)
+                self.assertEqual(harmonic.f_rev, ring.f_rev[sample])
+                np.testing.assert_allclose(
+                    harmonic.frequency_array[1], ring.f_rev[sample])
+
+            # Same f_rev for the last two samples
+            self.assertEqual(imped.call_count, 3)
+
+        harmonic.update(cycle_time=ring.cycle_time[1])
+        self.assertAlmostEqual(harmonic.f_rev, ring.f_rev[1])
+
+    def test_induced_voltage_object(self):
+
+        twc = impSource.TravelingWaveCavity(1E4, 20E6, 0.2E-6)
+
+        induced = indVolt.InducedVoltage(
+            impedance_list=[self.resonators], wake_list=[twc],
+            harmonic_cutoff=self.max_frequency)
+        induced.profile = (self.time, self.profile)
+        induced.sum_impedance_sources(f_rev=self.f_rev)
+        induced.calc_induced(2)
+
+        twc.wake_calc(self.time)
+        expected = 2*(self._reference(self.profile)
+                      + indVolt.calc_induced_time(self.profile, twc.wake))
+        self._assert_close(induced.VInduced, expected)
+
+        profiles = np.stack([self.profile, 2*self.profile])
+        batch = induced.calc_induced_batch(profiles, 2)
+        self._assert_close(batch[1], 2*expected)
+
+        # Per profile f_rev, the f_rev of the sum is kept
+        batch = induced.calc_induced_batch(profiles, 2, [self.f_rev, 0.9E6])
+        self._assert_close(batch[0], expected)
+        self.assertEqual(induced._harmonic.f_rev, self.f_rev)
+
+    def test_exceptions(self):
+
+        with self.assertRaises(exceptions.InputDataError):
+            harmDom.HarmonicInducedVoltage([self.resonators], 0)
+
+        harmonic = harmDom.HarmonicInducedVoltage([self.resonators],
+                                                  self.max_frequency)
+
+        with self.assertRaises(exceptions.MissingParameterError):
+            harmonic.induced_voltage(self.time, self.profile)
+
+        with self.assertRaises(exceptions.MissingParameterError):
+            harmonic.update(sample=0)
+
+        # Profile longer than one turn
+        harmonic.update(2*self.f_rev)
+        with self.assertRaises(exceptions.InputDataError):
+            harmonic.induced_voltage(self.time, self.profile)
+
+        with self.assertRaises(exceptions.InputDataError):
+            indVolt.InducedVoltage(harmonic_cutoff=1E9,
+                                   multi_turn_memory=1E-6)
+
+        induced = indVolt.InducedVoltage(impedance_list=[self.resonators],
+                                         harmonic_cutoff=1E9)
+        induced.profile = (self.time, self.profile)
+        with self.assertRaises(exceptions.MissingParameterError):
+            induced.sum_impedance_sources()
+
+
+if __name__ == '__main__':
+
+    unittest.main()
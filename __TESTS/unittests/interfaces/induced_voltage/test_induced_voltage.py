@@ -0,0 +1,328 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for induced_voltage.py
+:Authors: **Simon Albright**
+"""
+
+# General imports
+# ---------------
+import sys
+import os
+import unittest
+import unittest.mock as mk
+import numpy as np
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../../'))
+
+import blond_common.interfaces.impedances.impedance_sources as impSource
+import blond_common.interfaces.induced_voltage.induced_voltage as indVolt
+import blond_common.interfaces.beam.analytic_distribution as analDist
+import blond_common.devtools.exceptions as exceptions
+
+
+class TestImpedanceCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time = np.linspace(0, 20E-6, 2000)
+        self.profile = analDist.gaussian(self.time, 1, 0.5E-6, 0.025E-6)
+
+        self.resonators = impSource.Resonators([1E3, 2E3], [15E6, 40E6],
+                                               [30, 5])
+        self.twc = impSource.TravelingWaveCavity(1E4, 200E6, 1E-6)
+        self.varResonators = impSource.VariableResonators(
+            [[[1E6, 2E6], [1E3, 1E3]]], [[[1E6, 2E6], [10E6, 20E6]]],
+            [[[1E6, 2E6], [10, 10]]])
+
+        self.induced = indVolt.InducedVoltage(
+            impedance_list=[self.resonators, self.twc],
+            var_impedance_list=[self.varResonators])
+        self.induced.profile = (self.time, self.profile)
+
+    def _expected_impedance(self, f_rev):
+
+        frequency = self.induced.interp_frequency_array
+        varResonators = impSource.Resonators(1E3, 10E6*f_rev/1E6, 10)
+        expected = 0
+        for source in [self.resonators, self.twc, varResonators]:
+            source.imped_calc(frequency)
+            expected = expected + source.impedance
+        return expected
+
+    def test_cached_sum(self):
+
+        with mk.patch.object(self.resonators, 'imped_calc',
+                             wraps=self.resonators.imped_calc) as static, \
+            mk.patch.object(self.varResonators, 'imped_calc',
+                            wraps=self.varResonators.imped_calc) as var:
+
+            self.induced.sum_impedance_sources(f_rev=1.2E6)
+            first = self.induced.total_impedance.copy()
+            self.induced.sum_impedance_sources(f_rev=1.2E6)
+            self.induced.sum_impedance_sources(f_rev=1.5E6)
+
+            self.assertEqual(static.call_count, 1)
+            self.assertEqual(var.call_count, 2)
+
+            # Same parameters of the variable source above 2 MHz
+            self.induced.sum_impedance_sources(f_rev=2.5E6)
+            self.induced.sum_impedance_sources(f_rev=3E6)
+            self.assertEqual(var.call_count, 3)
+
+            # New frequency grid
+            self.induced.profile = (self.time[:1000], self.profile[:1000])
+            self.induced.sum_impedance_sources(f_rev=3E6)
+            self.assertEqual(static.call_count, 2)
+            self.assertEqual(var.call_count, 4)
+
+        np.testing.assert_allclose(self.induced.total_impedance,
+                                   self._expected_impedance(2E6))
+
+        self.induced.profile = (self.time, self.profile)
+        self.induced.sum_impedance_sources(f_rev=1.2E6)
+        np.testing.assert_array_equal(self.induced.total_impedance, first)
+        np.testing.assert_allclose(first, self._expected_impedance(1.2E6))
+
+    def test_by_source(self):
+
+        self.induced.sum_impedance_sources(f_rev=1.2E6)
+
+        with mk.patch.object(self.twc, 'imped_calc',
+                             wraps=self.twc.imped_calc) as static:
+            self.induced.calc_induced_by_source(f_rev=1.2E6)
+            self.assertEqual(static.call_count, 0)
+
+        self.twc.imped_calc(self.induced.interp_frequency_array)
+        np.testing.assert_array_equal(
+            self.induced.imped_induced[1],
+            indVolt.calc_induced_freq(self.induced.beam_spectrum,
+                                      self.twc.impedance))
+
+    def test_static_list_changed(self):
+
+        self.induced.sum_impedance_sources(f_rev=1.2E6)
+        self.induced.impedances_loaded = [self.twc]
+        self.induced.sum_impedance_sources(f_rev=1.2E6)
+
+        self.twc.imped_calc(self.induced.interp_frequency_array)
+        self.varResonators.imped_calc(self.induced.interp_frequency_array)
+        np.testing.assert_allclose(
+            self.induced.total_impedance,
+            self.twc.impedance + self.varResonators.impedance)
+
+    def test_missing_frequency(self):
+
+        induced = indVolt.InducedVoltage(impedance_list=[self.resonators])
+        with self.assertRaises(exceptions.MissingParameterError):
+            induced.sum_impedance_sources()
+
+    def test_variable_resonators_update(self):
+
+        self.assertTrue(self.varResonators.update(1.5E6))
+        np.testing.assert_allclose(self.varResonators.omega_R,
+                                   2*np.pi*15E6)
+        self.assertFalse(self.varResonators.update(1.5E6))
+        self.assertTrue(self.varResonators.update(2.5E6))
+        self.assertFalse(self.varResonators.update(3E6))
+
+
+class TestBatchInducedVoltage(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time = np.linspace(0, 20E-6, 1000)
+
+        rng = np.random.default_rng(0)
+        self.profiles = analDist.gaussian(
+            self.time, rng.uniform(0.5, 1.5, (25, 1)),
+            rng.normal(5E-6, 1E-7, (25, 1)), 0.1E-6)
+
+        self.varResonators = impSource.VariableResonators(
+            [[[1E6, 2E6], [1E3, 2E3]]], [[[1E6, 2E6], [10E6, 20E6]]],
+            [[[1E6, 2E6], [10, 10]]])
+
+        self.induced = indVolt.InducedVoltage(
+            impedance_list=[impSource.Resonators([1E3, 2E3], [15E6, 40E6],
+                                                 [30, 5])],
+            var_impedance_list=[self.varResonators],
+            wake_list=[impSource.Resonators(5E2, 5E6, 3)],
+            inductive_list=[impSource.InductiveImpedance(5.)])
+
+        self.induced.profile = (self.time, self.profiles[0])
+
+    def _loop(self, normalisation, f_rev):
+
+        induced_voltage = []
+        for profile, profile_f_rev in zip(self.profiles, f_rev):
+            self.induced.profile = (self.time, profile)
+            self.induced.sum_impedance_sources(f_rev=profile_f_rev)
+            self.induced.calc_induced(normalisation)
+            induced_voltage.append(self.induced.VInduced)
+
+        return np.array(induced_voltage)
+
+    def test_batch(self):
+
+        self.induced.sum_impedance_sources(f_rev=1.3E6)
+        induced_voltage = self.induced.calc_induced_batch(
+            self.profiles, 2., chunk_profiles=7)
+
+        self.assertEqual(induced_voltage.shape, self.profiles.shape)
+        np.testing.assert_allclose(
+            induced_voltage, self._loop(2., [1.3E6]*len(self.profiles)),
+            rtol=0, atol=1E-12*np.max(np.abs(induced_voltage)))
+
+    def test_batch_f_rev(self):
+
+        f_rev = np.linspace(1.1E6, 1.9E6, len(self.profiles))
+
+        self.induced.sum_impedance_sources(f_rev=1.3E6)
+        induced_voltage = self.induced.calc_induced_batch(
+            self.profiles, f_rev=f_rev, chunk_profiles=10)
+
+        np.testing.assert_allclose(
+            induced_voltage, self._loop(1, f_rev),
+            rtol=0, atol=1E-12*np.max(np.abs(induced_voltage)))
+
+    def test_exceptions(self):
+
+        with self.assertRaises(exceptions.MissingParameterError):
+            self.induced.calc_induced_batch(self.profiles)
+
+        self.induced.sum_impedance_sources(f_rev=1.3E6)
+        with self.assertRaises(exceptions.InputDataError):
+            self.induced.calc_induced_batch(self.profiles[:, :-1])
+        with self.assertRaises(exceptions.InputDataError):
+            self.induced.calc_induced_batch(self.profiles[0])
+
+
+class TestMultiTurnMemory(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_step = 1E-9
+        self.time = np.arange(1000) * self.time_step
+        self.amplitudes = [1, 1.2, 0.9, 1.1, 1.3]
+
+        # Wake decaying in about 6 us, turns of 1.5 us
+        self.resonators = impSource.Resonators([1E4, 2E3], [10E6, 3E6],
+                                               [200, 50])
+        self.twc = impSource.TravelingWaveCavity(1E3, 20E6, 1E-6)
+
+    def _profile(self, amplitude, time=None, turn_time=0):
+
+        if time is None:
+            time = self.time
+        return analDist.gaussian(time, amplitude, 0.3E-6 + turn_time,
+                                 0.02E-6)
+
+    def _multi_turn(self, t_rev, memory=60E-6, **sources):
+
+        induced = indVolt.InducedVoltage(multi_turn_memory=memory, **sources)
+
+        induced_voltage = []
+        for amplitude in self.amplitudes:
+            induced.profile = (self.time, self._profile(amplitude))
+            induced.sum_impedance_sources()
+            induced.calc_induced(f_rev=1/t_rev)
+            induced_voltage.append(induced.VInduced)
+
+        return induced, induced_voltage
+
+    def _single_grid(self, t_rev, **sources):
+
+        # All the turns on one grid, long enough for the wake to decay
+        n_points = 2*(int(len(self.amplitudes)*t_rev/self.time_step)//2) \
+            + 200000
+        time = np.arange(n_points) * self.time_step
+        profile = np.sum([self._profile(amplitude, time, turn*t_rev)
+                          for turn, amplitude in enumerate(self.amplitudes)],
+                         axis=0)
+
+        induced = indVolt.InducedVoltage(**sources)
+        induced.profile = (time, profile)
+        induced.sum_impedance_sources()
+        induced.calc_induced()
+
+        return [induced.VInduced[int(round(turn*t_rev/self.time_step)):]
+                [:len(self.time)] for turn in range(len(self.amplitudes))]
+
+    def _assert_close(self, actual, expected, tolerance):
+
+        scale = np.max(np.abs(expected))
+        for turn_actual, turn_expected in zip(actual, expected):
+            np.testing.assert_allclose(turn_actual, turn_expected, rtol=0,
+                                       atol=tolerance*scale)
+
+    def test_wakes(self):
+
+        t_rev = 1500 * self.time_step
+        sources = {'wake_list': [self.resonators, self.twc]}
+
+        induced, induced_voltage = self._multi_turn(t_rev, **sources)
+        self._assert_close(induced_voltage,
+                           self._single_grid(t_rev, **sources), 1E-12)
+
+        # The previous turns are not included after a reset
+        induced.reset_memory()
+        induced.profile = (self.time, self._profile(self.amplitudes[0]))
+        induced.calc_induced(f_rev=1/t_rev)
+        self._assert_close([induced.VInduced], induced_voltage[:1], 1E-12)
+
+    def test_impedances(self):
+
+        # The single grid impedance is evaluated with a finer frequency
+        # resolution
+        t_rev = 1500 * self.time_step
+        sources = {'impedance_list': [self.resonators]}
+
+        induced_voltage = self._multi_turn(t_rev, memory=120E-6,
+                                           **sources)[1]
+        self._assert_close(induced_voltage,
+                           self._single_grid(t_rev, **sources), 1E-6)
+
+    def test_recursion(self):
+
+        t_rev = 1500.37 * self.time_step
+        sources = {'wake_list': [self.resonators],
+                   'resonator_recursion': True}
+
+        induced, induced_voltage = self._multi_turn(t_rev, **sources)
+        np.testing.assert_allclose(induced._wake_recursion.time,
+                                   4*t_rev + len(self.time)*self.time_step)
+
+        # The time shift by a fraction of the time step with the phase
+        # factor agrees with the recursion
+        self._assert_close(
+            self._multi_turn(t_rev, wake_list=[self.resonators])[1],
+            induced_voltage, 1E-7)
+
+    def test_exceptions(self):
+
+        induced = indVolt.InducedVoltage(wake_list=[self.resonators],
+                                         multi_turn_memory=10E-6)
+        induced.profile = (self.time, self._profile(1))
+        induced.sum_impedance_sources()
+
+        with self.assertRaises(exceptions.MissingParameterError):
+            induced.calc_induced()
+        with self.assertRaises(exceptions.WrongCalcError):
+            induced.calc_induced_batch(self._profile(1)[np.newaxis, :])
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,137 @@
+# coding: utf8
+# Copyright 2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for multi_resolution.py
+:Authors: **Simon Albright**
+"""
+
+# General imports
+# ---------------
+import sys
+import os
+import unittest
+import numpy as np
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../../'))
+
+import blond_common.interfaces.impedances.impedance_sources as impSource
+import blond_common.interfaces.induced_voltage.induced_voltage as indVolt
+import blond_common.interfaces.induced_voltage.multi_resolution as multiRes
+import blond_common.interfaces.beam.analytic_distribution as analDist
+import blond_common.devtools.exceptions as exceptions
+
+
+class TestMultiResolution(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_step = 10E-12
+        self.n_points = 500
+        n_bunches = 12
+
+        rng = np.random.default_rng(1)
+        self.window_starts = np.round(
+            (np.arange(n_bunches)*25E-9 + rng.uniform(0, 1E-9, n_bunches))
+            / self.time_step) * self.time_step
+
+        time = np.arange(self.n_points) * self.time_step
+        self.profiles = analDist.gaussian(
+            time, rng.uniform(0.5, 1.5, (n_bunches, 1)),
+            rng.normal(2.5E-9, 0.1E-9, (n_bunches, 1)), 0.4E-9)
+
+        self.wake_list = [impSource.Resonators([1E6, 5E4], [200E6, 1E9],
+                                               [100, 1])]
+
+    def _single_grid(self):
+
+        indices = np.round(self.window_starts/self.time_step).astype(int)
+        n_points = indices[-1] + self.n_points
+        time = np.arange(n_points) * self.time_step
+
+        profile = np.zeros(n_points)
+        for index, bunch in zip(indices, self.profiles):
+            profile[index:index+self.n_points] += bunch
+
+        wake = np.zeros(n_points)
+        for source in self.wake_list:
+            source.wake_calc(time)
+            wake += source.wake
+
+        induced_voltage = indVolt.calc_induced_time(profile, wake)
+
+        return np.array([induced_voltage[index:index+self.n_points]
+                         for index in indices])
+
+    def test_error_bound(self):
+
+        expected = self._single_grid()
+
+        errors = []
+        for coarse_factor in [5, 20, 50]:
+            induced = multiRes.MultiResolutionInducedVoltage(
+                self.wake_list, self.time_step, coarse_factor)
+            induced_voltage = induced.calc_induced(self.window_starts,
+                                                   self.profiles)
+
+            self.assertEqual(induced_voltage.shape, self.profiles.shape)
+            error = np.max(np.abs(induced_voltage - expected))
+            self.assertLess(error, induced.error_bound)
+            errors.append(error)
+
+        # Second order in the coarse time step
+        self.assertLess(errors[0], 1E-3*np.max(np.abs(expected)))
+        np.testing.assert_allclose(errors[1]/errors[0], 16, rtol=0.2)
+
+        # Same result with the bunches in another order
+        order = np.random.default_rng(2).permutation(len(self.profiles))
+        np.testing.assert_allclose(
+            induced.calc_induced(self.window_starts[order],
+                                 self.profiles[order]),
+            induced_voltage[order])
+
+    def test_single_bunch(self):
+
+        induced = multiRes.MultiResolutionInducedVoltage(
+            self.wake_list, self.time_step, 10)
+
+        induced_voltage = induced.calc_induced(self.window_starts[:1],
+                                               self.profiles[:1])
+
+        self.wake_list[0].wake_calc(np.arange(self.n_points)*self.time_step)
+        np.testing.assert_allclose(
+            induced_voltage[0],
+            indVolt.calc_induced_time(self.profiles[0],
+                                      self.wake_list[0].wake))
+        self.assertEqual(induced.error_bound, 0)
+
+    def test_exceptions(self):
+
+        with self.assertRaises(exceptions.InputDataError):
+            multiRes.MultiResolutionInducedVoltage(self.wake_list, 0, 10)
+
+        induced = multiRes.MultiResolutionInducedVoltage(
+            self.wake_list, self.time_step, 1000)
+
+        # Windows closer than two coarse time steps
+        with self.assertRaises(exceptions.InputDataError):
+            induced.calc_induced(self.window_starts, self.profiles)
+
+        with self.assertRaises(exceptions.InputDataError):
+            induced.calc_induced(self.window_starts[:-1], self.profiles)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
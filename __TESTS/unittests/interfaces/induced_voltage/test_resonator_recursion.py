@@ -0,0 +1,149 @@
+# coding: utf8
+# Copyright 2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for resonator_recursion.py
+:Authors: **Simon Albright**
+"""
+
+# General imports
+# ---------------
+import sys
+import os
+import unittest
+import numpy as np
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../../'))
+
+import blond_common.interfaces.impedances.impedance_sources as impSource
+import blond_common.interfaces.induced_voltage.induced_voltage as indVolt
+import blond_common.interfaces.induced_voltage.resonator_recursion as recur
+import blond_common.interfaces.beam.analytic_distribution as analDist
+import blond_common.devtools.exceptions as exceptions
+
+
+class TestResonatorRecursion(unittest.TestCase):
+
+    def setUp(self):
+
+        self.time_step = 1E-10
+        self.time = np.arange(20000) * self.time_step
+        self.profile = analDist.gaussian(self.time, 1, 0.5E-6, 0.025E-6)
+
+        # The last resonator is at the Nyquist frequency
+        self.resonators = impSource.Resonators(
+            [1E6, 5E6, 1E4, 1E5], [200E6, 800E6, 10E6, 5E9],
+            [100, 10, 3, 1000])
+
+    def _reference(self, profile):
+
+        self.resonators.wake_calc(np.arange(len(profile)) * self.time_step)
+        return indVolt.calc_induced_time(profile, self.resonators.wake)
+
+    def _assert_close(self, actual, expected):
+
+        np.testing.assert_allclose(actual, expected, rtol=0,
+                                   atol=1E-11*np.max(np.abs(expected)))
+
+    def test_single_profile(self):
+
+        recursion = recur.ResonatorRecursion(self.resonators, self.time_step)
+        np.testing.assert_array_equal(recursion._real_filter,
+                                      [True, True, True, False])
+
+        self._assert_close(recursion.induced_voltage(self.profile),
+                           self._reference(self.profile))
+        self.assertAlmostEqual(recursion.time, 20000*self.time_step)
+
+        # Same result with the resonators split in several objects
+        recursion = recur.ResonatorRecursion(
+            [impSource.Resonators(1E6, 200E6, 100),
+             impSource.Resonators([5E6, 1E4, 1E5], [800E6, 10E6, 5E9],
+                                  [10, 3, 1000])], self.time_step)
+        self._assert_close(recursion.induced_voltage(self.profile),
+                           self._reference(self.profile))
+
+    def test_wake_memory(self):
+
+        recursion = recur.ResonatorRecursion(self.resonators, self.time_step)
+        expected = self._reference(np.tile(self.profile, 3))
+
+        # Consecutive profiles
+        induced = [recursion.induced_voltage(self.profile)
+                   for turn in range(3)]
+        self._assert_close(np.concatenate(induced), expected)
+
+        # Profiles separated by gaps
+        gap_profile = np.concatenate((self.profile, np.zeros(5000)))
+        expected = self._reference(np.tile(gap_profile, 3))
+        recursion.reset()
+        for turn in range(3):
+            start = turn * len(gap_profile)
+            induced = recursion.induced_voltage(
+                self.profile, start * self.time_step)
+            self._assert_close(induced, expected[start:start+20000])
+
+        with self.assertRaises(exceptions.InputDataError):
+            recursion.induced_voltage(self.profile, 0)
+
+    def test_batch(self):
+
+        recursion = recur.ResonatorRecursion(self.resonators, self.time_step)
+        recursion.induced_voltage(self.profile)
+        state = recursion.state.copy()
+
+        profiles = np.stack([self.profile, 2*self.profile,
+                             np.roll(self.profile, 1000)])
+        induced = recursion.batch_induced_voltage(profiles)
+
+        for profile, profile_induced in zip(profiles, induced):
+            self._assert_close(profile_induced, self._reference(profile))
+        np.testing.assert_array_equal(recursion.state, state)
+
+    def test_exceptions(self):
+
+        with self.assertRaises(exceptions.InputDataError):
+            recur.ResonatorRecursion(impSource.Resonators(1E3, 10E6, 0.4),
+                                     self.time_step)
+
+        with self.assertRaises(exceptions.InputDataError):
+            recur.ResonatorRecursion(self.resonators, 0)
+
+    def test_induced_voltage_object(self):
+
+        twc = impSource.TravelingWaveCavity(1E4, 200E6, 1E-6)
+
+        induced = indVolt.InducedVoltage(
+            wake_list=[self.resonators, twc], resonator_recursion=True)
+        induced.profile = (self.time, self.profile)
+        induced.sum_impedance_sources()
+
+        reference = indVolt.InducedVoltage(wake_list=[self.resonators, twc])
+        reference.profile = (self.time, self.profile)
+        reference.sum_impedance_sources()
+
+        # The recursion does not depend on the previous calls
+        for call in range(2):
+            induced.calc_induced(2)
+            reference.calc_induced(2)
+            self._assert_close(induced.VInduced, reference.VInduced)
+
+        profiles = np.stack([self.profile, 2*self.profile])
+        self._assert_close(induced.calc_induced_batch(profiles),
+                           reference.calc_induced_batch(profiles))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -18,6 +18,7 @@ import sys
 import unittest
 import numpy as np
 import os
+import tempfile
 from scipy.constants import c
 
 this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
@@ -652,6 +653,158 @@ class TestRing(unittest.TestCase):
             section = RingSection(length, alpha_0, momentum)
             Ring(particle, [section], eta_orders=eta_orders)
 
+    def test_compressed_programs(self):
+        # Test the compressed storage of the sampled programs
+
+        length = 6911.5  # m
+        alpha_0 = 1 / 18**2
+        momentum = [[0, 0.1, 0.3, 0.4], [26e9, 26e9, 30e9, 30e9]]
+        particle = Proton()
+        tolerance = 1e-9
+
+        section = RingSection(length, alpha_0, momentum)
+        ring = Ring(particle, section)
+        ring_compressed = Ring(particle, section,
+                               compress_tolerance=tolerance)
+
+        with self.subTest('Compressed programs - memory'):
+            self.assertLess(ring_compressed.momentum.nbytes,
+                            ring.momentum.nbytes / 10)
+
+        for attribute in ['momentum', 'beta', 'energy', 't_rev', 'eta_0',
+                          'delta_E', 'cycle_time']:
+            with self.subTest('Compressed programs - ' + attribute):
+                reference = np.asarray(getattr(ring, attribute))
+                np.testing.assert_allclose(
+                    np.asarray(getattr(ring_compressed, attribute)),
+                    reference, rtol=0,
+                    atol=tolerance * np.max(np.abs(reference)))
+
+        with self.subTest('Compressed programs - parameters_at_sample'):
+            parameters = ring.parameters_at_sample(5000)
+            parameters_compressed = ring_compressed.parameters_at_sample(5000)
+            for key in ['momentum', 'beta', 'f_rev', 'eta_0']:
+                np.testing.assert_allclose(parameters_compressed[key],
+                                           parameters[key], rtol=tolerance)
+
+        with self.subTest('Compressed programs - parameters_at_time'):
+            moments = np.linspace(0, 0.35, 10)
+            parameters = ring.parameters_at_time(moments)
+            parameters_compressed = ring_compressed.parameters_at_time(
+                moments)
+            for key in ['momentum', 'beta', 'f_rev', 'eta_0']:
+                np.testing.assert_allclose(parameters_compressed[key],
+                                           parameters[key], rtol=1e-8)
+
+    def test_broadcast_constant_programs(self):
+        # Test that constant programs are stored as zero-stride views
+
+        n_sections = 12
+        length = 6911.5 / n_sections  # m
+        alpha_0 = 1 / 18**2
+        momentum = [[0, 0.1, 0.3, 0.4], [26e9, 26e9, 30e9, 30e9]]
+        particle = Proton()
+
+        sections = [RingSection(length, alpha_0, momentum)
+                    for i in range(n_sections)]
+        with self.assertWarns(Warning):
+            ring = Ring(particle, sections)
+
+        for attribute in ['momentum', 'beta', 'energy', 'section_length',
+                          'alpha_0']:
+            with self.subTest('Broadcast programs - ' + attribute):
+                program = getattr(ring, attribute)
+                self.assertEqual(program.shape,
+                                 (n_sections, len(ring.cycle_time)))
+                self.assertIn(0, program.strides)
+                np.testing.assert_equal(np.asarray(program[-1]),
+                                        np.asarray(program[0]))
+
+        with self.subTest('Broadcast programs - values'):
+            np.testing.assert_equal(np.asarray(ring.alpha_0), alpha_0)
+            np.testing.assert_allclose(np.asarray(ring.circumference),
+                                       n_sections * length)
+            np.testing.assert_allclose(
+                ring.t_rev, n_sections * length / (ring.beta[0] * c))
+
+
+    def test_storage_dir(self):
+        # Test the memory mapped storage of the sampled programs
+
+        length = 6911.5  # m
+        alpha_0 = 1 / 18**2
+        momentum = [[0, 0.1, 0.3, 0.4], [26e9, 26e9, 30e9, 30e9]]
+        particle = Proton()
+
+        section = RingSection(length, alpha_0, momentum)
+        ring = Ring(particle, section)
+
+        with tempfile.TemporaryDirectory() as storage_dir:
+            ring_stored = Ring(particle, section, storage_dir=storage_dir)
+
+            with self.subTest('Stored programs - files'):
+                self.assertGreater(len(os.listdir(storage_dir)), 0)
+                self.assertIsInstance(ring_stored.momentum,
+                                      dTypes.ring_programs.momentum_program)
+                self.assertIsInstance(ring_stored.cycle_time, np.memmap)
+
+            for attribute in ['momentum', 'beta', 'energy', 't_rev',
+                              'eta_0', 'delta_E', 'cycle_time', 'use_turns']:
+                with self.subTest('Stored programs - ' + attribute):
+                    np.testing.assert_equal(
+                        np.asarray(getattr(ring_stored, attribute)),
+                        np.asarray(getattr(ring, attribute)))
+
+            del ring_stored
+
+
+    def test_with_particle(self):
+        # Test the derivation of the Ring for another particle
+
+        length = 6911.5  # m
+        alpha_0 = 1 / 18**2
+        bending_radius = 741.3  # m
+        lead = Particle(193.7e9, 54)
+
+        sections = {
+            'B field by time': (RingSection(
+                length, alpha_0, dTypes.ring_programs.bending_field_program(
+                    [[0, 0.1, 0.3, 0.4], [0.1, 0.1, 1., 1.]]),
+                bending_radius=bending_radius),
+                {'store_turns': False, 'interp_time': 1e-3}),
+            'B field by time turns': (RingSection(
+                length, alpha_0, dTypes.ring_programs.bending_field_program(
+                    [[0, 0.01, 0.03, 0.04], [0.1, 0.1, 1., 1.]]),
+                bending_radius=bending_radius), {}),
+            'Kinetic energy by turn': (RingSection(
+                length, alpha_0, dTypes.ring_programs.kinetic_energy_program(
+                    np.linspace(14e9, 20e9, 1000))), {'eta_orders': 2}),
+            'Total energy by time': (RingSection(
+                length, alpha_0, dTypes.ring_programs.total_energy_program(
+                    [[0, 0.1, 0.3, 0.4], [300e9, 300e9, 400e9, 400e9]])),
+                {'store_turns': False, 'interp_time': 1e-3}),
+            'Kinetic energy by time': (RingSection(
+                length, alpha_0, dTypes.ring_programs.kinetic_energy_program(
+                    [[0, 0.1, 0.3, 0.4], [300e9, 300e9, 400e9, 400e9]])),
+                {'store_turns': False, 'interp_time': 1e-3})}
+
+        for name, (section, options) in sections.items():
+            ring = Ring(Proton(), section, **options)
+            reference = Ring(lead, section, **options)
+            ring_lead = ring.with_particle(lead)
+
+            self.assertIs(ring_lead.Particle, lead)
+            np.testing.assert_equal(ring_lead.n_turns, reference.n_turns)
+
+            for attribute in ['cycle_time', 'momentum', 'beta', 'energy',
+                              't_rev', 'delta_E', 'eta_0']:
+                with self.subTest(name + ' - ' + attribute):
+                    expected = np.asarray(getattr(reference, attribute))
+                    np.testing.assert_allclose(
+                        np.asarray(getattr(ring_lead, attribute)),
+                        expected, rtol=0,
+                        atol=1e-10 * np.max(np.abs(expected)))
+
 
 if __name__ == '__main__':
 
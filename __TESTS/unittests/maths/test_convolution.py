@@ -0,0 +1,87 @@
+# coding: utf8
+# Copyright 2019 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for the blond_common.maths.convolution module
+
+:Authors: **Simon Albright**
+
+"""
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+from blond_common.maths.convolution import convolve, FFTConvolution
+
+
+class TestConvolution(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(1)
+        self.signal = rng.random(1000)
+        self.kernel = rng.random(5000)
+
+    def _reference(self, signal, kernel, n_output):
+
+        reference = np.convolve(signal, kernel)
+        return np.concatenate((reference, np.zeros(n_output)))[:n_output]
+
+    def test_convolve(self):
+
+        for n_signal, n_kernel, n_output in [(1000, 5000, 1000),
+                                             (1000, 300, 1000),
+                                             (1000, 5000, 150),
+                                             (200, 1000, 2000),
+                                             (1000, 10, 1000),
+                                             (30, 50, 100)]:
+            with self.subTest('%d - %d - %d' % (n_signal, n_kernel,
+                                                n_output)):
+                signal = self.signal[:n_signal]
+                kernel = self.kernel[:n_kernel]
+
+                np.testing.assert_allclose(
+                    convolve(signal, kernel, n_output),
+                    self._reference(signal, kernel, n_output),
+                    rtol=0, atol=1e-10)
+
+        np.testing.assert_allclose(convolve(self.signal, self.kernel),
+                                   np.convolve(self.signal, self.kernel),
+                                   rtol=0, atol=1e-10)
+
+    def test_cached_kernel(self):
+
+        wake_convolution = FFTConvolution(self.kernel)
+
+        first = wake_convolution.convolve(self.signal, len(self.signal))
+        self.assertEqual(len(wake_convolution._kernel_fft), 1)
+
+        second = wake_convolution.convolve(2*self.signal, len(self.signal))
+        self.assertEqual(len(wake_convolution._kernel_fft), 1)
+
+        np.testing.assert_allclose(second, 2*first, rtol=1e-12)
+        np.testing.assert_allclose(
+            first, self._reference(self.signal, self.kernel,
+                                   len(self.signal)), rtol=0, atol=1e-10)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,117 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Test utilities.cache.py
+
+'''
+
+# General imports
+# ---------------
+import sys
+import unittest
+import numpy as np
+import os
+import tempfile
+
+this_directory = os.path.dirname(os.path.realpath(__file__)) + "/"
+
+# BLonD_Common imports
+# --------------------
+if os.path.abspath(this_directory + '../../../../') not in sys.path:
+    sys.path.insert(0, os.path.abspath(this_directory + '../../../../'))
+
+
+from blond_common.utilities.cache import ProgramCache
+from blond_common.interfaces.machine_parameters.ring import Ring, RingSection
+from blond_common.interfaces.beam.beam import Proton, Electron
+from blond_common.devtools import exceptions
+
+
+class test_cache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tempDir.name
+
+    def tearDown(self):
+
+        self.tempDir.cleanup()
+
+    def test_key(self):
+
+        key = ProgramCache.key(np.arange(10.), 'linear', 1E-3, (0, 1))
+
+        self.assertEqual(key, ProgramCache.key(np.arange(10.), 'linear',
+                                               1E-3, (0, 1)))
+        self.assertNotEqual(key, ProgramCache.key(np.arange(10.) + 1,
+                                                  'linear', 1E-3, (0, 1)))
+        self.assertNotEqual(key, ProgramCache.key(np.arange(10.), 'linear',
+                                                  2E-3, (0, 1)))
+
+        with self.assertRaises(exceptions.InputDataError):
+            ProgramCache.key(lambda x: x)
+
+    def test_save_load(self):
+
+        cache = ProgramCache(self.cache_dir)
+        self.assertIsNone(cache.load('missing'))
+
+        cache.save('entry', data=np.arange(10), n_turns=np.NaN)
+        loaded = cache.load('entry')
+        np.testing.assert_equal(loaded['data'], np.arange(10))
+        self.assertTrue(np.isnan(loaded['n_turns']))
+
+    def test_eviction(self):
+
+        data = np.zeros(1000)
+        cache = ProgramCache(self.cache_dir, max_size=2.5*data.nbytes)
+
+        for i, key in enumerate(['first', 'second']):
+            cache.save(key, data=data)
+            os.utime(cache.file_name(key), (i, i))
+
+        # Accessing the first entry makes the second the least recently used
+        cache.load('first')
+        cache.save('third', data=data)
+
+        self.assertIsNotNone(cache.load('first'))
+        self.assertIsNone(cache.load('second'))
+        self.assertIsNotNone(cache.load('third'))
+
+    def test_ring_cache(self):
+
+        momentum = [[0, 0.1, 0.3, 0.4], [26e9, 26e9, 30e9, 30e9]]
+        section = RingSection(6911.5, 1 / 18**2, momentum)
+
+        ring = Ring(Proton(), section)
+        ring_first = Ring(Proton(), section, cache=self.cache_dir)
+        ring_cached = Ring(Proton(), section, cache=self.cache_dir)
+
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertEqual(ring_cached.n_turns, ring.n_turns)
+
+        for attribute in ['cycle_time', 'use_turns', 'momentum', 'beta',
+                          't_rev', 'delta_E', 'eta_0']:
+            with self.subTest('Ring cache - ' + attribute):
+                for test_ring in [ring_first, ring_cached]:
+                    np.testing.assert_equal(
+                        np.asarray(getattr(test_ring, attribute)),
+                        np.asarray(getattr(ring, attribute)))
+
+        # Different particle or options give a different entry
+        Ring(Electron(), section, cache=ProgramCache(self.cache_dir))
+        Ring(Proton(), section, cache=self.cache_dir, t_stop=0.2)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -12,6 +12,7 @@ from ..devtools import exceptions as excpt
 from ..devtools import assertions as assrt
 from ..utilities import rel_transforms as rt
 from . import blond_function as bf
+from . import _storage
 
 #TODO: Overwrite some np funcs (e.g. __iadd__) where necessary
 #TODO: In derived classes handle passing datatype as input
@@ -232,7 +233,7 @@ class _function(np.ndarray):
 
 
     @classmethod
-    def zeros(cls, shape, data_type = None):
+    def zeros(cls, shape, data_type = None, storage_dir = None):
         """
         Create an empty array of given shape, with required data_type dict.
 
@@ -243,13 +244,17 @@ class _function(np.ndarray):
         data_type : dict, optional
             The dict defining the data_type attribute of the new array.
             The default is None.
+        storage_dir : str, optional
+            If given, the array is a view of a memory mapped .npy file
+            created in this directory. The default is None.
 
         Returns
         -------
         newArray : datatype
             The new datatype array
         """
-        newArray = np.zeros(shape).view(cls)
+        newArray = _storage.zeros(shape, storage_dir,
+                                  prefix=cls.__name__).view(cls)
         newArray.data_type = data_type
         return newArray
 
@@ -503,7 +508,7 @@ class _function(np.ndarray):
 
 
     def reshape(self, n_sections = None, use_time = None, use_turns = None,
-                store_time = False):
+                store_time = False, broadcast = False):
         """
         Reshape the datatype array to the given number of sections and either
         the given use_time or given use_turns.
@@ -518,6 +523,10 @@ class _function(np.ndarray):
             The default is None.
         use_turns : iterable of ints, optional
             The turn numbers to be used for the new array. The default is None.
+        broadcast : bool, optional
+            If True and the function is constant (timebase 'single'), a 
+            read-only zero-stride view of the constants is returned instead
+            of a full array. The default is False.
 
         Returns
         -------
@@ -533,6 +542,12 @@ class _function(np.ndarray):
             n_sections = self.shape[0]
 
         self._comp_definition_reshape(n_sections, use_time, use_turns)
+
+        if broadcast and self.timebase == 'single' and not store_time:
+            constants = np.asarray(self).reshape(-1, 1)
+            return _broadcast_constants(constants, n_sections, use_time,
+                                        use_turns, self)
+
         interpArray = self._prep_reshape(n_sections, use_time, use_turns,
                                          store_time)
 
@@ -565,6 +580,45 @@ class _function(np.ndarray):
 ####FUNCTIONS TO HELP IN DATA TYPE CREATION####
 ###############################################
 
+def _broadcast_constants(constants, n_rows, use_time, use_turns, function):
+    """
+    Function to expand the constant values of a function to the shape 
+    required by reshape as a read-only zero-stride view, the memory used does
+    not depend on the number of samples.
+
+    Parameters
+    ----------
+    constants : np.ndarray
+        The constant values, either 1 or n_rows rows with one column.
+    n_rows : int
+        The number of rows (sections or harmonics) of the new array.
+    use_time : iterable of floats
+        The times of the new array.
+    use_turns : iterable of ints
+        The turn numbers of the new array, used if use_time is None.
+    function : datatype
+        The function being reshaped, defining the class and data_type of the
+        new array.
+
+    Returns
+    -------
+    datatype
+        The broadcast array.
+    """
+
+    if use_time is not None:
+        nPts = len(use_time)
+    else:
+        nPts = len(use_turns)
+
+    newArray = np.broadcast_to(constants, (n_rows, nPts)).view(
+                                                        function.__class__)
+    newArray.data_type = {**function.data_type}
+    newArray.timebase = 'interpolated'
+
+    return newArray
+
+
 def _expand_singletons(data_types, data_points):
     """
     Function to expand single points of data to the required shape for the
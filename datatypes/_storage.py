@@ -0,0 +1,201 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Helpers to allocate the datatypes arrays in memory or as memory mapped
+files on disk.**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import os
+import tempfile
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# BLonD_Common imports
+from ..devtools import path
+
+# Number of samples accumulated in memory before being written to disk
+chunk_size = 2**16
+
+
+def zeros(shape, storage_dir=None, prefix='array', dtype=float):
+    """
+    Create an array of zeros, if storage_dir is given the array is a
+    np.memmap of a .npy file created in storage_dir.
+
+    Parameters
+    ----------
+    shape : iterable
+        The shape of the new array.
+    storage_dir : str, optional
+        The directory in which the file is created. The default is None,
+        an array in memory is returned.
+    prefix : str, optional
+        The prefix of the file name. The default is 'array'.
+    dtype : data-type, optional
+        The data type of the array. The default is float.
+
+    Returns
+    -------
+    np.ndarray or np.memmap
+        The new array.
+    """
+
+    if storage_dir is None:
+        return np.zeros(shape, dtype=dtype)
+
+    fileName = _new_file(storage_dir, prefix, '.npy')
+
+    return open_memmap(fileName, mode='w+', dtype=dtype,
+                       shape=tuple(np.atleast_1d(shape)))
+
+
+def store(array, storage_dir=None, prefix='array'):
+    """
+    Copy an array to a memory mapped file in storage_dir, chunk by chunk
+    along the last axis. If storage_dir is None the array is returned as is.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        The array to be stored.
+    storage_dir : str, optional
+        The directory in which the file is created. The default is None.
+    prefix : str, optional
+        The prefix of the file name. The default is 'array'.
+
+    Returns
+    -------
+    np.ndarray or np.memmap
+        The stored array, datatypes keep their class and data_type.
+    """
+
+    if storage_dir is None or isinstance(array, np.memmap):
+        return array
+
+    stored = zeros(np.shape(array), storage_dir, prefix,
+                   np.asarray(array).dtype)
+    if stored.ndim == 0:
+        stored[...] = array
+    else:
+        for start in range(0, stored.shape[-1], chunk_size):
+            stored[..., start:start+chunk_size] \
+                = np.asarray(array)[..., start:start+chunk_size]
+
+    # The datatypes are kept as views of the memory mapped file
+    if type(array) not in (np.ndarray, np.memmap):
+        stored = stored.view(type(array))
+        if hasattr(array, 'data_type'):
+            stored.data_type = array.data_type.copy()
+
+    return stored
+
+
+def sample_buffer(first_value, storage_dir=None):
+    """
+    Create the container for the samples computed one by one during the
+    preprocessing. A list is used if storage_dir is None, otherwise a
+    SampleBuffer writing to storage_dir by chunks.
+    """
+
+    if storage_dir is None:
+        return [first_value]
+    else:
+        buffer = SampleBuffer(storage_dir)
+        buffer.append(first_value)
+        return buffer
+
+
+def as_array(samples):
+    """
+    Get the array from a list or a SampleBuffer.
+    """
+
+    if isinstance(samples, SampleBuffer):
+        return samples.to_array()
+    else:
+        return np.array(samples)
+
+
+class SampleBuffer:
+    r"""
+    Append-only container of float samples that keeps at most chunk_size
+    samples in memory, the rest being written to a raw file in storage_dir.
+
+    Parameters
+    ----------
+    storage_dir : str
+        The directory in which the file is created.
+
+    Attributes
+    ----------
+    file_name : str
+        The path of the raw data file.
+    """
+
+    def __init__(self, storage_dir):
+
+        self.file_name = _new_file(storage_dir, 'samples', '.raw')
+        self._chunk = []
+        self._n_written = 0
+
+    def __len__(self):
+        return self._n_written + len(self._chunk)
+
+    def __getitem__(self, index):
+
+        if index < 0:
+            index += len(self)
+
+        if index >= self._n_written:
+            return self._chunk[index - self._n_written]
+
+        return np.fromfile(self.file_name, count=1, offset=8*index)[0]
+
+    def append(self, value):
+
+        self._chunk.append(value)
+        if len(self._chunk) >= chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the samples held in memory to the file.
+        """
+
+        with open(self.file_name, 'ab') as dataFile:
+            np.array(self._chunk, dtype=float).tofile(dataFile)
+        self._n_written += len(self._chunk)
+        self._chunk = []
+
+    def to_array(self):
+        """
+        Flush the remaining samples and map the file as a read-only array.
+        """
+
+        self.flush()
+
+        return np.memmap(self.file_name, dtype=float, mode='r',
+                         shape=(self._n_written,))
+
+
+def _new_file(storage_dir, prefix, suffix):
+    """
+    Create a new, uniquely named, file in storage_dir.
+    """
+
+    path.makedir(storage_dir)
+    handle, fileName = tempfile.mkstemp(suffix=suffix, prefix=prefix + '_',
+                                        dir=storage_dir)
+    os.close(handle)
+
+    return fileName
@@ -0,0 +1,222 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module defining the error-bounded, piecewise-linear storage of the sampled
+machine programs.**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import numbers
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+# BLonD_Common imports
+from ..devtools import exceptions as excpt
+from ..maths import interpolation as interp
+
+
+class compressed_program(NDArrayOperatorsMixin):
+    r"""
+    Class storing a sampled program (1D array or 2D array with one row per
+    section or rf system) as a set of knots per row. Linear interpolation
+    between the knots reproduces the original samples within the tolerance.
+
+    Indexing with sample numbers is evaluated directly from the knots, the
+    full array is only rebuilt when required (e.g. when passed to a numpy
+    function or when a complete row is requested).
+
+    Parameters
+    ----------
+    input_array : float array
+        The 1D or 2D array to be compressed, the samples are along the last
+        axis.
+    tolerance : float
+        The maximum error on the reconstructed samples.
+    relative : bool
+        If True (default), the tolerance is relative to the maximum absolute
+        value of each row.
+
+    Attributes
+    ----------
+    knots : list of tuple
+        The sample indices and values of the knots for each row.
+    tolerance : float
+        The input tolerance.
+    shape : tuple
+        The shape of the original array.
+    """
+
+    def __init__(self, input_array, tolerance, relative=True):
+
+        input_array = np.asarray(input_array)
+
+        if input_array.ndim not in (1, 2):
+            raise excpt.InputDataError("Only 1D and 2D arrays can be "
+                                       + "compressed")
+
+        self.tolerance = tolerance
+        self.relative = relative
+        self.shape = input_array.shape
+        self.dtype = input_array.dtype
+
+        self.knots = []
+        for row in np.atleast_2d(input_array):
+            if relative:
+                tol_row = tolerance * np.max(np.abs(row))
+            else:
+                tol_row = tolerance
+            indices = interp.piecewise_linear_knots(row, tol_row)
+            self.knots.append((indices.astype(float), row[indices]))
+
+    def __repr__(self):
+        return ('compressed_program(shape=' + str(self.shape) + ', knots='
+                + str([len(k[0]) for k in self.knots]) + ')')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.decompress().astype(dtype, copy=False)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+
+        inputs = [i.decompress() if isinstance(i, compressed_program)
+                  else i for i in inputs]
+
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, key):
+
+        if self.ndim == 1:
+            return self.sample(_sample_indices(key, self.shape[0]))
+
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError("too many indices for compressed_program")
+
+        samples = _sample_indices(key[1], self.shape[1])
+        rows = _sample_indices(key[0], self.shape[0])
+
+        if np.ndim(rows) == 0:
+            return self.sample(samples, rows)
+        else:
+            return np.array([self.sample(samples, r) for r in rows])
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return sum(k[0].nbytes + k[1].nbytes for k in self.knots)
+
+    def sample(self, samples, row=None):
+        r"""
+        Evaluate the program at (possibly fractional) sample numbers.
+
+        Parameters
+        ----------
+        samples : float or float array
+            The sample numbers.
+        row : int
+            The row of the program, can be omitted for 1D programs.
+
+        Returns
+        -------
+        float or float array
+            The interpolated values.
+        """
+
+        if row is None:
+            if self.ndim != 1:
+                raise excpt.InputError("The row should be specified for "
+                                       + "a 2D compressed_program")
+            row = 0
+
+        return np.interp(samples, *self.knots[row])
+
+    def inverse(self, values, row=None):
+        r"""
+        Get the (fractional) sample numbers at which a monotonically
+        increasing program takes the given values (e.g. the samples
+        corresponding to moments of the cycle_time).
+
+        Parameters
+        ----------
+        values : float or float array
+            The values to be found in the program.
+        row : int
+            The row of the program, can be omitted for 1D programs.
+
+        Returns
+        -------
+        float or float array
+            The sample numbers.
+        """
+
+        if row is None:
+            row = 0
+
+        indices, knot_values = self.knots[row]
+
+        return np.interp(values, knot_values, indices)
+
+    def decompress(self):
+        r"""
+        Rebuild the full array from the knots.
+
+        Returns
+        -------
+        float array
+            The array with the original shape.
+        """
+
+        samples = np.arange(self.shape[-1])
+        output = np.array([self.sample(samples, r)
+                           for r in range(len(self.knots))],
+                          dtype=self.dtype)
+
+        return output.reshape(self.shape)
+
+
+def _sample_indices(key, length):
+    """
+    Convert an integer, slice or array index to the explicit sample numbers
+    without allocating the full index range.
+    """
+
+    if isinstance(key, numbers.Integral):
+        if key < -length or key >= length:
+            raise IndexError("index " + str(key) + " is out of bounds "
+                             + "for axis with size " + str(length))
+        return key % length
+
+    elif isinstance(key, slice):
+        return np.arange(*key.indices(length))
+
+    else:
+        key = np.asarray(key)
+        if key.dtype == bool:
+            return np.flatnonzero(key)
+        if np.any((key < -length) | (key >= length)):
+            raise IndexError("index out of bounds for axis with size "
+                             + str(length))
+        return key % length
@@ -13,7 +13,8 @@ from ..utilities import rel_transforms as rt
 from . import blond_function as bf
 from ._core import _function, _expand_function, _check_time_turns,\
                    _get_dats_types, _check_data_types, _expand_singletons,\
-                   _check_turn_numbers, _interpolate_input
+                   _check_turn_numbers, _interpolate_input,\
+                   _broadcast_constants
 
 
 class _RF_function(_function):
@@ -105,7 +106,7 @@ class _RF_function(_function):
 
     #TODO: Safe treatment of use_turns > n_turns
     def reshape(self, harmonics = None, use_time = None, use_turns = None,
-                store_time = False):
+                store_time = False, broadcast = False):
         """
         Reshape the datatype array to the given number of sections and either
         the given use_time or given use_turns.
@@ -122,6 +123,10 @@ class _RF_function(_function):
             The default is None.
         use_turns : iterable of ints, optional
             The turn numbers to be used for the new array. The default is None.
+        broadcast : bool, optional
+            If True and the function is constant (timebase 'single'), a 
+            read-only zero-stride view of the constants is returned instead
+            of a full array. The default is False.
 
         Returns
         -------
@@ -131,6 +136,18 @@ class _RF_function(_function):
         if harmonics is None:
             harmonics = self.harmonics
 
+        if broadcast and self.timebase == 'single' and not store_time:
+            constants = np.zeros([len(harmonics), 1])
+            for i, h in enumerate(harmonics):
+                for j, s in enumerate(self.harmonics):
+                    if h == s:
+                        constants[i] = self[j]
+                        break
+            newArray = _broadcast_constants(constants, len(harmonics),
+                                            use_time, use_turns, self)
+            newArray.harmonics = harmonics
+            return newArray
+
         if use_turns is not None:
             use_turns = [int(turn) for turn in use_turns]
 
@@ -19,6 +19,7 @@ from ..devtools import exceptions as excpt
 from ..devtools import assertions as assrt
 from ..utilities import rel_transforms as rt
 from . import blond_function as bf
+from . import _storage
 from ._core import (_function, _expand_function, _check_time_turns,
                     _get_dats_types, _check_data_types, _expand_singletons,
                     _check_turn_numbers)
@@ -445,7 +446,7 @@ class _synchronous_data_program(_ring_function):
     def preprocess(self, mass, circumference, interp_time=None,
                    interpolation='linear', t_start=0, t_end=np.inf,
                    flat_bottom=0, flat_top=0, targetNTurns=np.inf,
-                   store_turns=True):
+                   store_turns=True, storage_dir=None):
         """
         Preprocess the synchronous data to a full program for simulations or
         calculations
@@ -480,6 +481,10 @@ class _synchronous_data_program(_ring_function):
             the program is interpolated turn by turn and the turn numbers are
             stored, if not no turn information is available.  Interpolation
             without turn numbers is faster. The default is True.
+        storage_dir : str, optional
+            If defined, the samples are written by chunks to disk during the
+            interpolation and the returned array is a memory mapped .npy file
+            created in storage_dir. The default is None.
 
         Raises
         ------
@@ -540,14 +545,15 @@ class _synchronous_data_program(_ring_function):
                                                       circumference,
                                                       (interp_time,
                                                        t_start, t_end),
-                                                      targetNTurns, s)
+                                                      targetNTurns, s,
+                                                      storage_dir)
                 else:
                     nTurns, useTurns, time, momentum \
                         = self._linear_interpolation_no_turns(mass,
                                                               circumference,
                                                               (interp_time,
                                                                t_start, t_end),
-                                                              s)
+                                                              s, storage_dir)
 
         # TODO: Sampling with turn by turn data
         # TODO: nTurns != self.shape[1]
@@ -567,7 +573,13 @@ class _synchronous_data_program(_ring_function):
             useTurns = [0]
             momentum = self.copy()
 
-        newArray = np.zeros([2 + self.shape[0], len(useTurns)])
+        if isinstance(useTurns, _storage.SampleBuffer):
+            useTurns, time, momentum = (_storage.as_array(useTurns),
+                                        _storage.as_array(time),
+                                        _storage.as_array(momentum))
+
+        newArray = _storage.zeros([2 + self.shape[0], len(useTurns)],
+                                  storage_dir, prefix='momentum_program')
         newArray[0, :] = useTurns
         newArray[1, :] = time
 
@@ -794,7 +806,7 @@ class _synchronous_data_program(_ring_function):
         return np.insert(np.cumsum(trev[:-1]), 0, 0)
 
     def _linear_interpolation_no_turns(self, mass, circumference, time,
-                                       section):
+                                       section, storage_dir=None):
         """
         Linearly interpolate the cycle without considering turn numbers.
 
@@ -809,6 +821,9 @@ class _synchronous_data_program(_ring_function):
             interpolation.
         section : int
             Section number.
+        storage_dir : str, optional
+            If defined, the samples are stored by chunks in files in
+            storage_dir. The default is None.
 
         Raises
         ------
@@ -831,7 +846,7 @@ class _synchronous_data_program(_ring_function):
         start = time[1]
         stop = time[2]
 
-        interp_time = [start]
+        interp_time = _storage.sample_buffer(start, storage_dir)
 
         while interp_time[-1] < stop:
             next_time = time_func(interp_time[-1])
@@ -841,19 +856,31 @@ class _synchronous_data_program(_ring_function):
             else:
                 interp_time.append(next_time)
 
+        interp_time = _storage.as_array(interp_time)
         if interp_time[-1] > stop:
             interp_time = interp_time[:-1]
 
         input_time = self[section, 0]
         input_momentum = self[section, 1]
 
-        momentum_interp = np.interp(interp_time, input_time, input_momentum)
+        if storage_dir is None:
+            momentum_interp = np.interp(interp_time, input_time,
+                                        input_momentum)
+        else:
+            momentum_interp = _storage.zeros(len(interp_time), storage_dir,
+                                             prefix='momentum')
+            for i in range(0, len(interp_time), _storage.chunk_size):
+                momentum_interp[i:i+_storage.chunk_size] = np.interp(
+                    interp_time[i:i+_storage.chunk_size], input_time,
+                    input_momentum)
+
+        turns = _storage.zeros(len(interp_time), storage_dir, prefix='turns')
+        turns[:] = np.NaN
 
-        return (np.NaN, np.full(len(interp_time), np.NaN),
-                np.array(interp_time), momentum_interp)
+        return (np.NaN, turns, interp_time, momentum_interp)
 
     def _linear_interpolation(self, mass, circumference, time, targetNTurns,
-                              section):
+                              section, storage_dir=None):
         """
         Linearly interpolate the synchronous data including the turn numbers.
 
@@ -870,6 +897,9 @@ class _synchronous_data_program(_ring_function):
             The maximum desired number of turns. The default is np.inf.
         section : int
             Section number.
+        storage_dir : str, optional
+            If defined, the samples are written by chunks to files in
+            storage_dir instead of being kept in lists. The default is None.
 
         Returns
         -------
@@ -891,9 +921,9 @@ class _synchronous_data_program(_ring_function):
         T0 = rt.beta_to_trev(beta_0, circumference)
 
         nTurns = 0
-        time_interp = [start]
-        momentum_interp = [pInit]
-        use_turns = [0]
+        time_interp = _storage.sample_buffer(start, storage_dir)
+        momentum_interp = _storage.sample_buffer(pInit, storage_dir)
+        use_turns = _storage.sample_buffer(0, storage_dir)
 
         next_time = time_interp[0] + T0
 
@@ -933,7 +963,7 @@ class _synchronous_data_program(_ring_function):
         return nTurns, use_turns, time_interp, momentum_interp
 
     def _derivative_interpolation(self, mass, circumference, time,
-                                  targetNTurns, section):
+                                  targetNTurns, section, storage_dir=None):
         """
         Interpolate the synchronous data maintaining a linearly varying first
         derivative.
@@ -951,6 +981,9 @@ class _synchronous_data_program(_ring_function):
             The maximum desired number of turns. The default is np.inf.
         section : int
             Section number.
+        storage_dir : str, optional
+            If defined, the samples are written by chunks to files in
+            storage_dir instead of being kept in lists. The default is None.
 
         Returns
         -------
@@ -973,9 +1006,9 @@ class _synchronous_data_program(_ring_function):
         T0 = rt.beta_to_trev(beta_0, circumference)
 
         nTurns = 0
-        time_interp = [start]
-        momentum_interp = [pInit]
-        use_turns = [0]
+        time_interp = _storage.sample_buffer(start, storage_dir)
+        momentum_interp = _storage.sample_buffer(pInit, storage_dir)
+        use_turns = _storage.sample_buffer(0, storage_dir)
 
         next_time = time_interp[0] + T0
 
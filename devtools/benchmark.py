@@ -0,0 +1,403 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to benchmark functions with parametrised sizes, to store the
+results in JSON files and to compare them against a baseline**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import gc
+import json
+import time
+import fnmatch
+import platform
+import tracemalloc
+import numpy as np
+import scipy
+
+# BLonD_Common imports
+from . import exceptions as excpt
+
+# Version of the format of the JSON files
+results_version = 1
+
+
+def measure(function, repeat=10, warmup=1, memory=True):
+    r"""
+    Function to measure the runtime and peak memory of a function called
+    without arguments. The runtime is measured with the garbage collector
+    disabled, the peak memory in an additional call traced by tracemalloc
+    (only the memory allocated through Python and numpy is traced).
+
+    Parameters
+    ----------
+    function : callable
+        The function to benchmark, without arguments
+    repeat : int
+        Optional: The number of timed calls. Default is 10
+    warmup : int
+        Optional: The number of calls before the timing. Default is 1
+    memory : bool
+        Optional: If True (default), the peak memory is measured
+
+    Returns
+    -------
+    result : dict
+        The median, interquartile range, minimum and maximum runtime in s,
+        the number of timed calls and the peak memory in bytes (None if not
+        measured)
+
+    Examples
+    --------
+    >>> result = measure(lambda: np.fft.rfft(np.ones(2**20)))
+    >>> result['median'], result['peak_memory']
+    """
+
+    if repeat < 1:
+        raise excpt.InputError("repeat should be at least 1")
+
+    for _ in range(warmup):
+        function()
+
+    runtimes = np.zeros(repeat)
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for index in range(repeat):
+            start = time.perf_counter()
+            function()
+            runtimes[index] = time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    peak_memory = None
+    if memory:
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.clear_traces()
+        else:
+            tracemalloc.start()
+        try:
+            reference = tracemalloc.get_traced_memory()[0]
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1] - reference
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+    first_quartile, median, third_quartile = np.percentile(runtimes,
+                                                           [25, 50, 75])
+
+    return {'median': float(median),
+            'iqr': float(third_quartile - first_quartile),
+            'min': float(np.min(runtimes)),
+            'max': float(np.max(runtimes)),
+            'repeat': int(repeat),
+            'peak_memory': peak_memory}
+
+
+class BenchmarkSuite:
+    r"""
+    Class collecting benchmark cases. Each case is defined by a setup
+    function, called with the size of the case outside of the timing, which
+    returns the function to benchmark.
+
+    Parameters
+    ----------
+    repeat : int
+        Optional: The number of timed calls per case. Default is 10
+    warmup : int
+        Optional: The number of calls before the timing. Default is 1
+    memory : bool
+        Optional: If True (default), the peak memory is measured
+
+    Attributes
+    ----------
+    cases : dict
+        The setup function and the sizes of each case, by name
+
+    Examples
+    --------
+    >>> suite = BenchmarkSuite(repeat=5)
+    >>>
+    >>> @suite.case(sizes=[2**12, 2**16])
+    >>> def rfft(size):
+    >>>     signal = np.ones(size)
+    >>>     return lambda: np.fft.rfft(signal)
+    >>>
+    >>> results = suite.run()
+    >>> save_results(results, 'benchmark.json')
+    """
+
+    def __init__(self, repeat=10, warmup=1, memory=True):
+
+        self.repeat = repeat
+        self.warmup = warmup
+        self.memory = memory
+        self.cases = {}
+
+    def add_case(self, name, setup, sizes=(None,)):
+        r"""
+        Adding a case to the suite.
+
+        Parameters
+        ----------
+        name : str
+            The name of the case
+        setup : callable
+            The function called with the size (or without arguments if the
+            size is None), returning the function to benchmark
+        sizes : iterable
+            Optional: The sizes for which the case is run. Default is a single
+            run without size
+        """
+
+        if name in self.cases:
+            raise excpt.InputError("The case " + name + " is already defined")
+
+        self.cases[name] = (setup, list(sizes))
+
+    def case(self, name=None, sizes=(None,)):
+        r"""
+        Decorator adding the setup function to the suite, with the name of
+        the function by default.
+        """
+
+        def decorator(setup):
+            self.add_case(setup.__name__ if name is None else name, setup,
+                          sizes)
+            return setup
+
+        return decorator
+
+    def run(self, select=None, verbose=True):
+        r"""
+        Running the cases of the suite.
+
+        Parameters
+        ----------
+        select : str or list
+            Optional: Shell-style patterns (e.g. 'fitting*'), only the cases
+            with a matching name are run. Default is all cases
+        verbose : bool
+            Optional: If True (default), the results are printed
+
+        Returns
+        -------
+        results : dict
+            The results of measure, by key 'name[size]' (or 'name' without
+            size)
+        """
+
+        if isinstance(select, str):
+            select = [select]
+
+        results = {}
+
+        for name, (setup, sizes) in self.cases.items():
+
+            if select is not None and not any(
+                    fnmatch.fnmatch(name, pattern) for pattern in select):
+                continue
+
+            for size in sizes:
+
+                key = case_key(name, size)
+
+                if size is None:
+                    function = setup()
+                else:
+                    function = setup(size)
+
+                results[key] = measure(function, repeat=self.repeat,
+                                       warmup=self.warmup,
+                                       memory=self.memory)
+                results[key]['size'] = size
+
+                if verbose:
+                    print(format_result(key, results[key]))
+
+        if select is not None and len(results) == 0:
+            raise excpt.InputError("No case is matching " + str(select))
+
+        return results
+
+
+def case_key(name, size=None):
+    r"""
+    The key of a case in the results, 'name[size]'.
+    """
+
+    if size is None:
+        return name
+    else:
+        return '%s[%s]' % (name, size)
+
+
+def format_result(key, result):
+    r"""
+    One line summary of the result of a case.
+    """
+
+    line = '%s - Runtime: %.5e s (IQR %.2e s)' % (key, result['median'],
+                                                  result['iqr'])
+    if result['peak_memory'] is not None:
+        line += ' - Peak memory: %.3f MB' % (result['peak_memory']/1e6)
+
+    return line
+
+
+def save_results(results, file_name, metadata=None):
+    r"""
+    Function to save the results of a suite in a JSON file, together with
+    the versions of Python, numpy and scipy and the machine.
+
+    Parameters
+    ----------
+    results : dict
+        The results returned by BenchmarkSuite.run
+    file_name : str
+        The path to the JSON file
+    metadata : dict
+        Optional: Additional information stored with the results (e.g.
+        commit hash)
+    """
+
+    all_metadata = {'version': results_version,
+                    'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'scipy': scipy.__version__,
+                    'machine': platform.machine(),
+                    'processor': platform.processor(),
+                    'system': platform.system()}
+
+    if metadata is not None:
+        all_metadata.update(metadata)
+
+    with open(file_name, 'w') as output:
+        json.dump({'metadata': all_metadata, 'results': results}, output,
+                  indent=2, sort_keys=True)
+
+
+def load_results(file_name):
+    r"""
+    Function to load the results saved by save_results.
+
+    Returns
+    -------
+    results : dict
+        The results by case
+    metadata : dict
+        The metadata stored with the results
+    """
+
+    with open(file_name, 'r') as inputFile:
+        data = json.load(inputFile)
+
+    try:
+        if data['metadata']['version'] != results_version:
+            raise excpt.InputError("The benchmark file " + str(file_name) +
+                                   " was saved in another format version")
+        return data['results'], data['metadata']
+    except (KeyError, TypeError):
+        raise excpt.InputError("The file " + str(file_name) +
+                               " does not contain benchmark results")
+
+
+def compare_results(results, baseline, time_threshold=0.1,
+                    memory_threshold=0.1, thresholds=None):
+    r"""
+    Function to compare results against a baseline. A case is a regression
+    if its median runtime (or peak memory) exceeds the one of the baseline
+    by more than the relative threshold. The runtime increases smaller than
+    the interquartile range of the baseline are considered as noise.
+
+    Parameters
+    ----------
+    results : dict
+        The results returned by BenchmarkSuite.run
+    baseline : dict
+        The baseline results, e.g. from load_results
+    time_threshold : float
+        Optional: The relative increase of the median runtime above which a
+        case is a regression. Default is 0.1
+    memory_threshold : float
+        Optional: The relative increase of the peak memory above which a case
+        is a regression. Default is 0.1, None to ignore the memory
+    thresholds : dict
+        Optional: The time_threshold for specific cases, by shell-style
+        pattern of the keys (e.g. {'fitting*': 0.3})
+
+    Returns
+    -------
+    comparison : list
+        The cases present in both results, as dicts with the key, the ratios
+        of the median runtimes and of the peak memories (None if not
+        measured) and the regression flag
+    """
+
+    if thresholds is None:
+        thresholds = {}
+
+    comparison = []
+
+    for key in sorted(results):
+
+        if key not in baseline:
+            continue
+
+        result = results[key]
+        reference = baseline[key]
+
+        case_threshold = time_threshold
+        for pattern, threshold in thresholds.items():
+            if fnmatch.fnmatch(key, pattern):
+                case_threshold = threshold
+
+        time_ratio = result['median'] / reference['median']
+        regression = (time_ratio > 1 + case_threshold) and \
+            (result['median'] - reference['median'] > reference['iqr'])
+
+        memory_ratio = None
+        if result['peak_memory'] is not None \
+                and reference['peak_memory'] is not None:
+            memory_ratio = (result['peak_memory'] /
+                            max(reference['peak_memory'], 1))
+            if memory_threshold is not None:
+                regression |= memory_ratio > 1 + memory_threshold
+
+        comparison.append({'key': key, 'time_ratio': time_ratio,
+                           'memory_ratio': memory_ratio,
+                           'regression': bool(regression)})
+
+    return comparison
+
+
+def format_comparison(comparison):
+    r"""
+    Summary of the comparison against a baseline, one line per case.
+    """
+
+    lines = []
+    for case in comparison:
+        line = '%s - Runtime ratio: %.3f' % (case['key'],
+                                             case['time_ratio'])
+        if case['memory_ratio'] is not None:
+            line += ' - Memory ratio: %.3f' % case['memory_ratio']
+        if case['regression']:
+            line += ' - REGRESSION'
+        lines.append(line)
+
+    return '\n'.join(lines)
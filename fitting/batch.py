@@ -0,0 +1,386 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to fit a large number of profiles at once, with a Levenberg-Marquardt
+algorithm vectorized over all the profiles**
+
+:Authors: **Alexandre Lasheen**, **Simon Albright**
+'''
+
+# General imports
+from __future__ import division
+import numpy as np
+
+# Analytic distributions import
+from .. interfaces.beam import analytic_distribution
+
+# Fitting imports
+from . profile import FitOptions
+
+# Devtools imports
+from .. devtools.exceptions import InputError
+
+
+# Distributions available by name, with the factor to get the length
+# parameter from the rms length and the initial values of the additional
+# parameters (e.g. exponent)
+distributions = {
+    'gaussian': (analytic_distribution.gaussian, 1., []),
+    'generalizedGaussian': (analytic_distribution.generalizedGaussian,
+                            1/np.sqrt(2), [2.]),
+    'waterbag': (analytic_distribution.waterbag, 2*np.sqrt(3+2*0.5), []),
+    'parabolicLine': (analytic_distribution.parabolicLine,
+                      2*np.sqrt(3+2*1.), []),
+    'parabolicAmplitude': (analytic_distribution.parabolicAmplitude,
+                           2*np.sqrt(3+2*1.5), []),
+    'binomialAmplitude2': (analytic_distribution.binomialAmplitude2,
+                           2*np.sqrt(3+2*2.), []),
+    'binomialAmplitudeN': (analytic_distribution.binomialAmplitudeN,
+                           2*np.sqrt(3+2*1.5), [1.5]),
+    'cosine': (analytic_distribution.cosine,
+               2*np.pi/np.sqrt(np.pi**2-8), []),
+    'cosineSquared': (analytic_distribution.cosineSquared,
+                      np.pi/np.sqrt(np.pi**2/12-0.5), [])}
+
+# Status flags returned for each profile
+converged = 1
+max_iterations_reached = 0
+failed = -1
+
+
+def batch_profile_fit(time_array, data_arrays, distribution='gaussian',
+                      initial_parameters=None, fitOpt=None,
+                      max_iterations=100, ftol=1.49012e-08,
+                      xtol=1.49012e-08):
+    r""" Function to fit many profiles sampled on the same time_array with
+    one of the analytic_distribution profiles (or a user defined profile
+    function accepting broadcast parameters).
+
+    All the profiles are fitted together by a Levenberg-Marquardt algorithm
+    operating on arrays of shape (n_profiles, n_points), each profile being
+    removed from the computation once converged.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time, common to all profiles
+    data_arrays : 2D np.array
+        The input profiles, of shape (n_profiles, len(time_array))
+    distribution : str or function
+        The name of the profile function in analytic_distribution (e.g.
+        'gaussian', 'binomialAmplitudeN', 'cosine'), or a function
+        with the input arguments (time_array, *fit_parameters) evaluating
+        all profiles when the fit_parameters have the shape (n_profiles, 1).
+        Default is 'gaussian'
+    initial_parameters : np.array
+        Optional: The initial parameters, of shape (n_profiles, n_parameters).
+        Required if distribution is a function, otherwise the default is
+        obtained from the maximum, mean and rms of the profiles
+    fitOpt : FitOptions
+        Optional: The fit options. The nPointsNoise is used to remove the
+        baseline of each profile. If the jacobian is a function, with the
+        same input arguments as the profile function and returning the
+        derivatives with respect to the parameters along the last axis, it
+        is used instead of the closed-form Jacobian of analytic_distribution
+        (or finite differences if none is available). Default is None,
+        FitOptions()
+    max_iterations : int
+        Optional: The maximum number of iterations. Default is 100
+    ftol : float
+        Optional: The relative decrease of the sum of squared residuals
+        below which a profile is considered converged.
+        Default is 1.49012e-08
+    xtol : float
+        Optional: The relative step of the parameters below which a profile
+        is considered converged. Default is 1.49012e-08
+
+    Returns
+    -------
+    fitted_parameters : np.array
+        The fitted parameters, of shape (n_profiles, n_parameters), in the
+        same order as the profile function arguments
+    status : np.array
+        The status of each profile, 1 (converged), 0 (max_iterations reached)
+        or -1 (failed, the parameters are NaN)
+
+    Example
+    -------
+    >>> ''' We generate 1000 Gaussian profiles and fit them '''
+    >>> import numpy as np
+    >>> from blond_common.interfaces.beam.analytic_distribution import gaussian
+    >>> from blond_common.fitting.batch import batch_profile_fit
+    >>>
+    >>> time_array = np.arange(0, 25e-9, 0.1e-9)
+    >>>
+    >>> position = np.random.normal(13e-9, 1e-9, (1000, 1))
+    >>>
+    >>> data_arrays = gaussian(time_array, *[1., position, 2e-9])
+    >>>
+    >>> fitted_parameters, status = batch_profile_fit(
+    >>>    time_array, data_arrays, 'gaussian')
+
+    """
+
+    if fitOpt is None:
+        fitOpt = FitOptions()
+
+    time_array = np.asarray(time_array, dtype=float)
+    data_arrays = np.atleast_2d(np.asarray(data_arrays, dtype=float))
+
+    if data_arrays.shape[-1] != len(time_array):
+        raise InputError('The data_arrays should have the shape ' +
+                         '(n_profiles, len(time_array)).')
+
+    profileToFit = data_arrays - np.mean(
+        data_arrays[:, 0:fitOpt.nPointsNoise], axis=1)[:, np.newaxis]
+
+    if isinstance(distribution, str):
+        try:
+            profile_fit_function, lengthFactor, extraParameters \
+                = distributions[distribution]
+        except KeyError:
+            raise InputError('The distribution ' + distribution + ' is not ' +
+                             'available, the options are ' +
+                             str(list(distributions.keys())))
+        if initial_parameters is None:
+            initial_parameters = initial_guess(
+                time_array, profileToFit, lengthFactor, extraParameters)
+    else:
+        profile_fit_function = distribution
+        if initial_parameters is None:
+            raise InputError('The initial_parameters are required when ' +
+                             'fitting with a user defined function.')
+
+    # The closed-form Jacobian is used if available
+    if callable(fitOpt.jacobian):
+        jacobian = fitOpt.jacobian
+    else:
+        jacobian = analytic_distribution.get_jacobian(profile_fit_function)
+
+    # Rescaling so that the fit parameters are around 1
+    rescaleFactorX = 1/(time_array[-1]-time_array[0])
+    rescaleFactorY = 1/np.max(profileToFit, axis=1)
+
+    fit_parameters = np.array(initial_parameters, dtype=float, ndmin=2)
+    fit_parameters[:, 0] *= rescaleFactorY
+    fit_parameters[:, 1] -= time_array[0]
+    fit_parameters[:, 1] *= rescaleFactorX
+    fit_parameters[:, 2] *= rescaleFactorX
+
+    fit_parameters, status = levenberg_marquardt(
+        profile_fit_function, (time_array-time_array[0])*rescaleFactorX,
+        profileToFit*rescaleFactorY[:, np.newaxis], fit_parameters,
+        max_iterations=max_iterations, ftol=ftol, xtol=xtol,
+        jacobian=jacobian)
+
+    # Abs on fit parameters
+    fit_parameters = np.abs(fit_parameters)
+
+    # Rescaling back to the original dimensions
+    fit_parameters[:, 0] /= rescaleFactorY
+    fit_parameters[:, 1] /= rescaleFactorX
+    fit_parameters[:, 1] += time_array[0]
+    fit_parameters[:, 2] /= rescaleFactorX
+
+    return fit_parameters, status
+
+
+def levenberg_marquardt(profile_fit_function, x, y, initial_parameters,
+                        max_iterations=100, ftol=1.49012e-08,
+                        xtol=1.49012e-08, damping=1e-3, jacobian=None):
+    r""" Function minimizing the sum of squared residuals between y and
+    profile_fit_function(x, *parameters), independently for each row of y,
+    with the Levenberg-Marquardt algorithm. If no jacobian function is
+    given, the Jacobian is evaluated by forward finite differences, all rows
+    being perturbed at once.
+
+    Parameters
+    ----------
+    profile_fit_function : function
+        The function with the input arguments (x, *parameters), each of the
+        parameters having the shape (n_rows, 1)
+    x : np.array
+        The abscissa, common to all rows
+    y : 2D np.array
+        The data to fit, of shape (n_rows, len(x))
+    initial_parameters : 2D np.array
+        The initial parameters, of shape (n_rows, n_parameters)
+    max_iterations : int
+        Optional: The maximum number of iterations. Default is 100
+    ftol : float
+        Optional: Relative decrease of the cost for convergence
+    xtol : float
+        Optional: Relative step of the parameters for convergence
+    damping : float
+        Optional: The initial damping factor. Default is 1e-3
+    jacobian : function
+        Optional: The Jacobian of profile_fit_function, with the same
+        input arguments and returning the derivatives with respect to the
+        parameters along the last axis
+
+    Returns
+    -------
+    parameters : np.array
+        The fitted parameters, of shape (n_rows, n_parameters)
+    status : np.array
+        The status of each row, 1 (converged), 0 (max_iterations reached)
+        or -1 (failed, the parameters are NaN)
+    """
+
+    parameters = np.array(initial_parameters, dtype=float)
+    n_rows, n_parameters = parameters.shape
+
+    residue = y - _evaluate(profile_fit_function, x, parameters)
+    cost = np.sum(residue**2, axis=1)
+
+    status = np.full(n_rows, max_iterations_reached, dtype=int)
+    status[~np.isfinite(cost)] = failed
+    dampingFactor = np.full(n_rows, float(damping))
+
+    # The normal equations are only updated for the rows with new parameters
+    JTJ = np.zeros((n_rows, n_parameters, n_parameters))
+    gradient = np.zeros((n_rows, n_parameters))
+    outdated = np.ones(n_rows, dtype=bool)
+
+    active = np.flatnonzero(status == max_iterations_reached)
+
+    for iteration in range(max_iterations):
+
+        if active.size == 0:
+            break
+
+        update = active[outdated[active]]
+        if update.size > 0:
+            if jacobian is None:
+                derivatives = _jacobian(profile_fit_function, x,
+                                        parameters[update],
+                                        y[update] - residue[update])
+            else:
+                derivatives = _evaluate(jacobian, x, parameters[update])
+            JTJ[update] = np.einsum('mnp,mnq->mpq', derivatives, derivatives)
+            gradient[update] = np.einsum('mnp,mn->mp', derivatives,
+                                         residue[update])
+            outdated[update] = False
+
+        activeParameters = parameters[active]
+
+        # Solving the damped normal equations for all rows
+        diagonal = np.einsum('mpp->mp', JTJ[active])
+        scaling = np.where(diagonal > 0, diagonal, 1.)
+        dampedJTJ = JTJ[active]
+        dampedJTJ[:, np.arange(n_parameters), np.arange(n_parameters)] \
+            += dampingFactor[active, np.newaxis]*scaling
+
+        try:
+            step = np.linalg.solve(dampedJTJ,
+                                   gradient[active, :, np.newaxis])[..., 0]
+        except np.linalg.LinAlgError:
+            step = np.einsum('mpq,mq->mp', np.linalg.pinv(dampedJTJ),
+                             gradient[active])
+
+        newParameters = activeParameters + step
+        newResidue = y[active] - _evaluate(profile_fit_function, x,
+                                           newParameters)
+        newCost = np.sum(newResidue**2, axis=1)
+
+        improved = np.isfinite(newCost) & (newCost <= cost[active])
+
+        updated = active[improved]
+        parameters[updated] = newParameters[improved]
+        residue[updated] = newResidue[improved]
+        outdated[updated] = True
+
+        decrease = cost[updated] - newCost[improved]
+        cost[updated] = newCost[improved]
+
+        dampingFactor[active] = np.where(improved,
+                                         dampingFactor[active]/10,
+                                         dampingFactor[active]*10)
+
+        # Convergence on the decrease of the cost or on the step size
+        isConverged = np.zeros(active.size, dtype=bool)
+        isConverged[improved] = decrease <= ftol*cost[updated]
+        isConverged |= np.linalg.norm(step, axis=1) <= xtol * (
+            np.linalg.norm(activeParameters, axis=1) + xtol)
+        isConverged |= dampingFactor[active] > 1e16
+        status[active[isConverged]] = converged
+
+        active = active[~isConverged]
+
+    parameters[status == failed] = np.nan
+
+    return parameters, status
+
+
+def _evaluate(profile_fit_function, x, parameters):
+    '''
+    Evaluate the profiles for all rows of parameters.
+    '''
+
+    return profile_fit_function(x, *parameters.T[..., np.newaxis])
+
+
+def _jacobian(profile_fit_function, x, parameters, profiles):
+    '''
+    Forward finite differences derivative of the profiles with respect
+    to the parameters, of shape (n_rows, len(x), n_parameters).
+    '''
+
+    jacobian = np.zeros(profiles.shape + (parameters.shape[1],))
+
+    for p in range(parameters.shape[1]):
+        step = np.sqrt(np.finfo(float).eps)*np.maximum(
+            np.abs(parameters[:, p]), 1.)
+        shiftedParameters = parameters.copy()
+        shiftedParameters[:, p] += step
+        jacobian[..., p] = (_evaluate(profile_fit_function, x,
+                                      shiftedParameters) - profiles) \
+            / step[:, np.newaxis]
+
+    return jacobian
+
+
+def initial_guess(time_array, profiles, lengthFactor, extraParameters):
+    r"""
+    Initial guess of the fit parameters for all profiles from the maximum,
+    mean position and rms length of the baseline-corrected profiles.
+
+    Parameters
+    ----------
+    time_array : np.array
+        The time of the profile points
+    profiles : np.array
+        The baseline-corrected profiles, with one per row
+    lengthFactor : float
+        The factor to get the length parameter from the rms length, as in
+        the distributions dict
+    extraParameters : list
+        The initial values of the additional parameters, as in the
+        distributions dict
+
+    Returns
+    -------
+    initial_parameters : np.array
+        The initial parameters, with one row per profile
+    """
+
+    weights = np.clip(profiles, 0, None)
+    weights = weights / np.sum(weights, axis=1)[:, np.newaxis]
+
+    position = np.sum(weights*time_array, axis=1)
+    rms = np.sqrt(np.sum(weights*(time_array-position[:, np.newaxis])**2,
+                         axis=1))
+
+    initial_parameters = [np.max(profiles, axis=1), position,
+                          lengthFactor*rms]
+    initial_parameters += [np.full(len(profiles), value)
+                           for value in extraParameters]
+
+    return np.stack(initial_parameters, axis=1)
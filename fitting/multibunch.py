@@ -0,0 +1,190 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to split a multi-bunch profile into the windows of each bunch and
+to fit the bunches separately**
+
+:Authors: **Alexandre Lasheen**, **Simon Albright**
+'''
+
+# General imports
+from __future__ import division
+import os
+import copy
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Fitting imports
+from . profile import FitOptions, gaussian_fit
+
+# Devtools imports
+from .. devtools.exceptions import InputDataError
+
+
+def bunch_windows(time_array, data_array, threshold=0.1, margin=1.,
+                  min_points=3, fitOpt=None):
+    r""" Function to detect the bunches in a multi-bunch profile. The bunches
+    are the regions above a threshold (relative to the maximum of the
+    profile), each region is then extended on both sides by a margin
+    (relative to its length), without overlapping with the neighbouring
+    bunches.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time
+    data_array : list or np.array
+        The input multi-bunch profile
+    threshold : float
+        Optional: The ratio of the maximum of the profile above which the
+        points belong to a bunch. Default is 0.1
+    margin : float
+        Optional: The extension of the windows on each side, as a ratio of
+        the length of the region above threshold. Default is 1.
+    min_points : int
+        Optional: The regions above threshold with less points are ignored
+        (e.g. noise spikes), and the regions separated by less points are
+        merged. Default is 3
+    fitOpt : FitOptions
+        Optional: The nPointsNoise is used to remove the baseline
+
+    Returns
+    -------
+    windows : np.array
+        The start and stop indices of each bunch, of shape (n_bunches, 2)
+    peak_indices : np.array
+        The index of the maximum of each bunch
+
+    Example
+    -------
+    >>> windows, peak_indices = bunch_windows(time_array, data_array)
+    >>> for start, stop in windows:
+    >>>     bunch_profile = data_array[start:stop]
+
+    """
+
+    if fitOpt is None:
+        fitOpt = FitOptions()
+
+    data_array = np.asarray(data_array)
+    n_points = len(data_array)
+
+    # Removing baseline
+    profile = data_array - np.mean(data_array[0:fitOpt.nPointsNoise])
+
+    # Threshold crossings, from the changes of the mask
+    above = np.zeros(n_points+2, dtype=np.int8)
+    above[1:-1] = profile > threshold*np.max(profile)
+    edges = np.diff(above)
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
+    # Merging the regions separated by small gaps, then removing the small
+    # regions
+    if len(starts) > 1:
+        keep_gap = (starts[1:] - stops[:-1]) >= min_points
+        starts = starts[np.concatenate(([True], keep_gap))]
+        stops = stops[np.concatenate((keep_gap, [True]))]
+
+    large = (stops - starts) >= min_points
+    starts = starts[large]
+    stops = stops[large]
+
+    if len(starts) == 0:
+        raise InputDataError('No bunch was found above the threshold in ' +
+                             'the profile.')
+
+    # Maximum of each bunch
+    peak_indices = np.array([start + np.argmax(profile[start:stop])
+                             for start, stop in zip(starts, stops)])
+
+    # Extending the windows, up to the middle of the gaps between bunches
+    extension = np.ceil(margin*(stops - starts)).astype(int)
+    middles = (stops[:-1] + starts[1:]) // 2
+    lower_limits = np.concatenate(([0], middles))
+    upper_limits = np.concatenate((middles, [n_points]))
+
+    windows = np.stack([np.maximum(starts - extension, lower_limits),
+                        np.minimum(stops + extension, upper_limits)],
+                       axis=1)
+
+    return windows, peak_indices
+
+
+def multi_bunch_fit(time_array, data_array, fit_function=gaussian_fit,
+                    windows=None, fitOpt=None, n_workers=None,
+                    **segmentation_options):
+    r""" Function to fit all the bunches of a multi-bunch profile separately,
+    each bunch is fitted only on its window. The fits are performed
+    concurrently in a pool of threads.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time
+    data_array : list or np.array
+        The input multi-bunch profile
+    fit_function : function
+        The fitting function from blond_common.fitting.profile (or any
+        function with the arguments (time_array, data_array, fitOpt=fitOpt)),
+        e.g. gaussian_fit (default) or binomial_amplitudeN_fit
+    windows : np.array
+        Optional: The start and stop indices of each bunch. The default is
+        None, the windows are obtained from bunch_windows
+    fitOpt : FitOptions
+        Optional: The options passed to the fit_function, a copy is used
+        for each bunch
+    n_workers : int
+        Optional: The number of threads. Default is None, for the number of
+        processors
+    **segmentation_options
+        The options passed to bunch_windows (threshold, margin, min_points)
+
+    Returns
+    -------
+    fitted_parameters : np.array
+        The fitted parameters of each bunch, of shape
+        (n_bunches, n_parameters)
+    windows : np.array
+        The start and stop indices of each bunch, of shape (n_bunches, 2)
+
+    Example
+    -------
+    >>> from blond_common.fitting.multibunch import multi_bunch_fit
+    >>>
+    >>> fitted_parameters, windows = multi_bunch_fit(time_array, data_array)
+    >>> amplitudes, positions, rms_lengths = fitted_parameters.T
+
+    """
+
+    if fitOpt is None:
+        fitOpt = FitOptions()
+
+    time_array = np.asarray(time_array)
+    data_array = np.asarray(data_array)
+
+    if windows is None:
+        windows = bunch_windows(time_array, data_array, fitOpt=fitOpt,
+                                **segmentation_options)[0]
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    def fit_bunch(window):
+        start, stop = window
+        # The fit functions modify the fitInitialParameters of the options
+        bunchFitOpt = copy.copy(fitOpt)
+        return fit_function(time_array[start:stop], data_array[start:stop],
+                            fitOpt=bunchFitOpt)
+
+    with ThreadPoolExecutor(n_workers) as pool:
+        fitted_parameters = np.array(list(pool.map(fit_bunch, windows)))
+
+    return fitted_parameters, windows
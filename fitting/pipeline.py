@@ -0,0 +1,207 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to apply the profile estimators and fits to archives of profiles
+larger than the memory, chunk by chunk in a pool of workers**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+from __future__ import division
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Fitting imports
+from . profile import FWHM
+
+# Devtools imports
+from .. devtools.exceptions import InputDataError
+
+# Maximum size in bytes of the profiles read at once by each worker
+chunk_nbytes = 2**26
+
+
+def open_archive(file_name, n_points=None, dtype=float, header_size=0):
+    r""" Function to memory map an archive of profiles, without reading it.
+
+    Parameters
+    ----------
+    file_name : str
+        The path to the archive, either a .npy file containing a 2D array
+        with one profile per row, or a raw binary file
+    n_points : int
+        The number of points per profile, required for raw binary files
+    dtype : data-type
+        Optional: The data type of the raw binary file. Default is float
+    header_size : int
+        Optional: The number of bytes of the header preceding the data in the
+        raw binary file. Default is 0
+
+    Returns
+    -------
+    profiles : np.memmap
+        The read-only 2D array of shape (n_profiles, n_points)
+
+    Example
+    -------
+    >>> from blond_common.fitting.pipeline import open_archive
+    >>>
+    >>> profiles = open_archive('profiles.npy')
+    >>> profiles = open_archive('profiles.bin', n_points=1000,
+    >>>                         dtype=np.int16, header_size=512)
+
+    """
+
+    if str(file_name).endswith('.npy'):
+        profiles = np.load(file_name, mmap_mode='r')
+    else:
+        if n_points is None:
+            raise InputDataError('The number of points per profile is ' +
+                                 'required to open a raw binary archive.')
+        dtype = np.dtype(dtype)
+        data_size = os.path.getsize(file_name) - header_size
+        if data_size % (n_points*dtype.itemsize) != 0:
+            raise InputDataError('The size of the raw binary archive does ' +
+                                 'not correspond to an integer number of ' +
+                                 'profiles.')
+        profiles = np.memmap(file_name, dtype=dtype, mode='r',
+                             offset=header_size,
+                             shape=(data_size//(n_points*dtype.itemsize),
+                                    n_points))
+
+    if profiles.ndim != 2:
+        raise InputDataError('The archive should contain a 2D array with ' +
+                             'one profile per row.')
+
+    return profiles
+
+
+def process_archive(time_array, archive, output_file, estimator=FWHM,
+                    vectorized=True, chunk_profiles=None, n_workers=None,
+                    **kwargs):
+    r""" Function to apply an estimator (or fit) to all the profiles of an
+    archive. The profiles are read by chunks of bounded size, each chunk is
+    processed in a pool of threads and the results are written directly to
+    a memory mapped .npy file, the memory used does not depend on the number
+    of profiles.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time, common to all profiles
+    archive : str or np.array
+        The path to a .npy archive, or a 2D array (e.g. from open_archive
+        for raw binary files)
+    output_file : str
+        The path to the .npy file in which the results are written, as a
+        2D array with one row per profile
+    estimator : function
+        Optional: The function applied to the profiles with the input
+        arguments (time_array, data_array, **kwargs). It returns an array
+        or a tuple of arrays/floats, that are concatenated for each profile
+        (e.g. FWHM, RMS, binomial_from_width_ratio, batch_profile_fit or
+        gaussian_fit). Default is FWHM
+    vectorized : bool
+        Optional: If True (default), the estimator is applied to the 2D chunks
+        of profiles at once, otherwise profile by profile
+    chunk_profiles : int
+        Optional: The number of profiles per chunk. The default is None, the
+        chunks are chunk_nbytes large
+    n_workers : int
+        Optional: The number of threads. Default is None, for the number of
+        processors
+    **kwargs
+        Additional arguments passed to the estimator
+
+    Returns
+    -------
+    results : np.memmap
+        The results, of shape (n_profiles, n_results)
+
+    Example
+    -------
+    >>> from blond_common.fitting.batch import batch_profile_fit
+    >>> from blond_common.fitting.pipeline import process_archive
+    >>>
+    >>> results = process_archive(time_array, 'profiles.npy', 'fits.npy',
+    >>>                           batch_profile_fit, distribution='gaussian')
+    >>> fitted_parameters, status = results[:, :3], results[:, 3]
+
+    """
+
+    if isinstance(archive, str):
+        profiles = open_archive(archive)
+    else:
+        profiles = archive
+
+    n_profiles = len(profiles)
+    if n_profiles == 0:
+        raise InputDataError('The archive does not contain any profile.')
+
+    if chunk_profiles is None:
+        chunk_profiles = max(1, chunk_nbytes // (profiles.shape[1] *
+                                                 np.dtype(float).itemsize))
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    def process_chunk(start):
+        chunk = np.array(profiles[start:start+chunk_profiles], dtype=float)
+        if vectorized:
+            return _as_columns(estimator(time_array, chunk, **kwargs),
+                               len(chunk))
+        else:
+            return np.array([_as_columns(estimator(time_array, data_array,
+                                                   **kwargs), 1)[0]
+                             for data_array in chunk])
+
+    # The first chunk gives the number of results per profile
+    first_results = process_chunk(0)
+
+    results = open_memmap(output_file, mode='w+', dtype=float,
+                          shape=(n_profiles, first_results.shape[1]))
+    results[0:len(first_results)] = first_results
+
+    def write_chunk(start):
+        results[start:start+chunk_profiles] = process_chunk(start)
+
+    # The number of chunks in memory is limited to twice the number of
+    # workers
+    with ThreadPoolExecutor(n_workers) as pool:
+        pending = set()
+        for start in range(chunk_profiles, n_profiles, chunk_profiles):
+            if len(pending) >= 2*n_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(pool.submit(write_chunk, start))
+        for future in pending:
+            future.result()
+
+    results.flush()
+
+    return results
+
+
+def _as_columns(result, n_profiles):
+    """
+    Concatenating the outputs of an estimator into a 2D array with one row
+    per profile.
+    """
+
+    if not isinstance(result, tuple):
+        result = (result,)
+
+    return np.concatenate([np.reshape(np.asarray(item, dtype=float),
+                                      (n_profiles, -1))
+                           for item in result], axis=1)
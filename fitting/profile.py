@@ -25,17 +25,25 @@ from __future__ import division
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.optimize import minimize, curve_fit
+from scipy.interpolate import PchipInterpolator
+from scipy.special import gammaln
+import functools
 import warnings
 
 # Analytic distributions import
 from .. interfaces.beam import analytic_distribution
 
 # Residue function import
-from . residue import vertical_least_square
+from . residue import vertical_least_square, vertical_least_square_gradient
 
 # Devtools imports
 from .. devtools.exceptions import InputError
 
+# Number of points of the lookup table used by binomial_from_width_ratio
+# when no ratio_LUT is passed, and number of tables kept in the cache
+default_LUT_npoints = 2000
+LUT_cache_size = 16
+
 
 class FitOptions():
 
@@ -43,7 +51,7 @@ class FitOptions():
                  nPointsNoise=3, fitInitialParameters=None,
                  bounds=None, fittingRoutine='curve_fit',
                  method='Powell', options=None, residualFunction=None,
-                 extraOptions=None):
+                 extraOptions=None, jacobian=None):
 
         self.bunchLengthFactor = bunchLengthFactor
         self.bunchPositionOffset = bunchPositionOffset
@@ -55,6 +63,10 @@ class FitOptions():
         self.options = options
         self.residualFunction = residualFunction
         self.extraOptions = extraOptions
+        # The Jacobian of the profile function, None for finite
+        # differences, 'analytic' to use the closed-form Jacobian from
+        # analytic_distribution or a user defined function
+        self.jacobian = jacobian
 
 
 class PlotOptions():
@@ -81,7 +93,7 @@ def FWHM(time_array, data_array, level=0.5, fitOpt=None, plotOpt=None):
     time_array : list or np.array
         The input time
     data_array : list or np.array
-        The input profile
+        The input profile, or a 2D array with one profile per row
     level : float
         Optional: The ratio from the maximum for which the width of the profile
         is returned
@@ -89,9 +101,9 @@ def FWHM(time_array, data_array, level=0.5, fitOpt=None, plotOpt=None):
 
     Returns
     -------
-    center : float
+    center : float or np.array
         The center of the Width at Half Maximum, in the units of time_array
-    fwhm : float
+    fwhm : float or np.array
         The Full Width at Half Maximum, in the units of time_array
         NB: if the "level" option is set to any other value than 0.5,
         the output corresponds to the full width at the specified "level"
@@ -119,35 +131,15 @@ def FWHM(time_array, data_array, level=0.5, fitOpt=None, plotOpt=None):
     if fitOpt is None:
         fitOpt = FitOptions()
 
-    # Removing baseline
-    profileToFit = data_array-np.mean(data_array[0:fitOpt.nPointsNoise])
-
-    # Time resolution
-    time_interval = time_array[1] - time_array[0]
-
-    # Max and xFator times max values (defaults to half max)
-    maximum_value = np.max(profileToFit)
-    half_max = level * maximum_value
-
-    # First aproximation for the half maximum values
-    taux = np.where(profileToFit >= half_max)
-    taux1 = taux[0][0]
-    taux2 = taux[0][-1]
+    profiles = np.atleast_2d(data_array)
 
-    # Interpolation of the time where the line density is half the maximum
-    if taux1 == 0:
-        t1 = time_array[taux1]
-        warnings.warn('FWHM is at left boundary of profile!')
-    else:
-        t1 = time_array[taux1] - (profileToFit[taux1]-half_max) \
-            / (profileToFit[taux1] - profileToFit[taux1-1]) * time_interval
+    # Removing baseline
+    profileToFit = _remove_baseline(profiles, fitOpt.nPointsNoise)
 
-    if taux2 == (len(profileToFit)-1):
-        t2 = time_array[taux2]
-        warnings.warn('FWHM is at right boundary of profile!')
-    else:
-        t2 = time_array[taux2] + (profileToFit[taux2]-half_max) \
-            / (profileToFit[taux2] - profileToFit[taux2+1]) * time_interval
+    # Max, xFator times max values (defaults to half max) and interpolated
+    # crossing times, for all the profiles at once
+    maximum_value, half_max, t1, t2 = _level_crossings(
+        time_array, profileToFit, level)
 
     # Adjusting the FWHM with some scaling factor
     if isinstance(fitOpt.bunchLengthFactor, str):
@@ -172,15 +164,18 @@ def FWHM(time_array, data_array, level=0.5, fitOpt=None, plotOpt=None):
         plt.figure(plotOpt.figname)
         if plotOpt.clf:
             plt.clf()
-        plt.plot(time_array, profileToFit)
-        plt.plot([t1, t2], [half_max, half_max], 'r')
-        plt.plot([t1, t2], [half_max, half_max], 'ro', markersize=5)
+        for index in range(len(profileToFit)):
+            plt.plot(time_array, profileToFit[index])
+            plt.plot([t1[index], t2[index]],
+                     [half_max[index], half_max[index]], 'r')
+            plt.plot([t1[index], t2[index]],
+                     [half_max[index], half_max[index]], 'ro', markersize=5)
         if plotOpt.interactive:
             plt.pause(0.00001)
         else:
             plt.show()
 
-    return maximum_value, center, fwhm
+    return _as_input_shape(data_array, maximum_value, center, fwhm)
 
 
 def peak_value(time_array, data_array, level=1.0, fitOpt=None, plotOpt=None):
@@ -192,16 +187,16 @@ def peak_value(time_array, data_array, level=1.0, fitOpt=None, plotOpt=None):
     time_array : list or np.array
         The input time
     data_array : list or np.array
-        The input profile
+        The input profile, or a 2D array with one profile per row
     level : float
         Optional: The ratio of the maximum above which the profile is averaged
         Default is 1.0 to return the numerical maximum
 
     Returns
     -------
-    position : float
+    position : float or np.array
         The position of the peak value, in the units of time_array
-    amplitude : float
+    amplitude : float or np.array
         The peak amplitude, in the units of the data_array
         NB: if the "level" option is set to any other value than 1.0,
         the output corresponds to the peak, averaged for the points above
@@ -229,32 +224,29 @@ def peak_value(time_array, data_array, level=1.0, fitOpt=None, plotOpt=None):
     if fitOpt is None:
         fitOpt = FitOptions()
 
-    sampledNoise = np.mean(data_array[0:fitOpt.nPointsNoise])
-
-    selected_points = np.where(
-        data_array >= (level*np.max(data_array-sampledNoise)))[0]
+    profiles = np.atleast_2d(data_array)
 
-    position = np.mean(time_array[selected_points])
+    sampledNoise = _sampled_noise(profiles, fitOpt.nPointsNoise)
 
-    amplitude = np.mean(
-        data_array[selected_points] -
-        sampledNoise)
+    position, amplitude, selected_points = _averaged_peak(
+        time_array, profiles, sampledNoise, level)
 
     if plotOpt is not None:
         plt.figure(plotOpt.figname)
         if plotOpt.clf:
             plt.clf()
-        plt.plot(time_array, data_array-sampledNoise)
-        plt.plot(
-            time_array[data_array >= (level*np.max(data_array-sampledNoise))],
-            data_array[data_array >= (level*np.max(data_array-sampledNoise))] -
-            sampledNoise)
+        for index in range(len(profiles)):
+            plt.plot(time_array, profiles[index]-sampledNoise[index])
+            plt.plot(
+                np.asarray(time_array)[selected_points[index]],
+                profiles[index][selected_points[index]] -
+                sampledNoise[index])
         if plotOpt.interactive:
             plt.pause(0.00001)
         else:
             plt.show()
 
-    return position, amplitude
+    return _as_input_shape(data_array, position, amplitude)
 
 
 def integrated_profile(time_array, data_array, method='sum',
@@ -268,7 +260,7 @@ def integrated_profile(time_array, data_array, method='sum',
     time_array : list or np.array
         The input time
     data_array : list or np.array
-        The input profile
+        The input profile, or a 2D array with one profile per row
     method : str
         The method used to do the integration, the possible inputs are:
 
@@ -278,7 +270,7 @@ def integrated_profile(time_array, data_array, method='sum',
 
     Returns
     -------
-    integrated_value : float
+    integrated_value : float or np.array
         The integrated bunch profile, in the units of time_array*data_array
 
     Example
@@ -307,12 +299,13 @@ def integrated_profile(time_array, data_array, method='sum',
     # Time resolution
     time_interval = time_array[1] - time_array[0]
 
+    # Removing baseline
+    profile = _remove_baseline(np.atleast_2d(data_array), fitOpt.nPointsNoise)
+
     if method == 'sum':
-        integrated_value = time_interval * np.sum(
-            data_array - np.mean(data_array[0:fitOpt.nPointsNoise]))
+        integrated_value = time_interval * np.sum(profile, axis=-1)
     elif method == 'trapz':
-        integrated_value = time_interval * np.trapz(
-            data_array - np.mean(data_array[0:fitOpt.nPointsNoise]))
+        integrated_value = time_interval * np.trapz(profile, axis=-1)
     else:
         raise InputError('The method passed to the integrated_profile ' +
                          'function is not valid.')
@@ -321,18 +314,17 @@ def integrated_profile(time_array, data_array, method='sum',
         plt.figure(plotOpt.figname)
         if plotOpt.clf:
             plt.clf()
-        plt.plot(
-            time_array, data_array-np.mean(data_array[0:fitOpt.nPointsNoise]))
-        plt.plot(
-            time_array[0:fitOpt.nPointsNoise],
-            (data_array-np.mean(data_array[0:fitOpt.nPointsNoise]))[
-                0:fitOpt.nPointsNoise])
+        for index in range(len(profile)):
+            plt.plot(time_array, profile[index])
+            plt.plot(
+                time_array[0:fitOpt.nPointsNoise],
+                profile[index][0:fitOpt.nPointsNoise])
         if plotOpt.interactive:
             plt.pause(0.00001)
         else:
             plt.show()
 
-    return integrated_value
+    return _as_input_shape(data_array, integrated_value)
 
 
 def RMS(time_array, data_array, fitOpt=None):
@@ -343,13 +335,13 @@ def RMS(time_array, data_array, fitOpt=None):
     time_array : list or np.array
         The input time
     data_array : list or np.array
-        The input profile
+        The input profile, or a 2D array with one profile per row
 
     Returns
     -------
-    mean : float
+    mean : float or np.array
         The mean position of the profile, in time_array units
-    rms : float
+    rms : float or np.array
         The rms length of the profile, in time_array units
 
     Example
@@ -378,21 +370,21 @@ def RMS(time_array, data_array, fitOpt=None):
     time_interval = time_array[1] - time_array[0]
 
     # Removing baseline
-    profile = data_array-np.mean(data_array[0:fitOpt.nPointsNoise])
+    profile = _remove_baseline(np.atleast_2d(data_array), fitOpt.nPointsNoise)
 
     normalized_profile = profile / np.trapz(
-        profile, dx=time_interval)
+        profile, dx=time_interval, axis=-1)[:, np.newaxis]
 
     mean = np.trapz(time_array * normalized_profile,
-                    dx=time_interval)
+                    dx=time_interval, axis=-1)
 
     rms = fitOpt.bunchLengthFactor * np.sqrt(
-        np.trapz(((time_array - mean)**2) * normalized_profile,
-                 dx=time_interval))
+        np.trapz(((time_array - mean[:, np.newaxis])**2) * normalized_profile,
+                 dx=time_interval, axis=-1))
 
     mean += fitOpt.bunchPositionOffset
 
-    return mean, rms
+    return _as_input_shape(data_array, mean, rms)
 
 
 def binomial_from_width_ratio(time_array, data_array, levels=[0.8, 0.2],
@@ -412,29 +404,31 @@ def binomial_from_width_ratio(time_array, data_array, levels=[0.8, 0.2],
     time_array : list or np.array
         The input time
     data_array : list or np.array
-        The input profile
+        The input profile, or a 2D array with one profile per row
     levels : list or np.array with 2 elements
         Optional: The levels at which the width of the profile is used
         to evaluate the parameters of the fitting binomial profile.
         Default is [0.8, 0.2]
-    ratio_LUT : output from _binomial_from_width_LUT_generation
+    ratio_LUT : output from binomial_from_width_LUT_generation
         Optional: The function uses internally a lookup table obtained from the
-        _binomial_from_width_LUT_generation function to evaluate the binomial
-        parameters. The lookup table can be pre-calculated and passed directly
-        for efficiency purposes, if the function is used several times in a
-        row.
+        binomial_from_width_LUT_generation function to evaluate the binomial
+        parameters. By default, a dense table is generated once per levels
+        and kept in cache (see cached_binomial_from_width_LUT), the exponent
+        is then interpolated with a monotone cubic interpolation. A custom
+        lookup table can be passed directly, the exponent is then linearly
+        interpolated.
 
     Returns
     -------
-    amplitude : float
+    amplitude : float or np.array
         The amplitude of the binomial profile, in data_array units
-    position : float
+    position : float or np.array
         The central position of the profile, assumed to be binomial,
         in time_array units
-    full_length : float
+    full_length : float or np.array
         The full length of the profile, assumed to be binomial,
         in time_array units
-    exponent : float
+    exponent : float or np.array
         The exponent of the profile, assumed to be binomial
 
     Example
@@ -474,7 +468,7 @@ def binomial_from_width_ratio(time_array, data_array, levels=[0.8, 0.2],
     if ratio_LUT is None:
         level1 = np.max(levels)
         level2 = np.min(levels)
-        ratio_LUT = binomial_from_width_LUT_generation(
+        ratio_LUT, exponent_from_ratio = cached_binomial_from_width_LUT(
             [level1, level2])
         exponentArray, ratioFWArray, levels = ratio_LUT
     else:
@@ -482,15 +476,25 @@ def binomial_from_width_ratio(time_array, data_array, levels=[0.8, 0.2],
         level1 = np.max(levels)
         level2 = np.min(levels)
 
+        def exponent_from_ratio(ratioFW):
+            return np.interp(ratioFW, ratioFWArray, exponentArray)
+
+    # The baseline is removed once for all the profiles, with the default
+    # number of points as in the FWHM and peak_value functions
+    profiles = np.atleast_2d(data_array)
+    sampledNoise = _sampled_noise(profiles, FitOptions().nPointsNoise)
+    profileToFit = profiles - sampledNoise
+
     # Finding the width at two different levels
-    bunchPosition_1, bunchLength_1 = FWHM(
-        time_array, data_array, level=level1)[1:3]
-    bunchPosition_2, bunchLength_2 = FWHM(
-        time_array, data_array, level=level2)[1:3]
+    t1_1, t2_1 = _level_crossings(time_array, profileToFit, level1)[2:4]
+    t1_2, t2_2 = _level_crossings(time_array, profileToFit, level2)[2:4]
+
+    bunchLength_1 = t2_1-t1_1
+    bunchLength_2 = t2_2-t1_2
 
     ratioFW = bunchLength_1/bunchLength_2
 
-    exponent = np.interp(ratioFW, ratioFWArray, exponentArray)
+    exponent = exponent_from_ratio(ratioFW)
 
     full_length = (
         bunchLength_2 / np.sqrt(1-level2**(1/exponent)) +
@@ -499,33 +503,34 @@ def binomial_from_width_ratio(time_array, data_array, levels=[0.8, 0.2],
     rms = fitOpt.bunchLengthFactor*full_length / \
         (2.*np.sqrt(3.+2.*exponent))
 
-    position, amplitude = peak_value(time_array, data_array)
+    position, amplitude = _averaged_peak(
+        time_array, profiles, sampledNoise, 1.0)[0:2]
     position += fitOpt.bunchPositionOffset
 
     if plotOpt is not None:
         plt.figure(plotOpt.figname)
         if plotOpt.clf:
             plt.clf()
-        plt.plot(time_array, data_array)
-        plt.plot([bunchPosition_2-bunchLength_2/2,
-                  bunchPosition_2+bunchLength_2/2],
-                 [level2*np.max(data_array),
-                  level2*np.max(data_array)], 'r')
-        plt.plot([bunchPosition_1-bunchLength_1/2,
-                  bunchPosition_1+bunchLength_1/2],
-                 [level1*np.max(data_array),
-                  level1*np.max(data_array)], 'm')
-        plt.plot(time_array, analytic_distribution.binomialAmplitudeN(
-            time_array, *[amplitude,
-                          position,
-                          full_length,
-                          exponent]))
+        for index in range(len(profiles)):
+            plt.plot(time_array, profiles[index])
+            plt.plot([t1_2[index], t2_2[index]],
+                     [level2*np.max(profiles[index]),
+                      level2*np.max(profiles[index])], 'r')
+            plt.plot([t1_1[index], t2_1[index]],
+                     [level1*np.max(profiles[index]),
+                      level1*np.max(profiles[index])], 'm')
+            plt.plot(time_array, analytic_distribution.binomialAmplitudeN(
+                time_array, *[amplitude[index],
+                              position[index],
+                              full_length[index],
+                              exponent[index]]))
         if plotOpt.interactive:
             plt.pause(0.00001)
         else:
             plt.show()
 
-    return amplitude, position, full_length, exponent
+    return _as_input_shape(data_array, amplitude, position, full_length,
+                           exponent)
 
 
 def binomial_from_width_LUT_generation(levels=[0.8, 0.2],
@@ -632,6 +637,103 @@ def binomial_from_width_LUT_generation(levels=[0.8, 0.2],
         ratio_FW[sorting_ratio_FW], [level1, level2]
 
 
+@functools.lru_cache(maxsize=LUT_cache_size)
+def _cached_LUT(levels, exponent_min, exponent_max, exponent_distrib,
+                exponent_npoints):
+    """
+    The cached version of cached_binomial_from_width_LUT, with hashable
+    arguments.
+    """
+
+    exponent_array, ratio_FW, levels = binomial_from_width_LUT_generation(
+        list(levels), exponent_min=exponent_min, exponent_max=exponent_max,
+        exponent_distrib=exponent_distrib, exponent_npoints=exponent_npoints)
+
+    # The cached arrays are shared by all the callers
+    exponent_array.flags.writeable = False
+    ratio_FW.flags.writeable = False
+
+    pchip = PchipInterpolator(ratio_FW, exponent_array, extrapolate=False)
+
+    def exponent_from_ratio(ratio):
+        # Constant extrapolation outside of the table, as with np.interp
+        return pchip(np.clip(ratio, ratio_FW[0], ratio_FW[-1]))
+
+    return (exponent_array, ratio_FW, levels), exponent_from_ratio
+
+
+def cached_binomial_from_width_LUT(levels=[0.8, 0.2], exponent_min=0.5,
+                                   exponent_max=10.,
+                                   exponent_distrib='logspace',
+                                   exponent_npoints=None):
+    r""" Function to get the lookup table (LUT) for the
+    binomial_from_width_ratio function from a module level cache. The
+    table is generated with binomial_from_width_LUT_generation the first time
+    a set of (levels, exponent range, distribution, npoints) is requested,
+    the LUT_cache_size most recently used tables are kept in memory.
+
+    Parameters
+    ----------
+    levels : list or np.array with 2 elements
+        Optional: The levels at which the width of the profile is used
+        to evaluate the parameters of the fitting binomial profile.
+        Default is [0.8, 0.2]
+    exponent_min : float
+        Optional: The smallest exponent to consider for the binomial profile
+        Default is 0.5
+    exponent_max : float
+        Optional: The largest exponent to consider for the binomial profile
+        Default is 10.
+    exponent_distrib : str
+        Optional: Define how the exponent array of the LUT is distributed,
+        'logspace' (default) or 'linspace'
+    exponent_npoints: int
+        Optional: The number of points for the lookup table
+        Default is None, to use default_LUT_npoints
+
+    Returns
+    -------
+    ratio_LUT : tuple
+        The (read-only) output of binomial_from_width_LUT_generation
+    exponent_from_ratio : function
+        Returns the exponent corresponding to a ratio of the Full-Widths (or
+        an array of ratios), using a monotone cubic (PCHIP) interpolation of
+        the table
+
+    Example
+    -------
+    >>> from blond_common.fitting.profile import cached_binomial_from_width_LUT
+    >>>
+    >>> ratio_LUT, exponent_from_ratio = cached_binomial_from_width_LUT()
+    >>> exponent = exponent_from_ratio(0.6)
+    >>> cached_binomial_from_width_LUT_info()
+
+    """
+
+    if exponent_npoints is None:
+        exponent_npoints = default_LUT_npoints
+
+    return _cached_LUT((float(np.max(levels)), float(np.min(levels))),
+                       float(exponent_min), float(exponent_max),
+                       exponent_distrib, int(exponent_npoints))
+
+
+def cached_binomial_from_width_LUT_info():
+    r""" Function returning the statistics of the cache used by
+    cached_binomial_from_width_LUT, as a named tuple (hits, misses, maxsize,
+    currsize).
+    """
+
+    return _cached_LUT.cache_info()
+
+
+def cached_binomial_from_width_LUT_clear():
+    r""" Function emptying the cache used by cached_binomial_from_width_LUT.
+    """
+
+    _cached_LUT.cache_clear()
+
+
 def gaussian_fit(time_array, data_array,
                  fitOpt=None, plotOpt=None):
     r""" Function to fit a given profile with a Gaussian profile.
@@ -641,6 +743,10 @@ def gaussian_fit(time_array, data_array,
 
     TODO: update with the new analytic_distribution implementation
 
+    With FitOptions(fittingRoutine='moments'), the parameters are obtained
+    in closed form from the moments of the profile, without optimization
+    (faster, but not a least-squares fit, see _moments_fit).
+
     Parameters
     ----------
     time_array : list or np.array
@@ -680,6 +786,11 @@ def gaussian_fit(time_array, data_array,
     if fitOpt is None:
         fitOpt = FitOptions()
 
+    if fitOpt.fittingRoutine == 'moments':
+        return _moments_fit(time_array, data_array, fitOpt,
+                            analytic_distribution.gaussian,
+                            exponent='gaussian', plotOpt=plotOpt)
+
     if fitOpt.fitInitialParameters is None:
         maxProfile = np.max(data_array)
         fitOptFWHM = FitOptions(bunchLengthFactor='gaussian')
@@ -851,6 +962,10 @@ def parabolic_line_fit(time_array, data_array,
     as defined in
     blond_common.interfaces.beam.analytic_distribution.parabolicLine
 
+    With FitOptions(fittingRoutine='moments'), the parameters are obtained
+    in closed form from the moments of the profile, without optimization
+    (faster, but not a least-squares fit, see _moments_fit).
+
     Parameters
     ----------
     time_array : list or np.array
@@ -893,6 +1008,11 @@ def parabolic_line_fit(time_array, data_array,
     if fitOpt is None:
         fitOpt = FitOptions()
 
+    if fitOpt.fittingRoutine == 'moments':
+        return _moments_fit(time_array, data_array, fitOpt,
+                            profile_fit_function, exponent=1.,
+                            plotOpt=plotOpt)
+
     if fitOpt.fitInitialParameters is None:
         maxProfile = np.max(data_array)
         fitOptFWHM = FitOptions(bunchLengthFactor='parabolic_line')
@@ -920,6 +1040,10 @@ def parabolic_amplitude_fit(time_array, data_array, fitOpt=None, plotOpt=None):
     as defined in
     blond_common.interfaces.beam.analytic_distribution.parabolicAmplitude
 
+    With FitOptions(fittingRoutine='moments'), the parameters are obtained
+    in closed form from the moments of the profile, without optimization
+    (faster, but not a least-squares fit, see _moments_fit).
+
     Parameters
     ----------
     time_array : list or np.array
@@ -962,6 +1086,11 @@ def parabolic_amplitude_fit(time_array, data_array, fitOpt=None, plotOpt=None):
     if fitOpt is None:
         fitOpt = FitOptions()
 
+    if fitOpt.fittingRoutine == 'moments':
+        return _moments_fit(time_array, data_array, fitOpt,
+                            profile_fit_function, exponent=1.5,
+                            plotOpt=plotOpt)
+
     if fitOpt.fitInitialParameters is None:
         maxProfile = np.max(data_array)
         fitOptFWHM = FitOptions(bunchLengthFactor='parabolic_amplitude')
@@ -1058,6 +1187,10 @@ def binomial_amplitudeN_fit(time_array, data_array, fitOpt=None, plotOpt=None):
     as defined in
     blond_common.interfaces.beam.analytic_distribution.binomialAmplitudeN
 
+    With FitOptions(fittingRoutine='moments'), the parameters are obtained
+    in closed form from the moments of the profile, without optimization
+    (faster, but not a least-squares fit, see _moments_fit).
+
     Parameters
     ----------
     time_array : list or np.array
@@ -1103,6 +1236,11 @@ def binomial_amplitudeN_fit(time_array, data_array, fitOpt=None, plotOpt=None):
     if fitOpt is None:
         fitOpt = FitOptions()
 
+    if fitOpt.fittingRoutine == 'moments':
+        return _moments_fit(time_array, data_array, fitOpt,
+                            profile_fit_function, exponent=None,
+                            plotOpt=plotOpt)
+
     if fitOpt.fitInitialParameters is None:
         maxProfile = np.max(data_array)
         fitOptFWHM = FitOptions(bunchLengthFactor='parabolic_amplitude')
@@ -1315,6 +1453,17 @@ def arbitrary_profile_fit(time_array, data_array, profile_fit_function,
     fitInitialParameters[1] *= rescaleFactorX
     fitInitialParameters[2] *= rescaleFactorX
 
+    # Getting the Jacobian of the profile function
+    if fitOpt.jacobian is None or callable(fitOpt.jacobian):
+        jacobian = fitOpt.jacobian
+    elif fitOpt.jacobian == 'analytic':
+        jacobian = analytic_distribution.get_jacobian(profile_fit_function)
+        if jacobian is None:
+            raise InputError('No analytic jacobian is available for the ' +
+                             'profile_fit_function.')
+    else:
+        raise InputError('The jacobian in the FitOptions is not valid.')
+
     # Fitting
     if fitOpt.fittingRoutine == 'curve_fit':
 
@@ -1322,7 +1471,7 @@ def arbitrary_profile_fit(time_array, data_array, profile_fit_function,
             profile_fit_function,
             (time_array-time_array[0])*rescaleFactorX,
             profileToFit*rescaleFactorY,
-            p0=fitInitialParameters)[0]
+            p0=fitInitialParameters, jac=jacobian)[0]
 
     elif fitOpt.fittingRoutine == 'minimize':
 
@@ -1332,12 +1481,20 @@ def arbitrary_profile_fit(time_array, data_array, profile_fit_function,
             raise InputError('The residualFunction in the FitOptions is not ' +
                              'valid.')
 
+        # The gradient is only passed to the methods using it
+        if jacobian is None or fitOpt.method in ['Nelder-Mead', 'Powell',
+                                                 'COBYLA']:
+            jac = None
+        else:
+            jac = vertical_least_square_gradient
+
         fit_parameters = minimize(
             fitOpt.residualFunction,
             fitInitialParameters,
             args=(profile_fit_function,
                   (time_array-time_array[0])*rescaleFactorX,
-                  profileToFit*rescaleFactorY),
+                  profileToFit*rescaleFactorY, jacobian),
+            jac=jac,
             bounds=fitOpt.bounds,
             method=fitOpt.method,
             options=fitOpt.options)['x']
@@ -1378,3 +1535,248 @@ def arbitrary_profile_fit(time_array, data_array, profile_fit_function,
             plt.show()
 
     return fit_parameters
+
+
+def _moments_fit(time_array, data_array, fitOpt, profile_fit_function,
+                 exponent=None, plotOpt=None):
+    r""" Function to get the parameters of a Gaussian or binomial profile
+    from its moments, in closed form and without optimization. This is the
+    fittingRoutine='moments' option of the gaussian_fit, parabolic_line_fit,
+    parabolic_amplitude_fit and binomial_amplitudeN_fit functions.
+
+    The integral, mean, variance and fourth central moment are obtained in a
+    single pass from the weighted sums of the profile. For a binomial
+    profile with exponent :math:`\mu`, the kurtosis is
+    :math:`\kappa = 3(3+2\mu)/(5+2\mu)`, which gives
+    :math:`\mu = (5\kappa-9)/(2(3-\kappa))`, and the full length is
+    :math:`L = 2\sigma\sqrt{3+2\mu}`. The amplitude follows from the
+    integral of the profile.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time
+    data_array : list or np.array
+        The input profile
+    fitOpt : FitOptions
+        The nPointsNoise is used to remove the baseline
+    profile_fit_function : function
+        The profile function, used for the plot
+    exponent : float or str
+        The binomial exponent, None to obtain it from the kurtosis, or
+        'gaussian' for a Gaussian profile (returning the rms length instead
+        of the full length)
+
+    Returns
+    -------
+    fitted_parameters : np.array
+        The amplitude, position and rms (Gaussian) or full (binomial) length,
+        followed by the exponent if it was obtained from the kurtosis. If the
+        kurtosis is not below 3 (tails heavier than any binomial profile),
+        the length and exponent are infinite and the amplitude is the one of
+        the Gaussian limit
+    """
+
+    time_array = np.asarray(time_array, dtype=float)
+
+    # Removing baseline
+    profileToFit = data_array-np.mean(data_array[0:fitOpt.nPointsNoise])
+
+    # Time resolution
+    time_interval = time_array[1] - time_array[0]
+
+    # Weighted sums of the powers of the (normalized) time, in one pass
+    time_center = (time_array[-1]+time_array[0])/2
+    time_scale = (time_array[-1]-time_array[0])/2
+    powers = np.vander((time_array-time_center)/time_scale, 5,
+                       increasing=True)
+    sums = np.dot(profileToFit, powers)
+
+    integral = time_interval * sums[0]
+    raw_moments = sums[1:] / sums[0]
+
+    mean = raw_moments[0]
+    variance = raw_moments[1] - mean**2
+    fourth_moment = (raw_moments[3] - 4*mean*raw_moments[2]
+                     + 6*mean**2*raw_moments[1] - 3*mean**4)
+
+    position = time_center + mean*time_scale
+    rms_length = np.sqrt(variance)*time_scale
+
+    gaussian_amplitude = integral / (np.sqrt(2*np.pi)*rms_length)
+
+    if exponent == 'gaussian':
+        fit_parameters = np.array([gaussian_amplitude, position, rms_length])
+
+    else:
+        if exponent is None:
+            kurtosis = fourth_moment / variance**2
+            if kurtosis < 3:
+                fitted_exponent = max((5*kurtosis-9)/(2*(3-kurtosis)), 0.)
+            else:
+                fitted_exponent = np.inf
+        else:
+            fitted_exponent = exponent
+
+        if np.isfinite(fitted_exponent):
+            full_length = 2*rms_length*np.sqrt(3+2*fitted_exponent)
+            # Same as _binomial_integral, with gammaln to allow large
+            # exponents (close to Gaussian profiles)
+            amplitude = integral / (
+                full_length*np.sqrt(np.pi)/2 * np.exp(
+                    gammaln(1.+fitted_exponent)-gammaln(1.5+fitted_exponent)))
+        else:
+            full_length = np.inf
+            amplitude = gaussian_amplitude
+
+        fit_parameters = np.array([amplitude, position, full_length])
+        if exponent is None:
+            fit_parameters = np.append(fit_parameters, fitted_exponent)
+
+    if plotOpt is not None:
+
+        plt.figure(plotOpt.figname)
+        if plotOpt.clf:
+            plt.clf()
+        plt.plot(time_array,
+                 profileToFit, label='Data')
+        plt.plot(time_array,
+                 profile_fit_function(time_array, *fit_parameters),
+                 label='Moments')
+        if plotOpt.legend:
+            plt.legend(loc='best')
+        if plotOpt.interactive:
+            plt.pause(0.00001)
+        else:
+            plt.show()
+
+    return fit_parameters
+
+
+def _sampled_noise(profiles, nPointsNoise):
+    r""" Function to get the baseline of each row of a 2D array of profiles,
+    averaged over the first nPointsNoise points.
+    """
+
+    return np.mean(profiles[:, 0:nPointsNoise], axis=-1, keepdims=True)
+
+
+def _remove_baseline(profiles, nPointsNoise):
+    r""" Function to remove the baseline from each row of a 2D array of
+    profiles.
+    """
+
+    return profiles - _sampled_noise(profiles, nPointsNoise)
+
+
+def _level_crossings(time_array, profiles, level):
+    r""" Function to get, for each row of a 2D array of profiles, the first
+    and last times at which the profile crosses a given ratio of its maximum.
+    The first and last points above the level are found with np.argmax on the
+    boolean mask (and on the reversed mask), the crossing times are then
+    linearly interpolated with the previous/next point.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time
+    profiles : np.array
+        The 2D array of profiles, without baseline, one profile per row
+    level : float
+        The ratio from the maximum at which the crossings are evaluated
+
+    Returns
+    -------
+    maximum_value : np.array
+        The maximum of each profile
+    level_value : np.array
+        The level times the maximum of each profile
+    t1 : np.array
+        The time of the first crossing of each profile
+    t2 : np.array
+        The time of the last crossing of each profile
+    """
+
+    time_array = np.asarray(time_array)
+    rows = np.arange(profiles.shape[0])
+    last_point = profiles.shape[-1] - 1
+
+    # Time resolution
+    time_interval = time_array[1] - time_array[0]
+
+    maximum_value = np.max(profiles, axis=-1)
+    level_value = level * maximum_value
+
+    # First aproximation for the level crossings
+    above_level = profiles >= level_value[:, np.newaxis]
+    taux1 = np.argmax(above_level, axis=-1)
+    taux2 = last_point - np.argmax(above_level[:, ::-1], axis=-1)
+
+    at_left_boundary = (taux1 == 0)
+    at_right_boundary = (taux2 == last_point)
+
+    if np.any(at_left_boundary):
+        warnings.warn('FWHM is at left boundary of profile!')
+    if np.any(at_right_boundary):
+        warnings.warn('FWHM is at right boundary of profile!')
+
+    # Interpolation of the time where the line density is at the level,
+    # the points at the boundaries are not interpolated
+    profile_1 = profiles[rows, taux1]
+    profile_2 = profiles[rows, taux2]
+    previous_point = profiles[rows, np.maximum(taux1-1, 0)]
+    next_point = profiles[rows, np.minimum(taux2+1, last_point)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = np.where(
+            at_left_boundary, time_array[taux1],
+            time_array[taux1] - (profile_1-level_value)
+            / (profile_1 - previous_point) * time_interval)
+        t2 = np.where(
+            at_right_boundary, time_array[taux2],
+            time_array[taux2] + (profile_2-level_value)
+            / (profile_2 - next_point) * time_interval)
+
+    return maximum_value, level_value, t1, t2
+
+
+def _averaged_peak(time_array, profiles, sampledNoise, level):
+    r""" Function to get, for each row of a 2D array of profiles, the
+    position and amplitude averaged over the points above the level times
+    the maximum.
+
+    Returns
+    -------
+    position : np.array
+        The averaged position of the peak of each profile
+    amplitude : np.array
+        The averaged amplitude of the peak of each profile
+    selected_points : np.array
+        The boolean mask of the points above the level
+    """
+
+    selected_points = profiles >= (
+        level*np.max(profiles-sampledNoise, axis=-1, keepdims=True))
+    n_selected = np.sum(selected_points, axis=-1)
+
+    position = np.sum(np.where(selected_points, time_array, 0.),
+                      axis=-1) / n_selected
+
+    amplitude = np.sum(np.where(selected_points, profiles-sampledNoise, 0.),
+                       axis=-1) / n_selected
+
+    return position, amplitude, selected_points
+
+
+def _as_input_shape(data_array, *values):
+    r""" Function to return the values computed for a 2D array of profiles
+    as scalars if a single 1D profile was passed as input.
+    """
+
+    if np.ndim(data_array) == 1:
+        values = tuple(value[0] for value in values)
+
+    if len(values) == 1:
+        return values[0]
+    else:
+        return values
@@ -30,3 +30,23 @@ def vertical_least_square(fitParameters, *fittingArgList):
                       profile_fit_function(time_array, *fitParameters))**2)
 
     return residue
+
+
+def vertical_least_square_gradient(fitParameters, *fittingArgList):
+    '''
+    * Gradient of the vertical_least_square residue with respect to the
+    fitParameters, the Jacobian of the profile function is passed as the
+    fourth element of the fittingArgList.*
+    '''
+
+    profile_fit_function = fittingArgList[0]
+    time_array = fittingArgList[1]
+    fittedProfileInputY = fittingArgList[2]
+    jacobian = fittingArgList[3]
+
+    gradient = -2 * np.dot(
+        fittedProfileInputY - profile_fit_function(time_array,
+                                                   *fitParameters),
+        jacobian(time_array, *fitParameters))
+
+    return gradient
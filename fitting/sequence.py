@@ -0,0 +1,158 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to fit a sequence of profiles (e.g. turn by turn acquisitions),
+each fit being initialized with the result of the previous one**
+
+:Authors: **Alexandre Lasheen**, **Simon Albright**
+'''
+
+# General imports
+from __future__ import division
+import copy
+import numpy as np
+
+# Fitting imports
+from . profile import FitOptions, gaussian_fit
+
+
+def sequence_fit(time_array, profiles, fit_function=gaussian_fit,
+                 fitOpt=None, max_relative_change=0.5, full_output=False):
+    r""" Generator fitting the profiles one after the other, the initial
+    parameters of each fit are the fitted parameters of the previous
+    profile (warm start). The first profile is fitted with the default
+    initial guess of the fit_function (from the FWHM), or with the
+    fitInitialParameters of fitOpt.
+
+    The warm started fit is considered as diverged, and is repeated with the
+    default initial guess, if the fit raises a RuntimeError (e.g. maximum
+    number of function evaluations reached), if the fitted parameters are not
+    finite, if the position is outside of the time_array, or if the amplitude
+    or the length changed by more than max_relative_change with respect to
+    the previous profile.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time
+    profiles : iterable
+        The input profiles, e.g. a 2D array with one profile per row or a
+        generator returning the acquired profiles one by one
+    fit_function : function
+        The fitting function from blond_common.fitting.profile, e.g.
+        gaussian_fit (default) or binomial_amplitudeN_fit
+    fitOpt : FitOptions
+        Optional: The options passed to the fit_function, the
+        fitInitialParameters are only used for the first profile
+    max_relative_change : float
+        Optional: The maximum relative change of the amplitude and length
+        between two consecutive profiles before the fit is considered as
+        diverged. Default is 0.5
+    full_output : bool
+        Optional: If True, a flag telling if the fit was warm started is
+        yielded with the fitted parameters. Default is False
+
+    Yields
+    ------
+    fit_parameters : np.array
+        The fitted parameters of each profile, as returned by the fit_function
+    warm_started : bool
+        Only if full_output is True, False if the default initial guess was
+        used (first profile, or diverged warm started fit)
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from blond_common.interfaces.beam.analytic_distribution import gaussian
+    >>> from blond_common.fitting.sequence import sequence_fit
+    >>>
+    >>> time_array = np.arange(0, 25e-9, 0.1e-9)
+    >>> profiles = [gaussian(time_array, 1., 13e-9+0.01e-9*turn, 2e-9)
+    >>>             for turn in range(1000)]
+    >>>
+    >>> for fit_parameters in sequence_fit(time_array, profiles):
+    >>>     amplitude, position, rms_length = fit_parameters
+
+    """
+
+    if fitOpt is None:
+        fitOpt = FitOptions()
+
+    time_array = np.asarray(time_array)
+
+    previous_parameters = fitOpt.fitInitialParameters
+
+    for data_array in profiles:
+
+        fit_parameters = None
+
+        if previous_parameters is not None:
+            try:
+                fit_parameters = _fit(time_array, data_array, fit_function,
+                                      fitOpt, previous_parameters)
+            except RuntimeError:
+                fit_parameters = None
+
+            if fit_parameters is not None and _diverged(
+                    time_array, fit_parameters, previous_parameters,
+                    max_relative_change):
+                fit_parameters = None
+
+        warm_started = fit_parameters is not None
+
+        # Cold start, the errors of the fit_function are not caught
+        if not warm_started:
+            fit_parameters = _fit(time_array, data_array, fit_function,
+                                  fitOpt, None)
+
+        previous_parameters = fit_parameters
+
+        if full_output:
+            yield fit_parameters, warm_started
+        else:
+            yield fit_parameters
+
+
+def _fit(time_array, data_array, fit_function, fitOpt, initial_parameters):
+    """
+    Fitting one profile with a copy of fitOpt, to not modify the options of
+    the user (the fit functions set the fitInitialParameters).
+    """
+
+    turnFitOpt = copy.copy(fitOpt)
+    if initial_parameters is None:
+        turnFitOpt.fitInitialParameters = None
+    else:
+        turnFitOpt.fitInitialParameters = np.array(initial_parameters,
+                                                   dtype=float)
+
+    return fit_function(time_array, data_array, fitOpt=turnFitOpt)
+
+
+def _diverged(time_array, fit_parameters, previous_parameters,
+              max_relative_change):
+    """
+    Check if a warm started fit diverged, based on the fitted parameters
+    (amplitude, position, length, ...) compared to the previous profile.
+    """
+
+    if not np.all(np.isfinite(fit_parameters)):
+        return True
+
+    if not (time_array[0] <= fit_parameters[1] <= time_array[-1]):
+        return True
+
+    for index in [0, 2]:
+        relative_change = np.abs(fit_parameters[index]
+                                 / previous_parameters[index] - 1)
+        if not relative_change <= max_relative_change:
+            return True
+
+    return False
@@ -0,0 +1,171 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to fit profiles in the frequency domain, using the low frequency
+harmonics of the profile and the analytic spectra of the distributions**
+
+:Authors: **Alexandre Lasheen**, **Simon Albright**
+'''
+
+# General imports
+from __future__ import division
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.optimize import curve_fit
+
+# Analytic distributions import
+from .. interfaces.beam import analytic_distribution
+
+# Fitting imports
+from . profile import FitOptions
+from . batch import distributions, initial_guess
+
+# Devtools imports
+from .. devtools.exceptions import InputError
+
+
+def spectrum_profile_fit(time_array, data_array, distribution='gaussian',
+                         n_harmonics=None, fitOpt=None, plotOpt=None):
+    r""" Function to fit a profile in the frequency domain. The first
+    harmonics of the discrete Fourier transform of the profile (the DC
+    component excluded) are fitted with the analytic spectrum of the
+    distribution from blond_common.interfaces.beam.analytic_distribution.
+
+    The fit only involves 2*n_harmonics points instead of the full profile,
+    and is insensitive to a constant baseline. The profile should be
+    contained in the time window, which is considered as periodic.
+
+    Parameters
+    ----------
+    time_array : list or np.array
+        The input time, with a constant sampling
+    data_array : list or np.array
+        The input profile
+    distribution : str
+        Optional: The name of the distribution, among 'gaussian' (default),
+        'waterbag', 'parabolicLine', 'parabolicAmplitude',
+        'binomialAmplitude2', 'binomialAmplitudeN', 'cosine' and
+        'cosineSquared'
+    n_harmonics : int
+        Optional: The number of harmonics of the time window used in the fit.
+        The default is None, the harmonics up to 1/(pi*sigma_rms) are used
+    fitOpt : FitOptions
+        Optional: The fitInitialParameters are used as initial guess
+        (otherwise obtained from the maximum, mean position and rms length of
+        the profile), the nPointsNoise is used to remove the baseline for the
+        initial guess
+    plotOpt : PlotOptions
+        Optional: Plotting the profile and the fitted distribution
+
+    Returns
+    -------
+    fitted_parameters : np.array
+        The fitted parameters, in the same order as the distribution function
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from blond_common.interfaces.beam.analytic_distribution import (
+    >>>     binomialAmplitudeN)
+    >>> from blond_common.fitting.spectrum import spectrum_profile_fit
+    >>>
+    >>> time_array = np.arange(0, 25e-9, 0.1e-9)
+    >>> data_array = binomialAmplitudeN(time_array, 1., 13e-9, 8e-9, 1.5)
+    >>>
+    >>> amplitude, position, full_length, exponent = spectrum_profile_fit(
+    >>>     time_array, data_array, 'binomialAmplitudeN')
+
+    """
+
+    if fitOpt is None:
+        fitOpt = FitOptions()
+
+    try:
+        profile_fit_function, lengthFactor, extraParameters = \
+            distributions[distribution]
+        spectrum_function = analytic_distribution.spectra[profile_fit_function]
+    except KeyError:
+        raise InputError('No analytic spectrum is available for the ' +
+                         'distribution ' + str(distribution) + '.')
+
+    time_array = np.asarray(time_array, dtype=float)
+    data_array = np.asarray(data_array, dtype=float)
+    n_points = len(time_array)
+
+    profileToFit = data_array-np.mean(data_array[0:fitOpt.nPointsNoise])
+
+    # Rescaling so that the fit parameters are around 1
+    rescaleFactorX = 1/(time_array[-1]-time_array[0])
+    rescaleFactorY = 1/np.max(profileToFit)
+
+    scaled_time = (time_array-time_array[0])*rescaleFactorX
+
+    if fitOpt.fitInitialParameters is None:
+        fitInitialParameters = initial_guess(
+            scaled_time, profileToFit[np.newaxis, :]*rescaleFactorY,
+            lengthFactor, extraParameters)[0]
+    else:
+        fitInitialParameters = np.array(fitOpt.fitInitialParameters,
+                                        dtype=float)
+        fitInitialParameters[0] *= rescaleFactorY
+        fitInitialParameters[1] -= time_array[0]
+        fitInitialParameters[1] *= rescaleFactorX
+        fitInitialParameters[2] *= rescaleFactorX
+
+    # Spectrum of the profile, the DFT is scaled to approximate the Fourier
+    # transform
+    scaled_step = scaled_time[1]-scaled_time[0]
+    frequency = np.fft.rfftfreq(n_points, scaled_step)
+    spectrum = np.fft.rfft(data_array*rescaleFactorY)*scaled_step
+
+    if n_harmonics is None:
+        rms_length = fitInitialParameters[2]/lengthFactor
+        n_harmonics = int(np.ceil(1/(np.pi*rms_length*frequency[1])))
+    n_harmonics = min(max(n_harmonics, len(fitInitialParameters)),
+                      len(frequency)-1)
+
+    frequency = frequency[1:n_harmonics+1]
+    spectrum = spectrum[1:n_harmonics+1]
+
+    def spectrum_fit_function(frequency, *fit_parameters):
+        fit_spectrum = spectrum_function(frequency, *fit_parameters)
+        return np.concatenate((fit_spectrum.real, fit_spectrum.imag))
+
+    fit_parameters = curve_fit(
+        spectrum_fit_function, frequency,
+        np.concatenate((spectrum.real, spectrum.imag)),
+        p0=fitInitialParameters)[0]
+
+    # Abs on fit parameters
+    fit_parameters = np.abs(fit_parameters)
+
+    # Rescaling back to the original dimensions
+    fit_parameters[0] /= rescaleFactorY
+    fit_parameters[1] /= rescaleFactorX
+    fit_parameters[1] += time_array[0]
+    fit_parameters[2] /= rescaleFactorX
+
+    if plotOpt is not None:
+
+        plt.figure(plotOpt.figname)
+        if plotOpt.clf:
+            plt.clf()
+        plt.plot(time_array, profileToFit, label='Data')
+        plt.plot(time_array,
+                 profile_fit_function(time_array, *fit_parameters),
+                 label='Fit')
+        if plotOpt.legend:
+            plt.legend(loc='best')
+        if plotOpt.interactive:
+            plt.pause(0.00001)
+        else:
+            plt.show()
+
+    return fit_parameters
@@ -11,6 +11,14 @@
 **Module containing all base distribution functions used for fitting in
 the distribution.py module**
 
+The profile functions (gaussian, binomialAmplitudeN, cosine...) also accept
+fit parameters as arrays broadcastable with the time array, e.g. of shape
+(n_profiles, 1), to evaluate several profiles at once.
+
+The spectra of the profile functions (gaussian_spectrum,
+binomialAmplitudeN_spectrum, cosine_spectrum...) are defined as the Fourier
+transform :math:`S(f) = \int profile(t) e^{-2 i \pi f t} dt`.
+
 :Authors: **Alexandre Lasheen**, **Markus Schwarz**
 '''
 
@@ -19,7 +27,7 @@ from __future__ import division
 import numpy as np
 import inspect
 # import scipy.special as special_fun
-from scipy.special import gamma
+from scipy.special import gamma, gammaln, hyp0f1
 
 # Other packages import
 from ...devtools.BLonD_Rc import rcBLonDparams
@@ -467,6 +475,25 @@ def gaussian(time, *fitParameters):
     return lineDensityFunction
 
 
+def gaussian_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the gaussian line density with respect to the
+    fitParameters, the last axis corresponds to the parameters
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    sigma = abs(fitParameters[2])
+
+    exponential = np.exp(-(time-bunchPosition)**2/(2*sigma**2))
+
+    return _stack_derivatives(
+        exponential,
+        amplitude * exponential * (time-bunchPosition) / sigma**2,
+        amplitude * exponential * (time-bunchPosition)**2 / sigma**3
+        * np.sign(fitParameters[2]))
+
+
 def generalizedGaussian(time, *fitParameters):
     '''
     Generalized gaussian line density
@@ -483,6 +510,35 @@ def generalizedGaussian(time, *fitParameters):
     return lineDensityFunction
 
 
+def generalizedGaussian_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the generalized gaussian line density with respect to the
+    fitParameters, the last axis corresponds to the parameters
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    alpha = abs(fitParameters[2])
+    exponent = abs(fitParameters[3])
+
+    distance = time - bunchPosition
+    power = (np.abs(distance)/(2*alpha))**exponent
+    lineDensityFunction = amplitude * np.exp(-power)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derivativePosition = np.where(
+            distance != 0, lineDensityFunction*exponent*power/distance, 0.)
+        derivativeExponent = np.where(
+            power > 0, -lineDensityFunction*power*np.log(power)/exponent, 0.)
+
+    return _stack_derivatives(
+        np.exp(-power),
+        derivativePosition,
+        lineDensityFunction * exponent * power / alpha
+        * np.sign(fitParameters[2]),
+        derivativeExponent * np.sign(fitParameters[3]))
+
+
 def waterbag(time, *fitParameters):
     '''
     Waterbag distribution line density
@@ -492,15 +548,24 @@ def waterbag(time, *fitParameters):
     bunchPosition = fitParameters[1]
     bunchLength = abs(fitParameters[2])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
-        amplitude * (1-(
-            (time[np.abs(time-bunchPosition) < bunchLength/2]-bunchPosition) /
-            (bunchLength/2))**2)**0.5
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
+        amplitude * np.clip(1-(
+            (time-bunchPosition) /
+            (bunchLength/2))**2, 0, None)**0.5, 0.)
 
     return lineDensityFunction
 
 
+def waterbag_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the waterbag distribution line density with respect to the
+    fitParameters, the last axis corresponds to the parameters
+    '''
+
+    return _binomial_jacobian(time, *fitParameters[:3], 0.5)[..., :3]
+
+
 def parabolicLine(time, *fitParameters):
     '''
     Parabolic line density
@@ -510,15 +575,24 @@ def parabolicLine(time, *fitParameters):
     bunchPosition = fitParameters[1]
     bunchLength = abs(fitParameters[2])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
-        amplitude * (1-(
-            (time[np.abs(time-bunchPosition) < bunchLength/2]-bunchPosition) /
-            (bunchLength/2))**2)
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
+        amplitude * np.clip(1-(
+            (time-bunchPosition) /
+            (bunchLength/2))**2, 0, None), 0.)
 
     return lineDensityFunction
 
 
+def parabolicLine_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the parabolic line line density with respect to the
+    fitParameters, the last axis corresponds to the parameters
+    '''
+
+    return _binomial_jacobian(time, *fitParameters[:3], 1.)[..., :3]
+
+
 def parabolicAmplitude(time, *fitParameters):
     '''
     Parabolic in action line density
@@ -528,15 +602,24 @@ def parabolicAmplitude(time, *fitParameters):
     bunchPosition = fitParameters[1]
     bunchLength = abs(fitParameters[2])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
-        amplitude * (1-(
-            (time[np.abs(time-bunchPosition) < bunchLength/2]-bunchPosition) /
-            (bunchLength/2))**2)**1.5
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
+        amplitude * np.clip(1-(
+            (time-bunchPosition) /
+            (bunchLength/2))**2, 0, None)**1.5, 0.)
 
     return lineDensityFunction
 
 
+def parabolicAmplitude_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the parabolic in action line density with respect to the
+    fitParameters, the last axis corresponds to the parameters
+    '''
+
+    return _binomial_jacobian(time, *fitParameters[:3], 1.5)[..., :3]
+
+
 def binomialAmplitude2(time, *fitParameters):
     '''
     Binomial exponent 2 in action line density
@@ -546,15 +629,24 @@ def binomialAmplitude2(time, *fitParameters):
     bunchPosition = fitParameters[1]
     bunchLength = abs(fitParameters[2])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
-        amplitude * (1-(
-            (time[np.abs(time-bunchPosition) < bunchLength/2]-bunchPosition) /
-            (bunchLength/2))**2)**2.
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
+        amplitude * np.clip(1-(
+            (time-bunchPosition) /
+            (bunchLength/2))**2, 0, None)**2., 0.)
 
     return lineDensityFunction
 
 
+def binomialAmplitude2_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the binomial exponent 2 in action line density with respect to the
+    fitParameters, the last axis corresponds to the parameters
+    '''
+
+    return _binomial_jacobian(time, *fitParameters[:3], 2.)[..., :3]
+
+
 def binomialAmplitudeN(time, *fitParameters):
     '''
     Binomial exponent n in action line density
@@ -565,15 +657,53 @@ def binomialAmplitudeN(time, *fitParameters):
     bunchLength = abs(fitParameters[2])
     exponent = abs(fitParameters[3])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
-        amplitude * (1-(
-            (time[np.abs(time-bunchPosition) < bunchLength/2]-bunchPosition) /
-            (bunchLength/2))**2)**exponent
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
+        amplitude * np.clip(1-(
+            (time-bunchPosition) /
+            (bunchLength/2))**2, 0, None)**exponent, 0.)
 
     return lineDensityFunction
 
 
+def binomialAmplitudeN_jacobian(time, *fitParameters):
+    '''
+    Derivatives of the binomial exponent n in action line density with
+    respect to the fitParameters, the last axis corresponds to the parameters
+    '''
+
+    return _binomial_jacobian(time, *fitParameters)
+
+
+def _binomial_jacobian(time, amplitude, bunchPosition, bunchLength,
+                       exponent):
+    '''
+    Derivatives of the binomial line density with respect to the amplitude,
+    position, full length and exponent
+    '''
+
+    signLength = np.sign(bunchLength)
+    signExponent = np.sign(exponent)
+    bunchLength = abs(bunchLength)
+    exponent = abs(exponent)
+
+    inside = np.abs(time-bunchPosition) < bunchLength/2
+    normalized = (time-bunchPosition) / (bunchLength/2)
+    base = np.clip(1-normalized**2, 0, None)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baseExponent = np.where(inside, base**exponent, 0.)
+        baseDerivative = np.where(inside, exponent*base**(exponent-1), 0.)
+        logBase = np.where(inside, np.log(base), 0.)
+
+    return _stack_derivatives(
+        baseExponent,
+        4 * amplitude * normalized * baseDerivative / bunchLength,
+        2 * amplitude * normalized**2 * baseDerivative / bunchLength
+        * signLength,
+        amplitude * baseExponent * logBase * signExponent)
+
+
 def _binomial_full_to_rms(full_bunch_length, exponent):
     '''
     Returns the RMS bunch length from the full bunch length and exponent
@@ -617,15 +747,35 @@ def cosine(time, *fitParameters):
     bunchPosition = fitParameters[1]
     bunchLength = abs(fitParameters[2])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
         amplitude * np.cos(
-            np.pi*(time[np.abs(time-bunchPosition) < bunchLength/2] -
-                   bunchPosition) / bunchLength)
+            np.pi*(time -
+                   bunchPosition) / bunchLength), 0.)
 
     return lineDensityFunction
 
 
+def cosine_jacobian(time, *fitParameters):
+    '''
+    * Derivatives of the cosine line density with respect to the
+    fitParameters, the last axis corresponds to the parameters *
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    bunchLength = abs(fitParameters[2])
+
+    inside = np.abs(time-bunchPosition) < bunchLength/2
+    phase = np.pi*(time - bunchPosition) / bunchLength
+    sine = np.where(inside, amplitude * np.sin(phase), 0.)
+
+    return _stack_derivatives(
+        np.where(inside, np.cos(phase), 0.),
+        sine * np.pi / bunchLength,
+        sine * phase / bunchLength * np.sign(fitParameters[2]))
+
+
 def cosineSquared(time, *fitParameters):
     '''
     * Cosine squared line density *
@@ -635,10 +785,200 @@ def cosineSquared(time, *fitParameters):
     bunchPosition = fitParameters[1]
     bunchLength = abs(fitParameters[2])
 
-    lineDensityFunction = np.zeros(len(time))
-    lineDensityFunction[np.abs(time-bunchPosition) < bunchLength/2] = \
+    lineDensityFunction = np.where(
+        np.abs(time-bunchPosition) < bunchLength/2,
         amplitude * np.cos(
-            np.pi*(time[np.abs(time-bunchPosition) < bunchLength/2] -
-                   bunchPosition) / bunchLength)**2.
+            np.pi*(time -
+                   bunchPosition) / bunchLength)**2., 0.)
 
     return lineDensityFunction
+
+
+def cosineSquared_jacobian(time, *fitParameters):
+    '''
+    * Derivatives of the cosine squared line density with respect to the
+    fitParameters, the last axis corresponds to the parameters *
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    bunchLength = abs(fitParameters[2])
+
+    inside = np.abs(time-bunchPosition) < bunchLength/2
+    phase = np.pi*(time - bunchPosition) / bunchLength
+    sine = np.where(inside, amplitude * np.sin(2*phase), 0.)
+
+    return _stack_derivatives(
+        np.where(inside, np.cos(phase)**2., 0.),
+        sine * np.pi / bunchLength,
+        sine * phase / bunchLength * np.sign(fitParameters[2]))
+
+
+def _stack_derivatives(*derivatives):
+    '''
+    Stacks the derivatives with respect to each parameter along the last
+    axis, broadcasting them to a common shape
+    '''
+
+    return np.stack(np.broadcast_arrays(*derivatives), axis=-1)
+
+
+def gaussian_spectrum(frequency, *fitParameters):
+    '''
+    Spectrum of the Gaussian line density
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    sigma = abs(fitParameters[2])
+
+    return np.sqrt(2*np.pi) * amplitude * sigma \
+        * np.exp(-0.5*(2*np.pi*frequency*sigma)**2) \
+        * np.exp(-2j*np.pi*frequency*bunchPosition)
+
+
+def waterbag_spectrum(frequency, *fitParameters):
+    '''
+    Spectrum of the waterbag distribution line density
+    '''
+
+    return _binomial_spectrum(frequency, *fitParameters[:3], 0.5)
+
+
+def parabolicLine_spectrum(frequency, *fitParameters):
+    '''
+    Spectrum of the parabolic line density
+    '''
+
+    return _binomial_spectrum(frequency, *fitParameters[:3], 1.)
+
+
+def parabolicAmplitude_spectrum(frequency, *fitParameters):
+    '''
+    Spectrum of the parabolic in action line density
+    '''
+
+    return _binomial_spectrum(frequency, *fitParameters[:3], 1.5)
+
+
+def binomialAmplitude2_spectrum(frequency, *fitParameters):
+    '''
+    Spectrum of the binomial exponent 2 in action line density
+    '''
+
+    return _binomial_spectrum(frequency, *fitParameters[:3], 2.)
+
+
+def binomialAmplitudeN_spectrum(frequency, *fitParameters):
+    '''
+    Spectrum of the binomial exponent n in action line density
+    '''
+
+    return _binomial_spectrum(frequency, *fitParameters)
+
+
+def _binomial_spectrum(frequency, amplitude, bunchPosition, bunchLength,
+                       exponent):
+    r'''
+    Spectrum of the binomial line density, with the full length :math:`L`
+    and exponent :math:`\mu`
+
+    .. math::
+        S(f) = A \frac{L\sqrt{\pi}}{2}
+        \frac{\Gamma(\mu+1)}{\Gamma(\mu+3/2)}
+        {}_0F_1(;\mu+3/2;-(\pi f L)^2/4) e^{-2 i \pi f t_0}
+    '''
+
+    bunchLength = abs(bunchLength)
+    exponent = abs(exponent)
+
+    return amplitude * bunchLength * np.sqrt(np.pi) / 2 \
+        * np.exp(gammaln(1.+exponent) - gammaln(1.5+exponent)) \
+        * hyp0f1(1.5+exponent, -(np.pi*frequency*bunchLength)**2/4) \
+        * np.exp(-2j*np.pi*frequency*bunchPosition)
+
+
+def cosine_spectrum(frequency, *fitParameters):
+    r'''
+    Spectrum of the cosine line density
+
+    .. math::
+        S(f) = A \frac{2L}{\pi} \frac{\cos(\pi f L)}{1-4f^2L^2}
+        e^{-2 i \pi f t_0}
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    bunchLength = abs(fitParameters[2])
+
+    fL = frequency*bunchLength
+
+    # The limit at fL = 1/2 is L/2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spectrum = np.where(
+            np.abs(1-4*fL**2) > 1e-8,
+            2*bunchLength/np.pi * np.cos(np.pi*fL) / (1-4*fL**2),
+            bunchLength/2)
+
+    return amplitude * spectrum * np.exp(-2j*np.pi*frequency*bunchPosition)
+
+
+def cosineSquared_spectrum(frequency, *fitParameters):
+    r'''
+    Spectrum of the cosine squared line density
+
+    .. math::
+        S(f) = A \frac{L}{2} \left(\mathrm{sinc}(fL) +
+        \frac{\mathrm{sinc}(fL-1)+\mathrm{sinc}(fL+1)}{2}\right)
+        e^{-2 i \pi f t_0}
+    '''
+
+    amplitude = fitParameters[0]
+    bunchPosition = fitParameters[1]
+    bunchLength = abs(fitParameters[2])
+
+    fL = frequency*bunchLength
+
+    return amplitude * bunchLength / 2 \
+        * (np.sinc(fL) + (np.sinc(fL-1) + np.sinc(fL+1))/2) \
+        * np.exp(-2j*np.pi*frequency*bunchPosition)
+
+
+# Jacobians of the profile functions
+jacobians = {gaussian: gaussian_jacobian,
+             generalizedGaussian: generalizedGaussian_jacobian,
+             waterbag: waterbag_jacobian,
+             parabolicLine: parabolicLine_jacobian,
+             parabolicAmplitude: parabolicAmplitude_jacobian,
+             binomialAmplitude2: binomialAmplitude2_jacobian,
+             binomialAmplitudeN: binomialAmplitudeN_jacobian,
+             cosine: cosine_jacobian,
+             cosineSquared: cosineSquared_jacobian}
+
+
+def get_jacobian(profile_function):
+    '''
+    Returns the Jacobian of a profile function from this module, or of
+    the profile method of a Gaussian object parametrized by the RMS,
+    None if not available
+    '''
+
+    if isinstance(getattr(profile_function, '__self__', None), Gaussian) \
+            and rcBLonDparams['distribution.scale_means'] == 'RMS':
+        return gaussian_jacobian
+
+    try:
+        return jacobians.get(profile_function)
+    except TypeError:
+        return None
+
+
+# Spectra of the profile functions
+spectra = {gaussian: gaussian_spectrum,
+           waterbag: waterbag_spectrum,
+           parabolicLine: parabolicLine_spectrum,
+           parabolicAmplitude: parabolicAmplitude_spectrum,
+           binomialAmplitude2: binomialAmplitude2_spectrum,
+           binomialAmplitudeN: binomialAmplitudeN_spectrum,
+           cosine: cosine_spectrum,
+           cosineSquared: cosineSquared_spectrum}
@@ -27,6 +27,25 @@ from ...devtools import assertions
 # from ..setup_cpp import libblond
 # from .. import libblond
 
+# Maximum number of elements of the (mode, point) blocks evaluated at once
+# by the analytic sources with several modes, chosen to fit in the cache
+block_size = 2**15
+
+
+def _mode_blocks(n_modes, n_points):
+    '''
+    Slices of the modes and points of the (mode, point) blocks with at most
+    block_size elements
+    '''
+
+    mode_step = min(n_modes, max(1, block_size // 256))
+    point_step = max(1, block_size // mode_step)
+
+    for mode_start in range(0, n_modes, mode_step):
+        for point_start in range(0, n_points, point_step):
+            yield (slice(mode_start, mode_start + mode_step),
+                   slice(point_start, point_start + point_step))
+
 
 class _ImpedanceObject:
 
@@ -85,6 +104,11 @@ class _InputTable(_ImpedanceObject):
     will be assumed to be Hermitian (Real part symmetric and Imaginary part
     antisymmetric).Note that we add the point (f, Z(f)) = (0, 0) to the
     frequency and impedance arrays derived from the table.
+    With copy=False, the input arrays are used without copies (e.g.
+    memory-mapped arrays, see table_cache), except to add this point, and
+    the interpolation on the input grid is not computed: the output arrays
+    are only defined after the first call of wake_calc or imped_calc and
+    impedance_loaded is computed when it is first accessed.
 
     Parameters
     ----------
@@ -95,6 +119,9 @@ class _InputTable(_ImpedanceObject):
         in :math:`\Omega`
     input_3 : float array
         Imaginary part of impedance in :math:`\Omega`
+    copy : bool
+        Optional: Copying the input arrays and computing the table on the
+        input grid. Default is True
 
 
     Attributes
@@ -110,7 +137,8 @@ class _InputTable(_ImpedanceObject):
     Im_Z_array_loaded : float array
         Input imaginary part of impedance in :math:`\Omega`
     impedance_loaded : complex array
-        Input impedance array in :math:`\Omega + j \Omega`
+        Input impedance array in :math:`\Omega + j \Omega`, with the
+        (0, 0) point as the frequency_array_loaded
 
     Examples
     --------
@@ -131,30 +159,36 @@ class _InputTable(_ImpedanceObject):
 
     """
 
-    def __init__(self, input_1, input_2, input_3=None):
+    def __init__(self, input_1, input_2, input_3=None, copy=True):
 
         super().__init__()
         
         if self.__class__.__name__ == 'ImpedanceTable':
             self.imped_calc = self._imped_calc
-            self._imped_input(input_1, input_2, input_3)
+            self._imped_input(input_1, input_2, input_3, copy)
         elif self.__class__.__name__ == 'WakefieldTable':
             self.wake_calc = self._wake_calc
-            self._wake_input(input_1, input_2)
+            self._wake_input(input_1, input_2, copy)
         else:
             if input_3 is None:
                 self.wake_calc = self._wake_calc
-                self._wake_input(input_1, input_2)
+                self._wake_input(input_1, input_2, copy)
             else:
                 self.imped_calc = self._imped_calc
-                self._imped_input(input_1, input_2, input_3)
+                self._imped_input(input_1, input_2, input_3, copy)
 
 
-    def _wake_input(self, time, wake):
+    def _wake_input(self, time, wake, copy=True):
         
         assertions.equal_array_lengths(time, wake, 
                          msg='input time and wake do not have the same length', 
                          exception = exceptions.InputError)
+
+        if not copy:
+            self.time_array_loaded = np.asarray(time)
+            self.wake_array_loaded = np.asarray(wake)
+            return
+
         # Time array of the wake in s
         self.time_array_loaded = np.array(time)
         # Wake array in :math:`\Omega / s
@@ -162,28 +196,50 @@ class _InputTable(_ImpedanceObject):
         
         self.wake_calc(time)
     
-    def _imped_input(self, frequency, real, imag):
+    def _imped_input(self, frequency, real, imag, copy=True):
 
         assertions.equal_array_lengths(frequency, real, imag, 
                          msg='input frequency, real and imag do not have '\
                          'the same length', exception = exceptions.InputError)
+        if copy:
+            convert = np.array
+        else:
+            convert = np.asarray
+
         # Frequency array of the impedance in Hz
-        self.frequency_array_loaded = np.array(frequency)
+        self.frequency_array_loaded = convert(frequency)
         # Real part of impedance in :math:`\Omega`
-        self.Re_Z_array_loaded = np.array(real)
+        self.Re_Z_array_loaded = convert(real)
         # Imaginary part of impedance in :math:`\Omega`
-        self.Im_Z_array_loaded = np.array(imag)
-        # Impedance array in :math:`\Omega`
-        self.impedance_loaded = (self.Re_Z_array_loaded + 1j *
-                                 self.Im_Z_array_loaded)
+        self.Im_Z_array_loaded = convert(imag)
 
         if self.frequency_array_loaded[0] != 0:
             self.frequency_array_loaded = np.hstack(
                 (0, self.frequency_array_loaded))
             self.Re_Z_array_loaded = np.hstack((0, self.Re_Z_array_loaded))
             self.Im_Z_array_loaded = np.hstack((0, self.Im_Z_array_loaded))
-        
-        self.imped_calc(frequency)
+
+        # Impedance array in :math:`\Omega` on the frequency_array_loaded,
+        # computed when first accessed without copies
+        if copy:
+            self.impedance_loaded = (self.Re_Z_array_loaded + 1j *
+                                     self.Im_Z_array_loaded)
+            self.imped_calc(frequency)
+        else:
+            self._impedance_loaded = None
+
+    @property
+    def impedance_loaded(self):
+
+        if self._impedance_loaded is None:
+            self._impedance_loaded = (self.Re_Z_array_loaded + 1j *
+                                      self.Im_Z_array_loaded)
+
+        return self._impedance_loaded
+
+    @impedance_loaded.setter
+    def impedance_loaded(self, value):
+        self._impedance_loaded = value
 
 
     def _wake_calc(self, new_time_array):
@@ -245,7 +301,7 @@ class _InputTable(_ImpedanceObject):
 
 class ImpedanceTable(_InputTable):
     
-    def __init__(self, frequency, real = None, imag = None):
+    def __init__(self, frequency, real = None, imag = None, copy = True):
         
         try:
             iter(frequency)
@@ -261,19 +317,19 @@ class ImpedanceTable(_InputTable):
         if imag is None:
             imag = np.zeros(len(frequency))
         
-        super().__init__(frequency, real, imag)
+        super().__init__(frequency, real, imag, copy)
 
 
 
 class WakefieldTable(_InputTable):
     
-    def __init__(self, time, wake):
+    def __init__(self, time, wake, copy = True):
         
         if len(time) != len(wake):
             raise exceptions.InputDataError("time and wake should"\
                                             " have the same length")
         
-        super().__init__(time, wake)
+        super().__init__(time, wake, copy=copy)
 
 
 
@@ -425,15 +481,23 @@ class Resonators(_ImpedanceObject):
         self.time_array = np.array(time_array)
         self.wake = np.zeros(self.time_array.shape)
 
-        for i in range(0, self.n_resonators):
+        alpha = self.omega_R / (2 * self.Q)
+        omega_bar = np.sqrt(self.omega_R ** 2 - alpha ** 2)
 
-            alpha = self.omega_R[i] / (2 * self.Q[i])
-            omega_bar = np.sqrt(self.omega_R[i] ** 2 - alpha ** 2)
+        # The wake is zero for t < 0
+        positive = np.flatnonzero(self.time_array >= 0)
+        time = self.time_array[positive]
+        wake = np.zeros(len(time))
 
-            self.wake += ((np.sign(self.time_array) + 1) * self.R_S[i] *
-                          alpha * np.exp(-alpha * self.time_array) *
-                          (np.cos(omega_bar * self.time_array) - alpha /
-                           omega_bar * np.sin(omega_bar * self.time_array)))
+        for modes, points in _mode_blocks(self.n_resonators, len(time)):
+            phase = np.multiply.outer(omega_bar[modes], time[points])
+            block = np.sin(phase)
+            block *= -(alpha[modes] / omega_bar[modes])[:, np.newaxis]
+            block += np.cos(phase, out=phase)
+            block *= np.exp(np.multiply.outer(-alpha[modes], time[points]))
+            wake[points] += (self.R_S[modes] * alpha[modes]) @ block
+
+        self.wake[positive] = (np.sign(time) + 1) * wake
 
     def _imped_calc_python(self, frequency_array):
         r"""
@@ -459,12 +523,20 @@ class Resonators(_ImpedanceObject):
         if self.frequency_array[0] == 0:
             init=1
 
-        for i in range(0, self.n_resonators):
-
-            self.impedance[init:] += self.R_S[i] / (
-                1 + 1j * self.Q[i] * (
-                    self.frequency_array[init:] / self.frequency_R[i] -
-                    self.frequency_R[i] / self.frequency_array[init:]))
+        # Z = R (1 - j y) / (1 + y^2), with y = Q (f/f_r - f_r/f)
+        frequency = self.frequency_array[init:]
+        impedance = self.impedance[init:]
+
+        for modes, points in _mode_blocks(self.n_resonators, len(frequency)):
+            y = np.multiply.outer(1 / self.frequency_R[modes],
+                                  frequency[points])
+            y -= 1 / y
+            y *= self.Q[modes][:, np.newaxis]
+            denominator = y*y
+            denominator += 1
+            y /= denominator
+            impedance.real[points] += self.R_S[modes] @ (1 / denominator)
+            impedance.imag[points] -= self.R_S[modes] @ y
 
 #     def _imped_calc_cpp(self, frequency_array):
 #         r"""
@@ -518,16 +590,26 @@ class VariableResonators(Resonators):
 
 
     def update(self, f_rev):
+        '''
+        Interpolating the parameters of the resonators at f_rev, returns
+        False if none of the parameters changed
+        '''
 
-        for n in range(self.n_resonators):
+        frequency_R = np.array([np.interp(f_rev, freqR[0], freqR[1])
+                                for freqR in self.freqRList])
+        R_S = np.array([np.interp(f_rev, RS[0], RS[1])
+                        for RS in self.RSList])
+        Q = np.array([np.interp(f_rev, Q[0], Q[1]) for Q in self.QList])
 
-            self.frequency_R[n] = np.interp(f_rev, self.freqRList[n][0], 
-                                                   self.freqRList[n][1])
+        changed = np.any(frequency_R != self.frequency_R) \
+            or np.any(R_S != self.R_S) or np.any(Q != self.Q)
 
-            self.R_S[n] = np.interp(f_rev, self.RSList[n][0], 
-                                           self.RSList[n][1])
+        # Setting the frequency through the property also updates omega_R
+        self.frequency_R = frequency_R
+        self.R_S = R_S
+        self.Q = Q
 
-            self.Q[n] = np.interp(f_rev, self.QList[n][0], self.QList[n][1])
+        return bool(changed)
 
 
 
@@ -625,14 +707,22 @@ class TravelingWaveCavity(_ImpedanceObject):
         self.time_array = np.array(time_array)
         self.wake = np.zeros(self.time_array.shape)
 
-        for i in range(0, self.n_twc):
-            a_tilde = self.a_factor[i] / (2 * np.pi)
-            indexes = np.where(self.time_array <= a_tilde)
-            self.wake[indexes] += ((np.sign(self.time_array[indexes]) + 1) * 2
-                                   * self.R_S[i] / a_tilde *
-                                   (1 - self.time_array[indexes] / a_tilde) *
-                                   np.cos(2 * np.pi * self.frequency_R[i] *
-                                          self.time_array[indexes]))
+        a_tilde = self.a_factor / (2 * np.pi)
+
+        # The wake is zero for t < 0 and t > a_tilde
+        inside = np.flatnonzero((self.time_array >= 0)
+                                & (self.time_array <= np.max(a_tilde)))
+        time = self.time_array[inside]
+        wake = np.zeros(len(time))
+
+        for modes, points in _mode_blocks(self.n_twc, len(time)):
+            block = 1 - np.multiply.outer(1 / a_tilde[modes], time[points])
+            np.maximum(block, 0, out=block)
+            block *= np.cos(2 * np.pi * np.multiply.outer(
+                self.frequency_R[modes], time[points]))
+            wake[points] += (2 * self.R_S[modes] / a_tilde[modes]) @ block
+
+        self.wake[inside] = (np.sign(time) + 1) * wake
 
     def imped_calc(self, frequency_array):
         r"""
@@ -654,41 +744,23 @@ class TravelingWaveCavity(_ImpedanceObject):
         self.frequency_array = np.array(frequency_array)
         self.impedance = np.zeros(len(self.frequency_array), complex)
 
-        for i in range(0, self.n_twc):
-
-            Zplus = self.R_S[i] * (
-                (np.sin(
-                    self.a_factor[i] / 2 *
-                    (self.frequency_array - self.frequency_R[i])) /
-                    (self.a_factor[i] / 2 * (
-                        self.frequency_array -
-                        self.frequency_R[i])))**2 - 2j*(
-                            self.a_factor[i] *
-                            (self.frequency_array - self.frequency_R[i]) -
-                            np.sin(self.a_factor[i] * (
-                                self.frequency_array -
-                                self.frequency_R[i]))) / (
-                                    self.a_factor[i] *
-                                    (self.frequency_array -
-                                     self.frequency_R[i]))**2)
-
-            Zminus = self.R_S[i] * (
-                (np.sin(
-                    self.a_factor[i] / 2 *
-                    (self.frequency_array + self.frequency_R[i])) /
-                    (self.a_factor[i] / 2 * (
-                        self.frequency_array +
-                        self.frequency_R[i])))**2 - 2j*(
-                            self.a_factor[i] *
-                            (self.frequency_array + self.frequency_R[i]) -
-                            np.sin(self.a_factor[i] * (
-                                self.frequency_array +
-                                self.frequency_R[i]))) / (
-                                    self.a_factor[i] * (
-                                        self.frequency_array +
-                                        self.frequency_R[i]))**2)
-
-            self.impedance += Zplus + Zminus
+        # Z_+ and Z_- with u = a (f -+ f_r), the real part is
+        # (sin(u/2) / (u/2))^2 and the imaginary part -2 (u - sin(u)) / u^2
+        for modes, points in _mode_blocks(self.n_twc,
+                                          len(self.frequency_array)):
+            a_factor = self.a_factor[modes][:, np.newaxis]
+            for sign in [-1, 1]:
+                u = np.add.outer(sign * self.frequency_R[modes],
+                                 self.frequency_array[points])
+                u *= a_factor
+                inverse_square = 1 / (u*u)
+                real = np.sin(u / 2)
+                real *= real
+                real *= 4 * inverse_square
+                u -= np.sin(u)
+                u *= inverse_square
+                self.impedance.real[points] += self.R_S[modes] @ real
+                self.impedance.imag[points] -= 2 * self.R_S[modes] @ u
 
 
 class ResistiveWall(_ImpedanceObject):
@@ -0,0 +1,301 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to reduce impedance and wake tables to a compact sum of
+resonators**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import warnings
+import numpy as np
+from scipy.optimize import least_squares
+
+# BLonD_Common imports
+from . import impedance_sources as impSource
+from ...devtools import exceptions as excpt
+
+
+def fit_resonators(table, tolerance=1e-2, max_resonators=20,
+                   max_points=2000):
+    r"""
+    Function to fit an ImpedanceTable or a WakefieldTable with a sum of
+    resonators, which can then be evaluated analytically (or recursively
+    for the wakes) instead of interpolating the table.
+
+    The resonators are added one at a time, at the maximum of the real
+    part of the residual impedance with a quality factor from its half
+    width. After each addition, the parameters of all the resonators are
+    refined together by non-linear least squares (shunt impedances,
+    frequencies and quality factors above 0.5). The fit stops when the
+    relative error is below the tolerance, when the real part of the
+    residual is not positive anymore, or after max_resonators.
+
+    For a wake table, the resonators are placed on the spectrum of the
+    residual wake, interpolated on a regular grid up to the last time of
+    the table, and the least squares are done on the wake.
+
+    The relative error is the rms error normalised by the rms of the table,
+    :math:`\left\|Z_{fit}-Z\right\| / \left\|Z\right\|` or
+    :math:`\left\|W_{fit}-W\right\| / \left\|W\right\|`, over all the
+    points of the table.
+
+    Parameters
+    ----------
+    table : ImpedanceTable or WakefieldTable
+        The table to fit
+    tolerance : float
+        Optional: The relative error at which the fit stops. Default is 1e-2
+    max_resonators : int
+        Optional: The maximum number of resonators. Default is 20
+    max_points : int
+        Optional: The maximum number of points in the least squares. For an
+        impedance table, the points are regularly spaced and the points
+        around the resonant frequencies are added. For a wake table, half
+        of the points are the first samples and half of them are regularly
+        spaced. The error is computed on all the points. Default is 2000
+
+    Returns
+    -------
+    resonators : Resonators
+        The resonators, a warning is issued if the tolerance is not reached
+
+    Examples
+    --------
+    >>> table = ImpedanceTable(*np.loadtxt('impedance.txt', unpack=True))
+    >>> resonators = fit_resonators(table, tolerance=1e-3)
+    >>> resonators.R_S, resonators.frequency_R, resonators.Q
+    """
+
+    if isinstance(table, impSource.WakefieldTable):
+        time = table.time_array_loaded
+        wake = table.wake_array_loaded
+        frequency, impedance = _wake_spectrum(time, wake)
+        # The first samples resolve the high frequencies, the regularly
+        # spaced ones the long range wake
+        fit_indices = np.union1d(
+            np.arange(min(max_points // 2, len(time))),
+            _regular_indices(len(time), max_points // 2))
+
+        def refine(parameters, fit_frequency):
+            return _refine_wake(time[fit_indices], wake[fit_indices],
+                                parameters)
+
+        def residual_spectrum(resonators):
+            resonators.wake_calc(time)
+            return _wake_spectrum(time, wake - resonators.wake)[1]
+
+        def error(resonators):
+            resonators.wake_calc(time)
+            return _relative_error(resonators.wake, wake)
+
+    elif isinstance(table, impSource.ImpedanceTable):
+        frequency = table.frequency_array_loaded
+        impedance = table.Re_Z_array_loaded + 1j * table.Im_Z_array_loaded
+
+        def refine(parameters, fit_frequency):
+            return _refine_impedance(frequency[fit_frequency],
+                                     impedance[fit_frequency], parameters)
+
+        def residual_spectrum(resonators):
+            resonators.imped_calc(frequency)
+            return impedance - resonators.impedance
+
+        def error(resonators):
+            resonators.imped_calc(frequency)
+            return _relative_error(resonators.impedance, impedance)
+
+    else:
+        raise excpt.InputDataError("table should be an ImpedanceTable or " +
+                                   "a WakefieldTable")
+
+    if not np.all(np.isfinite(impedance)):
+        raise excpt.InputDataError("The table should only contain finite " +
+                                   "values")
+
+    # The resonators are zero at f = 0
+    positive = np.flatnonzero(frequency > 0)
+
+    if len(positive) < 3:
+        raise excpt.InputDataError("The table should have at least three " +
+                                   "points at positive frequencies")
+
+    fit_frequency = positive[_regular_indices(len(positive), max_points)]
+
+    parameters = np.zeros((0, 3))
+    residual = impedance[positive]
+    resonators = None
+    relative_error = np.inf
+
+    while len(parameters) < max_resonators:
+
+        peak = np.argmax(residual.real)
+        if residual.real[peak] <= 0:
+            break
+
+        # Half width of the peak of the real part
+        peak_frequency = frequency[positive[peak]]
+        half = residual.real < residual.real[peak] / 2
+        lower = np.flatnonzero(half[:peak])
+        upper = np.flatnonzero(half[peak:])
+        lower = frequency[positive[lower[-1]]] if len(lower) > 0 \
+            else frequency[positive[0]]
+        upper = frequency[positive[peak + upper[0]]] if len(upper) > 0 \
+            else frequency[positive[-1]]
+        quality_factor = max(peak_frequency / (upper - lower), 0.6)
+
+        # Points around the new resonance
+        near = positive[np.abs(frequency[positive] - peak_frequency)
+                        < 3 * (upper - lower)]
+        fit_frequency = np.union1d(
+            fit_frequency, near[_regular_indices(len(near), 200)])
+
+        new_parameters = refine(np.vstack(
+            (parameters, [residual.real[peak], peak_frequency,
+                          quality_factor])), fit_frequency)
+
+        new_resonators = impSource.Resonators(*new_parameters.T)
+        new_error = error(new_resonators)
+
+        if new_error >= relative_error:
+            break
+
+        parameters = new_parameters
+        resonators = new_resonators
+        relative_error = new_error
+
+        if relative_error <= tolerance:
+            break
+
+        residual = residual_spectrum(new_resonators)[positive]
+
+    if resonators is None:
+        raise excpt.InputDataError("No resonator could be fitted to the " +
+                                   "table")
+
+    if relative_error > tolerance:
+        warnings.warn("The tolerance is not reached, the relative error " +
+                      "is %.3e with %d resonators" % (relative_error,
+                                                      len(parameters)))
+
+    return resonators
+
+
+def _regular_indices(n_points, max_points):
+
+    return np.unique(np.linspace(0, n_points-1, min(max_points, n_points),
+                                 dtype=int))
+
+
+def _relative_error(fitted, reference):
+
+    return np.linalg.norm(fitted - reference) / np.linalg.norm(reference)
+
+
+def _wake_spectrum(time, wake):
+    '''
+    Spectrum of a wake, interpolated on a regular grid from t = 0
+    '''
+
+    n_points = max(len(time), 2)
+    time_step = time[-1] / (n_points - 1)
+
+    wake = np.interp(np.arange(n_points) * time_step, time, wake, right=0)
+
+    n_fft = 2 * n_points
+    return (np.fft.rfftfreq(n_fft, time_step),
+            np.fft.rfft(wake, n_fft) * time_step)
+
+
+def _resonator_terms(frequency, parameters):
+    '''
+    The impedance of each resonator, with one column per resonator
+    '''
+
+    R_S, frequency_R, Q = parameters.T
+    ratio = frequency[:, np.newaxis] / frequency_R
+
+    return 1 / (1 + 1j * Q * (ratio - 1 / ratio)), ratio
+
+
+def _unpack(variables):
+    '''
+    The shunt impedances, frequencies and quality factors from the least
+    squares variables, their logarithms and the logarithm of Q-0.5
+    '''
+
+    variables = variables.reshape(-1, 3)
+    return np.stack([np.exp(variables[:, 0]), np.exp(variables[:, 1]),
+                     0.5 + np.exp(variables[:, 2])], axis=1)
+
+
+def _pack(parameters):
+
+    return np.log(np.stack([parameters[:, 0], parameters[:, 1],
+                            parameters[:, 2] - 0.5], axis=1)).ravel()
+
+
+def _refine_impedance(frequency, impedance, parameters):
+    '''
+    Least squares fit of all the resonators on the impedance
+    '''
+
+    scale = np.linalg.norm(impedance)
+
+    def residual(variables):
+        parameters = _unpack(variables)
+        terms = _resonator_terms(frequency, parameters)[0]
+        difference = (terms @ parameters[:, 0] - impedance) / scale
+        return np.concatenate((difference.real, difference.imag))
+
+    def jacobian(variables):
+        parameters = _unpack(variables)
+        R_S, frequency_R, Q = parameters.T
+        terms, ratio = _resonator_terms(frequency, parameters)
+
+        # dZ/dy = -j R h**2, with y = Q (f/f_R - f_R/f)
+        derivative = -1j * R_S * terms**2
+        columns = np.stack([R_S * terms,
+                            -derivative * Q * (ratio + 1 / ratio),
+                            derivative * (ratio - 1 / ratio) * (Q - 0.5)],
+                           axis=2).reshape(len(frequency), -1) / scale
+        return np.concatenate((columns.real, columns.imag))
+
+    result = least_squares(residual, _pack(parameters), jac=jacobian,
+                           method='lm')
+
+    return _unpack(result.x)
+
+
+def _refine_wake(time, wake, parameters):
+    '''
+    Least squares fit of all the resonators on the wake, the sampled wake
+    being different from the transform of the impedance at high frequency
+    '''
+
+    scale = np.linalg.norm(wake)
+    time = time[:, np.newaxis]
+
+    def residual(variables):
+        R_S, frequency_R, Q = _unpack(variables).T
+        alpha = np.pi * frequency_R / Q
+        omega_bar = np.sqrt((2 * np.pi * frequency_R)**2 - alpha**2)
+
+        terms = 2 * alpha * np.exp(-alpha * time) \
+            * (np.cos(omega_bar * time)
+               - alpha / omega_bar * np.sin(omega_bar * time))
+        terms *= (np.sign(time) + 1) / 2
+
+        return (terms @ R_S - wake) / scale
+
+    result = least_squares(residual, _pack(parameters), method='lm')
+
+    return _unpack(result.x)
@@ -0,0 +1,254 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Loading of impedance and wake tables from text files through a
+memory-mapped binary cache**
+
+The text file is parsed once, its columns are saved in a .npy file which is
+then memory-mapped by the next calls. A .json file per text file and
+parsing options keeps the size, modification time and sha256 hash of the
+text file: the text file is hashed again only if its size or modification
+time changed, and parsed again only if its hash changed.
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# BLonD_Common imports
+from . import impedance_sources as impSource
+from ...utilities.cache import ProgramCache, cache_version
+from ...devtools import path
+from ...devtools import exceptions as excpt
+
+
+def load_impedance_table(file_name, cache_dir=None, skiprows=0,
+                         delimiter=None, usecols=(0, 1, 2)):
+    r"""
+    Function to load an ImpedanceTable from a text file with the frequency
+    in Hz, the real and imaginary parts of the impedance in :math:`\Omega`
+    in columns, through the binary cache.
+
+    The point (f, Z(f)) = (0, 0) is added in the cache if needed, the
+    loaded arrays of the table are read-only views of the memory-mapped
+    file and nothing is computed on the table grid before imped_calc is
+    called (see copy=False in ImpedanceTable).
+
+    Parameters
+    ----------
+    file_name : str
+        The path of the text file
+    cache_dir : str
+        Optional: The directory of the cache, created if needed. Default is
+        None, the directory of the text file
+    skiprows : int
+        Optional: The number of header lines. Default is 0
+    delimiter : str
+        Optional: The delimiter between the columns. Default is None,
+        whitespaces
+    usecols : tuple
+        Optional: The columns of the frequency, real and imaginary parts.
+        Default is (0, 1, 2)
+
+    Returns
+    -------
+    table : ImpedanceTable
+        The impedance table
+
+    Examples
+    --------
+    >>> table = load_impedance_table('impedance.txt', skiprows=1)
+    >>> table.imped_calc(frequency_array)
+    """
+
+    if len(usecols) != 3:
+        raise excpt.InputDataError("usecols should give the frequency, " +
+                                   "real and imaginary columns")
+
+    frequency, real, imag = cached_columns(
+        file_name, cache_dir, skiprows, delimiter, usecols, zero_point=True)
+
+    return impSource.ImpedanceTable(frequency, real, imag, copy=False)
+
+
+def load_wake_table(file_name, cache_dir=None, skiprows=0, delimiter=None,
+                    usecols=(0, 1)):
+    r"""
+    Function to load a WakefieldTable from a text file with the time in s
+    and the wake in :math:`\Omega / s` in columns, through the binary
+    cache. The loaded arrays of the table are read-only views of the
+    memory-mapped file and nothing is computed on the table grid before
+    wake_calc is called (see copy=False in WakefieldTable).
+
+    Parameters
+    ----------
+    file_name : str
+        The path of the text file
+    cache_dir : str
+        Optional: The directory of the cache, created if needed. Default is
+        None, the directory of the text file
+    skiprows : int
+        Optional: The number of header lines. Default is 0
+    delimiter : str
+        Optional: The delimiter between the columns. Default is None,
+        whitespaces
+    usecols : tuple
+        Optional: The columns of the time and wake. Default is (0, 1)
+
+    Returns
+    -------
+    table : WakefieldTable
+        The wake table
+
+    Examples
+    --------
+    >>> table = load_wake_table('wake.txt', cache_dir='/tmp/blond_cache')
+    >>> table.wake_calc(time_array)
+    """
+
+    if len(usecols) != 2:
+        raise excpt.InputDataError("usecols should give the time and wake " +
+                                   "columns")
+
+    time, wake = cached_columns(file_name, cache_dir, skiprows, delimiter,
+                                usecols)
+
+    return impSource.WakefieldTable(time, wake, copy=False)
+
+
+def cached_columns(file_name, cache_dir=None, skiprows=0, delimiter=None,
+                   usecols=None, zero_point=False):
+    r"""
+    Function returning the columns of a text file, parsed with np.loadtxt
+    the first time and memory-mapped from the cache afterwards.
+
+    Parameters
+    ----------
+    file_name : str
+        The path of the text file
+    cache_dir : str
+        Optional: The directory of the cache, created if needed. Default is
+        None, the directory of the text file
+    skiprows : int
+        Optional: The number of header lines. Default is 0
+    delimiter : str
+        Optional: The delimiter between the columns. Default is None,
+        whitespaces
+    usecols : tuple
+        Optional: The columns to load. Default is None, all the columns
+    zero_point : bool
+        Optional: Adding a point with all the columns at 0 at the start if
+        the first column does not start at 0. Default is False
+
+    Returns
+    -------
+    columns : np.memmap
+        The read-only 2D array with one column of the file per row
+    """
+
+    file_name = os.path.abspath(str(file_name))
+    if cache_dir is None:
+        cache_dir = os.path.dirname(file_name)
+    cache_dir = str(cache_dir)
+    path.makedir(cache_dir)
+
+    options = (int(skiprows), delimiter,
+               None if usecols is None else tuple(usecols), bool(zero_point))
+
+    metadata_file = os.path.join(
+        cache_dir, ProgramCache.key(file_name, options) + '.json')
+
+    stat = os.stat(file_name)
+    metadata = _read_metadata(metadata_file)
+
+    if metadata is not None and metadata['size'] == stat.st_size \
+            and metadata['mtime'] == stat.st_mtime_ns:
+        columns = _open_columns(metadata, cache_dir)
+        if columns is not None:
+            return columns
+
+    digest = _file_digest(file_name)
+    data_file = ProgramCache.key(digest, options) + '.npy'
+
+    metadata = {'cache_version': cache_version, 'source': file_name,
+                'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                'sha256': digest, 'data_file': data_file}
+
+    if not os.path.exists(os.path.join(cache_dir, data_file)):
+
+        columns = np.loadtxt(file_name, skiprows=int(skiprows),
+                             delimiter=delimiter, usecols=usecols, ndmin=2).T
+
+        if zero_point and columns[0, 0] != 0:
+            columns = np.hstack((np.zeros((len(columns), 1)), columns))
+
+        _atomic_write(cache_dir, data_file,
+                      lambda output: np.save(output,
+                                             np.ascontiguousarray(columns)))
+
+    _atomic_write(cache_dir, os.path.basename(metadata_file),
+                  lambda output: output.write(json.dumps(metadata).encode()))
+
+    return np.load(os.path.join(cache_dir, data_file), mmap_mode='r')
+
+
+def _read_metadata(metadata_file):
+
+    try:
+        with open(metadata_file) as metadata:
+            metadata = json.load(metadata)
+    except (OSError, ValueError):
+        return None
+
+    if metadata.get('cache_version') != cache_version:
+        return None
+
+    return metadata
+
+
+def _open_columns(metadata, cache_dir):
+
+    try:
+        return np.load(os.path.join(cache_dir, metadata['data_file']),
+                       mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _file_digest(file_name, chunk_size=2**20):
+
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _atomic_write(cache_dir, file_name, write):
+    '''
+    Writing to a temporary file first so that concurrent processes never
+    read a partially written file
+    '''
+
+    handle, temp_name = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            write(output)
+        os.replace(temp_name, os.path.join(cache_dir, file_name))
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
@@ -0,0 +1,271 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to compute the induced voltage of a periodic beam from the
+impedances at the revolution frequency harmonics**
+
+The spectrum of a beam repeated every revolution period is only defined at
+the harmonics :math:`n f_{rev}`. With the profile :math:`\\lambda_k`
+sampled with a time step :math:`\\Delta t` during one turn, the induced
+voltage is
+
+.. math::
+    V(t) = -\\Delta t f_{rev} \\left[X_0 Z_0 + 2 \\mathrm{Re}
+    \\sum_{n=1}^{n_{max}} X_n Z(n f_{rev}) e^{2 \\pi j n f_{rev} t}\\right],
+    \\quad X_n = \\sum_k \\lambda_k e^{-2 \\pi j n f_{rev} t_k}
+
+which is the result of calc_induced_freq for a profile covering exactly one
+turn, with the impedance only evaluated up to :math:`n_{max} f_{rev}`.
+
+The harmonics being equally spaced, the sums on the regular time grid of
+the profile are chirp-z transforms, computed with FFTs of
+:math:`N + n_{max}` points (Bluestein algorithm).
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import numpy as np
+import scipy.fft as sfft
+
+# BLonD_Common imports
+from ...devtools import exceptions as excpt
+
+
+# Maximum number of complex exponentials evaluated at once in the direct
+# transform to arbitrary time points
+block_size = 2**18
+
+
+class HarmonicInducedVoltage:
+    r"""
+    Class computing the induced voltage of a periodic beam with the
+    impedances evaluated only at the revolution frequency harmonics up to
+    max_frequency. The induced voltage is computed on the time grid of the
+    profile or, with a direct transform, at any time points.
+
+    The revolution frequency is set by the update method, directly or from
+    the Ring program, and the impedances are evaluated again only when it
+    changes.
+
+    Parameters
+    ----------
+    impedance_list : list
+        The impedance sources, with an imped_calc method
+    max_frequency : float
+        The frequency in Hz of the last harmonic
+    var_impedance_list : list
+        Optional: The variable impedance sources, with an update method
+        taking the revolution frequency
+    ring : Ring
+        Optional: The Ring object from which the revolution frequency is
+        taken by the update method
+
+    Attributes
+    ----------
+    f_rev : float
+        The revolution frequency in Hz of the last update
+    frequency_array : np.array
+        The harmonics of the revolution frequency in Hz, from 0
+    total_impedance : complex np.array
+        The sum of the impedances at the frequency_array
+
+    Examples
+    --------
+    >>> harmonic = HarmonicInducedVoltage([resonators], 2e9, ring=ring)
+    >>> for sample, profile in enumerate(profiles):
+    >>>     harmonic.update(sample=sample)
+    >>>     induced = harmonic.induced_voltage(time_array, profile)
+    """
+
+    def __init__(self, impedance_list, max_frequency, var_impedance_list=[],
+                 ring=None):
+
+        self.impedance_list = impedance_list
+        self.var_impedance_list = var_impedance_list
+        self.max_frequency = float(max_frequency)
+        self.ring = ring
+
+        if self.max_frequency <= 0:
+            raise excpt.InputDataError("max_frequency should be positive")
+
+        self.f_rev = None
+        self.frequency_array = None
+        self.total_impedance = None
+
+    def update(self, f_rev=None, sample=None, cycle_time=None):
+        r"""
+        Setting the revolution frequency, given directly or taken from the
+        Ring program at a sample or at a cycle time, and evaluating the
+        impedances at its harmonics if it changed.
+
+        Parameters
+        ----------
+        f_rev : float
+            Optional: The revolution frequency in Hz
+        sample : int
+            Optional: The sample of the Ring program (the turn if all turns
+            are stored)
+        cycle_time : float
+            Optional: The time in s in the cycle, the revolution frequency
+            of the Ring program is interpolated
+        """
+
+        if f_rev is None:
+            if self.ring is None:
+                raise excpt.MissingParameterError(
+                    "f_rev is required without a Ring object")
+            if sample is not None:
+                f_rev = self.ring.f_rev[sample]
+            elif cycle_time is not None:
+                f_rev = self.ring.parameters_at_time(cycle_time)['f_rev']
+            else:
+                raise excpt.MissingParameterError(
+                    "One of f_rev, sample or cycle_time is required")
+
+        f_rev = float(f_rev)
+
+        if f_rev <= 0:
+            raise excpt.InputDataError("f_rev should be positive")
+
+        if f_rev == self.f_rev:
+            return
+
+        self.f_rev = f_rev
+        self.frequency_array = np.arange(
+            int(self.max_frequency / f_rev) + 1) * f_rev
+
+        self.total_impedance = np.zeros(len(self.frequency_array), complex)
+        for imp in self.impedance_list:
+            imp.imped_calc(self.frequency_array)
+            self.total_impedance += imp.impedance
+        for imp in self.var_impedance_list:
+            imp.update(f_rev)
+            imp.imped_calc(self.frequency_array)
+            self.total_impedance += imp.impedance
+
+    @property
+    def n_harmonics(self):
+        return len(self.frequency_array)
+
+    def spectrum(self, time_array, profile):
+        r"""
+        The harmonics :math:`X_n` of the profile, with the time from the
+        first point of the time_array.
+
+        Parameters
+        ----------
+        time_array : np.array
+            The time in s of the profile points, with a constant time step
+        profile : np.array
+            The profile, or profiles with one per row
+
+        Returns
+        -------
+        spectrum : complex np.array
+            The harmonics, along the last axis
+        """
+
+        if self.f_rev is None:
+            raise excpt.MissingParameterError(
+                "update should be called before computing the spectrum")
+
+        time_array = np.asarray(time_array, dtype=float)
+        profile = np.asarray(profile, dtype=float)
+
+        if profile.shape[-1] != len(time_array):
+            raise excpt.InputDataError("The profile and time_array should " +
+                                       "have the same length")
+
+        if time_array[-1] - time_array[0] >= 1 / self.f_rev:
+            raise excpt.InputDataError("The profile should be shorter than " +
+                                       "one revolution period")
+
+        return _chirp_z(profile, self.f_rev * (time_array[1]
+                                               - time_array[0]),
+                        self.n_harmonics)
+
+    def induced_voltage(self, time_array, profile, output_time=None):
+        r"""
+        Induced voltage of the beam with the profile repeated every turn.
+
+        Parameters
+        ----------
+        time_array : np.array
+            The time in s of the profile points, with a constant time step
+        profile : np.array
+            The profile over one turn, or profiles with one per row
+        output_time : np.array
+            Optional: The time in s at which the induced voltage is
+            computed. Default is None, the time_array
+
+        Returns
+        -------
+        induced_voltage : np.array
+            The induced voltage at the output_time, along the last axis
+        """
+
+        time_array = np.asarray(time_array, dtype=float)
+        time_step = time_array[1] - time_array[0]
+
+        weighted = self.spectrum(time_array, profile) * self.total_impedance
+        weighted[..., 1:] *= 2
+        weighted *= -time_step * self.f_rev
+
+        if output_time is None:
+            # Re(sum(Y e^{j x})) = Re(sum(Y* e^{-j x}))
+            return _chirp_z(np.conj(weighted), self.f_rev * time_step,
+                            len(time_array)).real
+
+        output_time = np.asarray(output_time, dtype=float) - time_array[0]
+        induced_voltage = np.zeros(weighted.shape[:-1] + (len(output_time),))
+
+        for harmonics in self._harmonic_blocks(len(output_time)):
+            induced_voltage += (weighted[..., harmonics] @ np.exp(
+                2j * np.pi * self.frequency_array[harmonics, np.newaxis]
+                * output_time)).real
+
+        return induced_voltage
+
+    def _harmonic_blocks(self, n_points):
+        '''
+        The slices of harmonics transformed at once, for block_size complex
+        exponentials
+        '''
+
+        step = max(1, block_size // max(n_points, 1))
+
+        return [slice(start, start + step)
+                for start in range(0, self.n_harmonics, step)]
+
+
+def _chirp_z(signal, phase, n_output):
+    r"""
+    The sums :math:`\sum_k x_k e^{-2 \pi j \phi k m}` for
+    :math:`m < n_{output}`, along the last axis of the signal, with the
+    Bluestein algorithm
+    """
+
+    n_input = signal.shape[-1]
+    n_fft = sfft.next_fast_len(n_input + n_output - 1)
+
+    # The chirp w^(m^2/2), with the phase modulo 2 pi before the exponential
+    samples = np.arange(max(n_input, n_output), dtype=float)
+    chirp = np.exp(-1j * np.pi * ((phase * samples**2) % 2))
+
+    kernel = np.zeros(n_fft, complex)
+    kernel[:n_output] = np.conj(chirp[:n_output])
+    if n_input > 1:
+        kernel[-(n_input - 1):] = np.conj(chirp[n_input-1:0:-1])
+
+    result = sfft.ifft(sfft.fft(signal * chirp[:n_input], n_fft)
+                       * sfft.fft(kernel), n_fft)
+
+    return result[..., :n_output] * chirp[:n_output]
@@ -23,19 +23,38 @@ import scipy.constants as cont
 if __name__ != '__main__':
     from ..impedances import impedance_sources as impSource
     from ..beam import profile as prof
+    from . import resonator_recursion as recursion
+    from . import harmonic_domain as harmonic
+    from ...maths import convolution as conv
     from ...devtools import exceptions as exceptions
 else:
     import blond_common.interfaces.impedances.impedance_sources as impSource
     import blond_common.interfaces.beam.analytic_distribution as analDist
     import blond_common.interfaces.beam.profile as prof
+    import blond_common.interfaces.induced_voltage.resonator_recursion \
+        as recursion
+    import blond_common.interfaces.induced_voltage.harmonic_domain \
+        as harmonic
+    import blond_common.maths.convolution as conv
     import blond_common.devtools.exceptions as exceptions
 
 
+# Maximum size in bytes of the spectra of the profiles computed at once by
+# calc_induced_batch
+batch_nbytes = 2**26
+
+# Number of points of the smooth taper applied to the multi-turn memory
+# before each time shift, memory_taper points before the kept part
+memory_taper = 64
+
+
 class InducedVoltage:
     
     def __init__(self, impedance_list = [], wake_list = [], 
                  inductive_list = [], var_impedance_list = [],
-                 var_wake_list = [], var_inductive_list = []):
+                 var_wake_list = [], var_inductive_list = [],
+                 resonator_recursion = False, multi_turn_memory = None,
+                 harmonic_cutoff = None):
         
         self.impedances_loaded = impedance_list
         self.wakes_loaded = wake_list
@@ -44,50 +63,117 @@ class InducedVoltage:
         self.var_impedances_loaded = var_impedance_list
         self.var_wakes_loaded = var_wake_list
         self.var_inductive_loaded = var_inductive_list
+
+        # If True, the wakes of the Resonators are computed recursively
+        self.resonator_recursion = resonator_recursion
+
+        # Time in s over which the wakes of the previous turns are kept,
+        # None for a single turn. The impedances and wakes are kept in a
+        # buffer sampled with the profile time step over this time, the
+        # cost per turn is proportional to multi_turn_memory/time_step.
+        # Only the Resonators with resonator_recursion do not depend on it
+        self.multi_turn_memory = multi_turn_memory
+
+        # Frequency in Hz up to which the impedances are evaluated at the
+        # harmonics of f_rev, None for the interp_frequency_array
+        self.harmonic_cutoff = harmonic_cutoff
+
+        if harmonic_cutoff is not None and multi_turn_memory is not None:
+            raise exceptions.InputDataError(
+                "The harmonic domain already includes the previous turns, " +
+                "multi_turn_memory should be None")
         
         self.interp_frequency_array = None
         self.interp_time_array = None
 
+        # Impedances evaluated on the interp_frequency_array, by source
+        self._impedance_cache = {}
+        self._static_impedance_cache = None
+
+        self._recursion_key = None
+        self._harmonic_key = None
+        self._memory_key = None
+        self._memory_wake_key = None
+        self._turn_start = None
+
 
     def sum_impedance_sources(self, f_rev = None, sample = None):
         
         self._induced_calcs = []
         
         impedances = [i for i in self.impedances_loaded]
+        impedances += [i for i in self.var_impedances_loaded]
+        wakes = [w for w in self.wakes_loaded]
 
-        for i in self.var_impedances_loaded:
-            i.update(f_rev)
+        if self.resonator_recursion:
+            resonators = [w for w in wakes
+                          if isinstance(w, impSource.Resonators)]
+            wakes = [w for w in wakes if w not in resonators]
+        else:
+            resonators = []
 
-        impedances += [i for i in self.var_impedances_loaded]
+        if self.harmonic_cutoff is not None and len(impedances) > 0:
+            if f_rev is None:
+                raise exceptions.MissingParameterError(
+                    "f_rev is required by sum_impedance_sources with " +
+                    "harmonic_cutoff")
+
+            # The impedances are evaluated again only if f_rev changed
+            key = (tuple(id(imp) for imp in impedances), self.harmonic_cutoff)
+            if key != self._harmonic_key:
+                self._harmonic = harmonic.HarmonicInducedVoltage(
+                    self.impedances_loaded, self.harmonic_cutoff,
+                    self.var_impedances_loaded)
+                self._harmonic_key = key
+            self._harmonic.update(f_rev)
+            self._induced_calcs.append(self._calc_induced_harmonic)
+            impedances = []
+
+        if self.multi_turn_memory is not None:
+            if len(impedances) > 0 or len(wakes) > 0:
+                self._sum_memory_sources(impedances, wakes, f_rev)
+                self._induced_calcs.append(self._calc_induced_memory)
+            impedances = wakes = []
         
         if len(impedances) > 0:
-            try:
-                self.total_impedance = np.zeros(len(self.interp_frequency_array), \
-                                                dtype='complex')
-            except TypeError as e:
-                if str(e) == "object of type 'NoneType' has no len()":
-                    raise exceptions.MissingParameterError(
-                        "interp_frequency_array has not been correctly defined")
-                else:
-                    raise
-
-            for imp in impedances:
-                imp.imped_calc(self.interp_frequency_array)
-                self.total_impedance += imp.impedance
+            if self.interp_frequency_array is None:
+                raise exceptions.MissingParameterError(
+                    "interp_frequency_array has not been correctly defined")
+
+            self.total_impedance = self._static_impedance().copy()
+
+            for imp in self.var_impedances_loaded:
+                self.total_impedance += self._source_impedance(imp, f_rev,
+                                                               True)
             self._induced_calcs.append(self._calc_induced_freq)
 
+        if len(resonators) > 0:
+            time_step = self._time_step()
+
+            # The recursion is kept if the resonators are the same, to keep
+            # the wake of the previous turns
+            key = (tuple(id(res) for res in resonators), time_step)
+            if key != self._recursion_key:
+                self._wake_recursion = recursion.ResonatorRecursion(
+                    resonators, time_step)
+                self._recursion_key = key
+            self._induced_calcs.append(self._calc_induced_recursive)
 
-        if len(self.wakes_loaded) > 0:
+        if len(wakes) > 0:
             try:
                 self.total_wake = np.zeros(len(self.interp_time_array))
             except TypeError:
                 raise exceptions.MissingParameterError(
                         "interp_time_array has not been correctly defined")
 
-            for wake in self.wakes_loaded:
+            for wake in wakes:
 
                 wake.wake_calc(self.interp_time_array)
                 self.total_wake += wake.wake
+
+            # The FFT of the total wake is kept until the wakes are summed
+            # again, i.e. while the interp_time_array is unchanged
+            self._wake_convolution = conv.FFTConvolution(self.total_wake)
             self._induced_calcs.append(self._calc_induced_time)
 
         inductives = [i for i in self.inductive_loaded]
@@ -108,6 +194,124 @@ class InducedVoltage:
             self._induced_calcs.append(self._calc_induced_inductive)
 
 
+    def _time_step(self):
+
+        try:
+            return self.interp_time_array[1] - self.interp_time_array[0]
+        except TypeError:
+            raise exceptions.MissingParameterError(
+                "interp_time_array has not been correctly defined")
+
+
+    def _sum_memory_sources(self, impedances, wakes, f_rev):
+        '''
+        Sum of the impedances and wakes on the grid of the multi-turn
+        memory. The memory covers max(multi_turn_memory, profile length)
+        from the first point of the interp_time_array, it is zero padded to
+        twice its length for the FFTs so that the time shifts do not wrap
+        around. The memory and the cost per turn are therefore
+        proportional to multi_turn_memory/time_step, i.e. to the number of
+        turns spanned by the wakes (the tables can be fitted with
+        Resonators, see fit_resonators, to use the recursion instead).
+        '''
+
+        time_step = self._time_step()
+        n_memory = max(len(self.interp_time_array),
+                       int(np.ceil(self.multi_turn_memory / time_step)))
+
+        key = (time_step, n_memory, self.interp_time_array[0])
+        if key != self._memory_key:
+            self._memory_key = key
+            self._memory_n_fft = 2 * n_memory
+            self._memory_frequency_array = fft.rfftfreq(self._memory_n_fft,
+                                                        time_step)
+            self._memory_time_array = self.interp_time_array[0] \
+                + np.arange(n_memory) * time_step
+            self.memory_buffer = np.zeros(n_memory)
+            self._memory_phase = None
+
+        if len(impedances) > 0:
+            self.total_memory_impedance = self._static_impedance(
+                self._memory_frequency_array).copy()
+            for imp in self.var_impedances_loaded:
+                self.total_memory_impedance += self._source_impedance(
+                    imp, f_rev, True, self._memory_frequency_array)
+        else:
+            self.total_memory_impedance = None
+
+        # The wakes are summed again only if the grid or the sources changed
+        wake_key = (key, tuple(id(wake) for wake in wakes))
+        if len(wakes) == 0:
+            self._memory_wake_convolution = None
+        elif wake_key != self._memory_wake_key:
+            total_wake = np.zeros(n_memory)
+            for wake in wakes:
+                wake.wake_calc(self._memory_time_array)
+                total_wake += wake.wake
+            self._memory_wake_convolution = conv.FFTConvolution(total_wake)
+        self._memory_wake_key = wake_key
+
+
+    def reset_memory(self):
+        '''
+        Removing the wakes of the previous turns in the multi-turn mode
+        '''
+
+        if self._memory_key is not None:
+            self.memory_buffer[:] = 0
+
+        if self._recursion_key is not None:
+            self._wake_recursion.reset()
+
+        self._turn_start = None
+
+
+    def _advance_memory(self, f_rev):
+        '''
+        Shifting the wakes of the previous turns by one revolution period,
+        with a phase factor on the zero padded memory (one FFT and one
+        inverse FFT of twice the memory length per turn)
+        '''
+
+        if f_rev is None:
+            raise exceptions.MissingParameterError(
+                "f_rev is required by calc_induced with multi_turn_memory")
+
+        if self._turn_start is None:
+            self._turn_start = 0
+            return
+
+        self._turn_start += 1 / f_rev
+
+        if self._memory_key is not None:
+            time_step = self._memory_key[0]
+            n_memory = len(self.memory_buffer)
+            n_shift = int(1 / (f_rev * time_step))
+
+            if n_shift >= n_memory:
+                self.memory_buffer[:] = 0
+            else:
+                # Only the part of the memory after the shift is kept, with
+                # a smooth taper instead of the cut to avoid ringing
+                start = max(n_shift - 2*memory_taper, 0)
+                kept = self.memory_buffer[start:].copy()
+                n_taper = max(n_shift - start - memory_taper, 0)
+                kept[:n_taper] *= 0.5 - 0.5*np.cos(
+                    np.pi * np.arange(n_taper) / max(n_taper, 1))
+
+                # The phase factor is kept while f_rev is the same
+                shift = 1 / f_rev - start * time_step
+                if self._memory_phase is None \
+                        or self._memory_phase[0] != shift:
+                    self._memory_phase = (shift, np.exp(
+                        2j * np.pi * shift * self._memory_frequency_array))
+
+                spectrum = fft.rfft(kept, self._memory_n_fft)
+                spectrum *= self._memory_phase[1]
+                self.memory_buffer = fft.irfft(
+                    spectrum, self._memory_n_fft)[:n_memory]
+
+
     def calc_induced_by_source(self, spectrum = None, profile = None, 
                                normalisation = 1, f_rev = None, sample = None):
 
@@ -118,16 +322,12 @@ class InducedVoltage:
         varImpedances = [i for i in self.var_impedances_loaded]
         
         for i in impedances:
-            # i.update(f_rev)
-            i.imped_calc(self.interp_frequency_array)
             self.imped_induced.append(calc_induced_freq(self.beam_spectrum, 
-                                                   i.impedance*normalisation))
+                                      self._source_impedance(i)*normalisation))
         
         for i in varImpedances:
-            i.update(f_rev)
-            i.imped_calc(self.interp_frequency_array)
             self.var_imped_induced.append(calc_induced_freq(self.beam_spectrum, 
-                                                   i.impedance*normalisation))
+                         self._source_impedance(i, f_rev, True)*normalisation))
         
         
         self.wake_induced = []
@@ -160,17 +360,271 @@ class InducedVoltage:
                                                    i.inductive*normalisation))
 
 
-    def calc_induced(self, normalisation=1):
-        
+    def _source_impedance(self, source, f_rev = None, variable = False,
+                          frequency_array = None):
+        '''
+        Impedance of a source on the interp_frequency_array (or on the
+        frequency_array). It is evaluated again only if the frequency array
+        is a different object or, for the variable sources, if f_rev changed
+        and the update of the source does not return False (parameters
+        unchanged).
+        '''
+
+        if frequency_array is None:
+            frequency_array = self.interp_frequency_array
+
+        cached = self._impedance_cache.get(id(source))
+        if cached is not None and cached[0] is source \
+                and cached[1] is frequency_array:
+            if not variable or cached[2] == f_rev:
+                return cached[3]
+            if source.update(f_rev) is False:
+                self._impedance_cache[id(source)] = (source, frequency_array,
+                                                     f_rev, cached[3])
+                return cached[3]
+        elif variable:
+            source.update(f_rev)
+
+        source.imped_calc(frequency_array)
+        self._impedance_cache[id(source)] = (source, frequency_array, f_rev,
+                                             source.impedance)
+
+        return source.impedance
+
+
+    def _static_impedance(self, frequency_array = None):
+        '''
+        Sum of the impedances of the static sources, kept while the
+        interp_frequency_array (or the frequency_array) and the static
+        sources are the same objects
+        '''
+
+        if frequency_array is None:
+            frequency_array = self.interp_frequency_array
+
+        key = (frequency_array, tuple(self.impedances_loaded))
+
+        cached = self._static_impedance_cache
+        if cached is not None and cached[0][0] is key[0] \
+                and len(cached[0][1]) == len(key[1]) \
+                and all(a is b for a, b in zip(cached[0][1], key[1])):
+            return cached[1]
+
+        static_impedance = np.zeros(len(frequency_array), dtype='complex')
+        for imp in self.impedances_loaded:
+            static_impedance += self._source_impedance(
+                imp, frequency_array=frequency_array)
+
+        self._static_impedance_cache = (key, static_impedance)
+
+        return static_impedance
+
+
+    def calc_induced(self, normalisation=1, f_rev=None):
+        '''
+        Induced voltage of the profile. With the multi_turn_memory, it is
+        called once per turn with the revolution frequency f_rev, which
+        sets the time since the previous turn, and includes the wakes of
+        the previous turns.
+        '''
+
+        if self.multi_turn_memory is not None:
+            self._advance_memory(f_rev)
+
         self.VInduced = 0
         for calc in self._induced_calcs:
             self.VInduced += calc(normalisation)
 
 
+    def calc_induced_batch(self, profiles, normalisation=1, f_rev=None,
+                           chunk_profiles=None):
+        r'''
+        Induced voltage of a stack of profiles sampled on the
+        interp_time_array, e.g. all the turns of an acquisition, using the
+        sources summed by sum_impedance_sources. The spectra are computed by
+        chunks of profiles with one 2D FFT.
+
+        Parameters
+        ----------
+        profiles : np.array
+            The profiles, of shape (n_profiles, n_points)
+        normalisation : float
+            Optional: The normalisation of the impedances, wakes and
+            inductive impedances, as in calc_induced
+        f_rev : float or np.array
+            Optional: The revolution frequency of each profile, for which the
+            variable impedances and the inductive impedances are evaluated.
+            The default is None, the total impedance and inductive impedance
+            from sum_impedance_sources are used for all profiles
+        chunk_profiles : int
+            Optional: The number of profiles per chunk. The default is None,
+            the spectra of each chunk are batch_nbytes large
+
+        Returns
+        -------
+        induced_voltage : np.array
+            The induced voltage, of shape (n_profiles, n_points)
+        '''
+
+        try:
+            induced_calcs = self._induced_calcs
+        except AttributeError:
+            raise exceptions.MissingParameterError(
+                "sum_impedance_sources should be called before " +
+                "calc_induced_batch")
+
+        if self.multi_turn_memory is not None:
+            raise exceptions.WrongCalcError(
+                "calc_induced_batch is not available with multi_turn_memory")
+
+        profiles = np.asarray(profiles)
+        if profiles.ndim != 2 \
+                or profiles.shape[1] != len(self.interp_time_array):
+            raise exceptions.InputDataError(
+                "profiles should be a 2D array with one profile of " +
+                "len(interp_time_array) points per row")
+
+        n_profiles, n_points = profiles.shape
+
+        if f_rev is not None:
+            f_rev = np.broadcast_to(f_rev, (n_profiles,))
+
+        if chunk_profiles is None:
+            chunk_profiles = max(1, batch_nbytes //
+                                 (n_points*np.dtype(complex).itemsize))
+
+        batch_calcs = {self._calc_induced_freq: self._batch_induced_freq,
+                       self._calc_induced_time: self._batch_induced_time,
+                       self._calc_induced_recursive:
+                           self._batch_induced_recursive,
+                       self._calc_induced_harmonic:
+                           self._batch_induced_harmonic,
+                       self._calc_induced_inductive:
+                           self._batch_induced_inductive}
+
+        induced_voltage = np.zeros(profiles.shape)
+
+        for start in range(0, n_profiles, chunk_profiles):
+            chunk = profiles[start:start+chunk_profiles]
+            if f_rev is None:
+                chunk_f_rev = None
+            else:
+                chunk_f_rev = f_rev[start:start+chunk_profiles]
+
+            for calc in induced_calcs:
+                induced_voltage[start:start+chunk_profiles] += \
+                    batch_calcs[calc](chunk, chunk_f_rev)
+
+        induced_voltage *= normalisation
+
+        return induced_voltage
+
+
+    def _batch_induced_freq(self, profiles, f_rev):
+
+        n_points = profiles.shape[1]
+        n_frequencies = len(self.interp_frequency_array)
+
+        # The spectrum can be zero padded
+        if n_points//2 + 1 == n_frequencies:
+            n_fft = n_points
+        else:
+            n_fft = 2*(n_frequencies - 1)
+
+        spectra = fft.rfft(profiles, n_fft, axis=1)
+
+        if f_rev is None:
+            spectra *= self.total_impedance
+        else:
+            static_impedance = self._static_impedance()
+            for spectrum, profile_f_rev in zip(spectra, f_rev):
+                impedance = static_impedance
+                for imp in self.var_impedances_loaded:
+                    impedance = impedance + self._source_impedance(
+                        imp, profile_f_rev, True)
+                spectrum *= impedance
+
+        return -fft.irfft(spectra, n_fft, axis=1)[:, :n_points]
+
+
+    def _batch_induced_time(self, profiles, f_rev):
+
+        return self._wake_convolution.convolve(profiles, profiles.shape[1])
+
+
+    def _batch_induced_recursive(self, profiles, f_rev):
+
+        return self._wake_recursion.batch_induced_voltage(profiles)
+
+
+    def _batch_induced_harmonic(self, profiles, f_rev):
+
+        if f_rev is None:
+            return self._harmonic.induced_voltage(self.interp_time_array,
+                                                  profiles)
+
+        # The f_rev of sum_impedance_sources is set back afterwards
+        summed_f_rev = self._harmonic.f_rev
+        induced_voltage = np.zeros(profiles.shape)
+        for index, profile_f_rev in enumerate(f_rev):
+            self._harmonic.update(profile_f_rev)
+            induced_voltage[index] = self._harmonic.induced_voltage(
+                self.interp_time_array, profiles[index])
+        self._harmonic.update(summed_f_rev)
+
+        return induced_voltage
+
+
+    def _batch_induced_inductive(self, profiles, f_rev):
+
+        derivative = np.gradient(profiles, self.interp_time_array[1]
+                                 - self.interp_time_array[0], axis=1)
+
+        if f_rev is None:
+            return -derivative*self.total_inductive
+
+        total_inductive = np.zeros(len(f_rev))
+        for index, profile_f_rev in enumerate(f_rev):
+            for induct in self.var_inductive_loaded:
+                induct.update(profile_f_rev)
+            for induct in self.inductive_loaded + self.var_inductive_loaded:
+                induct.induct_calc(profile_f_rev)
+                total_inductive[index] += induct.inductive
+
+        return -derivative*total_inductive[:, np.newaxis]
+
+
     def _calc_induced_time(self, normalisation):
-        return calc_induced_time(self.beam_profile, 
-                                 self.total_wake*normalisation)
+        return normalisation*self._wake_convolution.convolve(
+            self.beam_profile, len(self.beam_profile))
     
+    def _calc_induced_recursive(self, normalisation):
+        if self.multi_turn_memory is None:
+            self._wake_recursion.reset()
+            return normalisation*self._wake_recursion.induced_voltage(
+                self.beam_profile)
+        else:
+            return self._wake_recursion.induced_voltage(
+                normalisation*self.beam_profile, self._turn_start)
+
+    def _calc_induced_harmonic(self, normalisation):
+        return normalisation*self._harmonic.induced_voltage(
+            self.interp_time_array, self.beam_profile)
+
+    def _calc_induced_memory(self, normalisation):
+        n_memory = len(self.memory_buffer)
+        induced = np.zeros(n_memory)
+        if self.total_memory_impedance is not None:
+            induced -= fft.irfft(
+                fft.rfft(self.beam_profile, self._memory_n_fft)
+                * self.total_memory_impedance,
+                self._memory_n_fft)[:n_memory]
+        if self._memory_wake_convolution is not None:
+            induced += self._memory_wake_convolution.convolve(
+                self.beam_profile, n_memory)
+        self.memory_buffer += normalisation*induced
+        return self.memory_buffer[:len(self.beam_profile)].copy()
+
     def _calc_induced_freq(self, normalisation):
         return calc_induced_freq(self.beam_spectrum, 
                                  self.total_impedance*normalisation)
@@ -204,7 +658,7 @@ def calc_induced_freq(spectrum, impedance):
     return -fft.irfft(spectrum*impedance)
 
 def calc_induced_time(profile, wake):
-    return np.convolve(profile, wake)
+    return conv.convolve(profile, wake, len(profile))
 
 def calc_induced_inductive(derivative, inductive):
     return -derivative*inductive
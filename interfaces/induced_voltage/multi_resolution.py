@@ -0,0 +1,231 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to compute the induced voltage of bunch trains with two levels of
+resolution, a fine grid in the window of each bunch and a coarse grid over
+the full train**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import numpy as np
+
+# BLonD_Common imports
+from ...maths import convolution as conv
+from ...devtools import exceptions as excpt
+
+
+class MultiResolutionInducedVoltage:
+    r"""
+    Class computing the induced voltage of a train of bunches, each sampled
+    in its own window with the same fine time step, without a fine grid
+    over the full train.
+
+    - The field of each bunch in its own window is the convolution with the
+      wake sampled with the fine time step.
+    - The field of the other bunches is computed on a coarse grid with a
+      time step coarse_factor times larger: the profiles are deposited on
+      the coarse grid with linear weights, convolved with the wake sampled
+      on the coarse grid, the contribution of the bunch itself is removed
+      and the result is linearly interpolated on the fine grid.
+
+    The field of each bunch in its own window is exact. The linear
+    deposition and interpolation correspond to a bilinear interpolation of
+    :math:`W(t-s)`, the error on the field of the other bunches is bounded
+    by
+
+    .. math::
+        \left|\Delta V\right| \leq \frac{\Delta^2}{4}
+        \max\left|W''\right| \sum_j q_j
+
+    with :math:`\Delta` the coarse time step and :math:`q_j` the sum of
+    the profile of the bunch j, the maximum being taken over the time
+    differences between the bunches. The windows should be separated by at
+    least two coarse time steps, for the wake to be smooth between the
+    coarse points.
+
+    The sign convention is the one of calc_induced_time.
+
+    Parameters
+    ----------
+    wake_list : list
+        The wake sources, with a wake_calc method (e.g. Resonators,
+        TravelingWaveCavity or WakefieldTable)
+    time_step : float
+        The fine time step in s
+    coarse_factor : int
+        The ratio between the coarse and fine time steps
+
+    Attributes
+    ----------
+    coarse_time_step : float
+        The coarse time step in s
+    error_bound : float
+        The bound of the error above, for the last call of calc_induced
+
+    Examples
+    --------
+    >>> induced = MultiResolutionInducedVoltage([resonators], 1e-11, 20)
+    >>> induced_voltage = induced.calc_induced(window_starts, profiles)
+    """
+
+    def __init__(self, wake_list, time_step, coarse_factor):
+
+        self.wake_list = wake_list
+        self.time_step = float(time_step)
+        self.coarse_factor = int(coarse_factor)
+
+        if self.time_step <= 0 or self.coarse_factor < 1:
+            raise excpt.InputDataError("time_step and coarse_factor " +
+                                       "should be positive")
+
+        self.coarse_time_step = self.coarse_factor * self.time_step
+        self.error_bound = None
+
+        self._fine_convolution = None
+        self._coarse_convolution = None
+
+    def _wake(self, time_array):
+
+        wake = np.zeros(len(time_array))
+        for source in self.wake_list:
+            source.wake_calc(time_array)
+            wake += source.wake
+
+        return wake
+
+    def _fine_wake(self, n_points):
+        '''
+        The convolution with the wake on the fine grid, kept for the same
+        window length
+        '''
+
+        if self._fine_convolution is None \
+                or len(self._fine_convolution.kernel) != n_points:
+            self._fine_convolution = conv.FFTConvolution(
+                self._wake(np.arange(n_points) * self.time_step))
+
+        return self._fine_convolution
+
+    def _coarse_wake(self, n_coarse):
+        '''
+        The convolution with the wake on the coarse grid and the absolute
+        value of its second derivative, estimated on a grid twice finer at
+        the half coarse steps from Delta/2. They are kept for the same
+        coarse grid length
+        '''
+
+        if self._coarse_convolution is None \
+                or len(self._coarse_convolution[0].kernel) != n_coarse:
+            finer_wake = self._wake(np.arange(2*n_coarse - 1)
+                                    * self.coarse_time_step / 2)
+            second_derivative = np.abs(np.diff(finer_wake, 2)) \
+                / (self.coarse_time_step / 2)**2
+            self._coarse_convolution = (
+                conv.FFTConvolution(finer_wake[::2]), second_derivative)
+
+        return self._coarse_convolution
+
+    def calc_induced(self, window_starts, profiles):
+        r"""
+        Induced voltage in the windows of the bunches.
+
+        Parameters
+        ----------
+        window_starts : np.array
+            The time in s of the first point of the window of each bunch
+        profiles : np.array
+            The profiles, with one bunch per row, sampled with the fine time
+            step
+
+        Returns
+        -------
+        induced_voltage : np.array
+            The induced voltage in the windows, of the same shape as the
+            profiles
+        """
+
+        window_starts = np.asarray(window_starts, dtype=float)
+        profiles = np.asarray(profiles, dtype=float)
+
+        if profiles.ndim != 2 or len(window_starts) != len(profiles):
+            raise excpt.InputDataError("profiles should be a 2D array " +
+                                       "with one bunch per window_start")
+
+        n_bunches, n_points = profiles.shape
+
+        order = np.argsort(window_starts)
+        window_length = (n_points - 1) * self.time_step
+        minimum_gap = np.min(np.diff(window_starts[order]),
+                             initial=np.inf) - window_length
+        if minimum_gap <= 2 * self.coarse_time_step:
+            raise excpt.InputDataError("The windows should be separated by " +
+                                       "more than two coarse time steps")
+
+        # Field of the bunches in their own window
+        induced_voltage = self._fine_wake(n_points).convolve(profiles,
+                                                             n_points)
+
+        if n_bunches == 1:
+            self.error_bound = 0.
+            return induced_voltage
+
+        # Position of the fine points in units of coarse time steps, from
+        # the first window
+        positions = (window_starts[:, np.newaxis] - np.min(window_starts)
+                     + np.arange(n_points) * self.time_step) \
+            / self.coarse_time_step
+        cells = np.floor(positions).astype(int)
+        weights = positions - cells
+
+        first_cells = cells[:, 0]
+        own_cells = cells - first_cells[:, np.newaxis]
+        n_cells = np.max(own_cells) + 2
+        n_coarse = np.max(first_cells) + n_cells
+
+        coarse_charge = np.bincount(cells.ravel(),
+                                    ((1-weights)*profiles).ravel(), n_coarse)
+        coarse_charge += np.bincount(cells.ravel()+1,
+                                     (weights*profiles).ravel(), n_coarse)
+
+        coarse_convolution, second_derivative = self._coarse_wake(n_coarse)
+        coarse_voltage = coarse_convolution.convolve(coarse_charge, n_coarse)
+
+        # Deposition of each bunch on its own cells, to remove its own
+        # contribution
+        own_indices = (own_cells
+                       + n_cells * np.arange(n_bunches)[:, np.newaxis]).ravel()
+        own_charge = np.bincount(own_indices,
+                                 ((1-weights)*profiles).ravel(),
+                                 n_bunches * n_cells)
+        own_charge += np.bincount(own_indices + 1,
+                                  (weights*profiles).ravel(),
+                                  n_bunches * n_cells)
+        own_charge = own_charge.reshape(n_bunches, n_cells)
+
+        coupling = coarse_voltage[first_cells[:, np.newaxis]
+                                  + np.arange(n_cells)] \
+            - coarse_convolution.convolve(own_charge, n_cells)
+
+        induced_voltage += (1 - weights) * np.take_along_axis(
+            coupling, own_cells, axis=1)
+        induced_voltage += weights * np.take_along_axis(
+            coupling, own_cells + 1, axis=1)
+
+        # The time differences in the interpolation are above the gap minus
+        # two coarse time steps
+        first_lag = int(np.ceil(2 * (minimum_gap - 2*self.coarse_time_step)
+                                / self.coarse_time_step))
+        self.error_bound = self.coarse_time_step**2 / 4 \
+            * np.max(second_derivative[max(first_lag, 1) - 1:], initial=0) \
+            * np.sum(np.abs(profiles))
+
+        return induced_voltage
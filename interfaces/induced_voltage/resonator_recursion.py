@@ -0,0 +1,228 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to compute the induced voltage of resonators by a recursion over
+the profile samples, keeping the wake of the previous profiles**
+
+The wake of each resonator is a damped complex exponential, for
+:math:`t > 0`
+
+.. math::
+    W(t) = \\mathrm{Re}\\left(C e^{p t}\\right), \\quad
+    p = -\\alpha + j \\bar{\\omega}, \\quad
+    C = 2 R_S \\alpha \\left(1 + j \\frac{\\alpha}{\\bar{\\omega}}\\right)
+
+and :math:`W(0) = R_S \\alpha`. The convolution with the profile
+:math:`\\lambda` sampled with a time step :math:`\\Delta t` is therefore
+obtained from the sum over the previous samples
+:math:`S_k = z \\left(S_{k-1} + \\lambda_{k-1}\\right)`, with
+:math:`z = e^{p \\Delta t}`, as
+:math:`V_k = R_S \\alpha \\lambda_k + \\mathrm{Re}\\left(C S_k\\right)`.
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import numpy as np
+from scipy.signal import lfilter
+
+# BLonD_Common imports
+from ..impedances import impedance_sources as impSource
+from ...devtools import exceptions as excpt
+
+
+class ResonatorRecursion:
+    r"""
+    Class computing the induced voltage of resonators with a recursive
+    filter, in O(n_points*n_resonators) operations. The result is the
+    one of calc_induced_time(profile, wake), with the wake of the resonators
+    sampled at multiples of the time_step from 0.
+
+    The sums over the previous samples are kept between the calls, the wake
+    of the previous profiles is included in the induced voltage of the next
+    ones at no additional cost.
+
+    Parameters
+    ----------
+    resonators : Resonators or list
+        The Resonators object, or a list of Resonators objects
+    time_step : float
+        The sampling time of the profiles in s
+
+    Attributes
+    ----------
+    R_S, omega_R, Q : np.array
+        The parameters of all the resonators
+    pole : complex np.array
+        The poles :math:`p = -\alpha + j \bar{\omega}` in 1/s
+    coefficient : complex np.array
+        The coefficients :math:`C` of the wake in :math:`\Omega/s`
+    state : complex np.array
+        The sums :math:`S` over the previous samples for each resonator, at
+        the time attribute
+    time : float
+        The time in s of the state, i.e. one time step after the last sample
+        of the previous profile (None before the first profile)
+
+    Examples
+    --------
+    >>> recursion = ResonatorRecursion(Resonators(R_S, f_R, Q), time_step)
+    >>> for turn, profile in enumerate(profiles):
+    >>>     induced = recursion.induced_voltage(profile, turn*t_rev)
+    """
+
+    def __init__(self, resonators, time_step):
+
+        if isinstance(resonators, impSource.Resonators):
+            resonators = [resonators]
+
+        self.R_S = np.concatenate([res.R_S for res in resonators])
+        self.omega_R = np.concatenate([res.omega_R for res in resonators])
+        self.Q = np.concatenate([res.Q for res in resonators])
+        self.time_step = float(time_step)
+
+        if np.any(self.Q <= 0.5):
+            raise excpt.InputDataError("The recursion is only defined for " +
+                                       "underdamped resonators, Q > 0.5")
+
+        if self.time_step <= 0:
+            raise excpt.InputDataError("time_step should be positive")
+
+        alpha = self.omega_R / (2 * self.Q)
+        omega_bar = np.sqrt(self.omega_R ** 2 - alpha ** 2)
+
+        self.pole = -alpha + 1j * omega_bar
+        self.coefficient = 2 * self.R_S * alpha * (1 + 1j * alpha / omega_bar)
+        self._direct = np.sum(self.R_S * alpha)
+        self._z = np.exp(self.pole * self.time_step)
+
+        # The real second order filters are faster, the complex state is
+        # recovered from their states only if the poles are not close to
+        # the real axis (e.g. resonant frequency close to a multiple of the
+        # Nyquist frequency)
+        self._real_filter = np.abs(self._z.imag) > 1e-3 * np.abs(self._z)
+
+        self.reset()
+
+    @property
+    def n_resonators(self):
+        return len(self.R_S)
+
+    def reset(self):
+        r"""
+        Removing the wake of the previous profiles.
+        """
+
+        self.state = np.zeros(self.n_resonators, complex)
+        self.time = None
+
+    def advance(self, time_shift):
+        r"""
+        Propagating the state by time_shift in s, e.g. the gap before the
+        next profile.
+        """
+
+        if time_shift < 0:
+            raise excpt.InputDataError("The state cannot be propagated " +
+                                       "backwards in time")
+
+        self.state *= np.exp(self.pole * time_shift)
+        if self.time is not None:
+            self.time += time_shift
+
+    def induced_voltage(self, profile, start_time=None):
+        r"""
+        Induced voltage of a profile, including the wake of the previous
+        profiles.
+
+        Parameters
+        ----------
+        profile : np.array
+            The profile, sampled with the time_step
+        start_time : float
+            Optional: The time in s of the first sample of the profile, e.g.
+            turn*t_rev, at least one time step after the last sample of the
+            previous profile. The default is None, the profile directly
+            follows the previous one (or starts at 0)
+
+        Returns
+        -------
+        induced_voltage : np.array
+            The induced voltage, with the sign convention of
+            calc_induced_time
+        """
+
+        profile = np.asarray(profile, dtype=float)
+
+        if start_time is None:
+            start_time = 0 if self.time is None else self.time
+        elif self.time is not None:
+            self.advance(start_time - self.time)
+
+        induced_voltage, self.state = self._filter(profile, self.state)
+        self.time = start_time + len(profile) * self.time_step
+
+        return induced_voltage
+
+    def batch_induced_voltage(self, profiles):
+        r"""
+        Induced voltage of independent profiles, one per row, without the
+        wake of the previous profiles. The state is not modified.
+        """
+
+        profiles = np.asarray(profiles, dtype=float)
+
+        return self._filter(profiles, np.zeros((self.n_resonators,) +
+                                               profiles.shape[:-1],
+                                               complex), False)[0]
+
+    def _filter(self, profiles, state, final_state=True):
+        '''
+        The induced voltage along the last axis and the final state, the
+        state has one row per resonator and the shape of the profiles
+        without their last axis
+        '''
+
+        induced_voltage = self._direct * profiles
+        if final_state:
+            final_states = np.empty_like(state)
+        else:
+            final_states = None
+
+        for index, z in enumerate(self._z):
+
+            coefficient = self.coefficient[index]
+
+            if self._real_filter[index]:
+                # Filter of the real part Re(C S), with the two real states
+                # Re(C S) and -Re(C z* S) of the transposed direct form
+                initial = np.stack([(coefficient * state[index]).real,
+                                    -(coefficient * np.conj(z)
+                                      * state[index]).real], axis=-1)
+                voltage, final = lfilter(
+                    [0, (coefficient * z).real,
+                     -coefficient.real * abs(z)**2],
+                    [1, -2 * z.real, abs(z)**2], profiles, axis=-1,
+                    zi=initial)
+                induced_voltage += voltage
+                if final_state:
+                    imaginary = -(final[..., 1] + z.real * final[..., 0]) \
+                        / z.imag
+                    final_states[index] = (final[..., 0] + 1j * imaginary) \
+                        / coefficient
+            else:
+                sums, final = lfilter([0, z], [1, -z], profiles, axis=-1,
+                                      zi=state[index][..., np.newaxis])
+                sums *= coefficient
+                induced_voltage += sums.real
+                if final_state:
+                    final_states[index] = final[..., 0]
+
+        return induced_voltage, final_states
@@ -23,6 +23,7 @@ import sys
 
 #BLonD_Common imports
 from ...datatypes import rf_programs as rfProgs
+from ...datatypes import compressed as cprog
 from ...devtools import exceptions as excpt
 from ...devtools import assertions as assrt
 
@@ -292,9 +293,10 @@ class RFStation:
         self.voltage = voltage.reshape(use_time = Ring.cycle_time, 
                                        use_turns = Ring.use_turns)
 
-        self.harmonic = np.zeros(self.voltage.shape)
-        for i, h in enumerate(harmonic):
-            self.harmonic[i] = h
+        # The harmonics are constant, stored as a read-only zero-stride view
+        self.harmonic = np.broadcast_to(
+            np.array(harmonic, dtype=float).reshape(-1, 1),
+            self.voltage.shape)
             
         # Checking if the RFStation is empty
         if np.sum(self.voltage) == 0:
@@ -340,7 +342,8 @@ class RFStation:
 
         self.omega_rf_offset = omega_rf_offset.reshape(self.harmonic[:,0],
                                                        Ring.cycle_time, 
-                                                       Ring.use_turns)
+                                                       Ring.use_turns,
+                                                       broadcast=True)
 
         if phi_rf_offset is None:
             useoff = (0,)*self.harmonic.shape[0]
@@ -367,7 +370,8 @@ class RFStation:
 
         self.phi_rf_offset = phi_rf_offset.reshape(self.harmonic[:,0],
                                                    Ring.cycle_time, 
-                                                   Ring.use_turns)
+                                                   Ring.use_turns,
+                                                   broadcast=True)
         
         deltaPhaseFromOmega = self.omega_rf_offset.calc_delta_phase(
                                                     Ring.omega_rev)
@@ -390,6 +394,10 @@ class RFStation:
         self.Q_s = calculate_Q_s(self, self.Particle)
         self.omega_s0 = self.Q_s*Ring.omega_rev
 
+        # Compressing the programs if the Ring programs are compressed
+        if getattr(Ring, 'compress_tolerance', None) is not None:
+            self._compress(Ring.compress_tolerance)
+
 
     @classmethod
     def from_rf_systems(cls, Ring, *args, section_index=1):
@@ -430,6 +438,23 @@ class RFStation:
         self.use_turns = Ring.use_turns.astype(int)
 
 
+    def _compress(self, tolerance):
+        """ Function to replace all the programs sampled along the cycle
+        by compressed_program objects, within the relative tolerance.
+        """
+
+        programs = ['momentum', 'beta', 'gamma', 'energy', 'delta_E',
+                    'section_length', 'length_ratio', 'eta_0', 'eta_1',
+                    'eta_2', 'sign_eta_0', 'voltage', 'harmonic', 'phi_rf_d',
+                    'omega_rf_d', 'omega_rf_offset', 'phi_rf_offset',
+                    'phi_rf', 'omega_rf', 't_rf', 'phi_s', 'Q_s', 'omega_s0']
+
+        for name in programs:
+            program = getattr(self, name)
+            if isinstance(program, np.ndarray) and program.ndim in (1, 2):
+                setattr(self, name,
+                        cprog.compressed_program(program, tolerance))
+
     def eta_tracking(self, beam, counter, dE):
         r"""Function to calculate the slippage factor as a function of the
         energy offset :math:`\Delta E` of the particle. The slippage factor
@@ -467,6 +492,14 @@ class RFStation:
             to the moments contained in the 'cycle_moments' array
 
         """
+        if isinstance(self.cycle_time, cprog.compressed_program):
+            samples = self.cycle_time.inverse(cycle_moments)
+            parameters = {}
+            for name in ['voltage', 'phi_rf_d', 'harmonic', 'omega_rf_d']:
+                parameters[name] = [getattr(self, name).sample(samples, r)
+                                    for r in range(len(self.voltage))]
+            return parameters
+
         voltage = []
         phase = []
         harmonic = []
@@ -22,9 +22,12 @@ from ...devtools import exceptions as excpt
 from ...devtools import assertions as assrt
 from ..beam import beam
 from ...datatypes import ring_programs
+from ...datatypes import compressed as cprog
+from ...datatypes import _storage
 from ...datatypes.blond_function import machine_program
 from ...utilities import timing as tmng
 from ...utilities import rel_transforms as rt
+from ...utilities.cache import ProgramCache
 from ...maths import calculus as calc
 from .ring_section import RingSection
 
@@ -37,6 +40,9 @@ _Ring_opt_dflt['interp_time'] = 0
 _Ring_opt_dflt['interpolation'] = 'linear'
 _Ring_opt_dflt['store_turns'] = True
 _Ring_opt_dflt['eta_orders'] = 0
+_Ring_opt_dflt['compress_tolerance'] = None
+_Ring_opt_dflt['storage_dir'] = None
+_Ring_opt_dflt['cache'] = None
 
 
 class Ring:
@@ -62,6 +68,20 @@ class Ring:
     eta_orders : int (optional, default 0)
         The orders of slippage factor to be computed (alpha_1 and alpha_2,
         will be assumed to be 0 by default if not defined in the sections).
+    compress_tolerance : float (optional, default None)
+        If defined, the sampled programs are stored as piecewise-linear
+        compressed_program objects, reproducing every sample within the
+        tolerance relative to the maximum of each program. Reduces the memory
+        for long cycles with linear or flat portions.
+    storage_dir : str (optional, default None)
+        If defined, the sampled programs are stored as memory mapped .npy
+        files created in this directory (the files are not deleted), only
+        the samples accessed are then loaded in memory.
+    cache : str or ProgramCache (optional, default None)
+        If defined, the preprocessed momentum program is saved to (and
+        reloaded from) this on-disk cache, identified by the hash of the
+        synchronous data, particle and interpolation options. The derived
+        programs are recomputed from the cached momentum.
 
     Attributes
     ----------
@@ -176,6 +196,61 @@ class Ring:
 
     def __init__(self, Particle, RingSection_list, **kwargs):
 
+        # Keeping the options to derive the Ring for other particles
+        self._options = dict(kwargs)
+
+        # Getting the sections and the synchronous data converted
+        # to momentum
+        momentum_by_turn = self._load_sections(Particle,
+                                               RingSection_list)
+
+        # Processing the momentum program
+        # Getting the options to get at which time samples the interpolation
+        # is made
+        t_start = kwargs.pop('t_start', _Ring_opt_dflt['t_start'])
+        t_stop = kwargs.pop('t_stop', _Ring_opt_dflt['t_stop'])
+        interp_time = kwargs.pop('interp_time', _Ring_opt_dflt['interp_time'])
+
+        # Treating the input of the interp_time option
+        if not hasattr(interp_time, '__iter__'):
+            interp_time = (interp_time, )
+
+        # Getting the sample times
+        sample_func, start, stop = tmng.time_from_sampling(*interp_time)
+
+        # Setting interpolation bounds to user defined values if they are
+        # within the bounds defined by interp_time
+        if t_start > start:
+            start = t_start
+        if t_stop < stop:
+            stop = t_stop
+
+        # Getting options for the interpolation
+        interpolation = kwargs.pop('interpolation',
+                                   _Ring_opt_dflt['interpolation'])
+        store_turns = kwargs.pop('store_turns', _Ring_opt_dflt['store_turns'])
+
+        # Getting the directory in which the programs are stored on disk
+        self.storage_dir = kwargs.pop('storage_dir',
+                                      _Ring_opt_dflt['storage_dir'])
+
+        # Processing the momentum program and interpolating on the
+        # values defined by sample_func, or loading it from the cache
+        cache = kwargs.pop('cache', _Ring_opt_dflt['cache'])
+        momentum_processed = self._preprocess(
+            sample_func, interp_time, interpolation, start, stop,
+            store_turns, cache)
+
+        # Computing all the programs from the processed momentum
+        self._derive_programs(momentum_processed, momentum_by_turn,
+                              store_turns, **kwargs)
+
+    def _load_sections(self, Particle, RingSection_list):
+        """ Function to get the particle and the sections, and to convert
+        the synchronous data of all sections to momentum. Returns True if
+        the synchronous data are not time based.
+        """
+
         # Primary particle mass and charge used for energy calculations
         # If a string is passed, will generate the relevant Particle object
         # based on the name
@@ -264,48 +339,24 @@ class Ring:
             self.synchronous_data = ring_programs.momentum_program.combine_single_sections(
                 *momentum_list)
 
-        # Processing the momentum program
-        # Getting the options to get at which time samples the interpolation
-        # is made
-        t_start = kwargs.pop('t_start', _Ring_opt_dflt['t_start'])
-        t_stop = kwargs.pop('t_stop', _Ring_opt_dflt['t_stop'])
-        interp_time = kwargs.pop('interp_time', _Ring_opt_dflt['interp_time'])
-
-        # Treating the input of the interp_time option
-        if not hasattr(interp_time, '__iter__'):
-            interp_time = (interp_time, )
-
-        # Getting the sample times
-        sample_func, start, stop = tmng.time_from_sampling(*interp_time)
-
-        # Setting interpolation bounds to user defined values if they are
-        # within the bounds defined by interp_time
-        if t_start > start:
-            start = t_start
-        if t_stop < stop:
-            stop = t_stop
-
-        # Getting options for the interpolation
-        interpolation = kwargs.pop('interpolation',
-                                   _Ring_opt_dflt['interpolation'])
-        store_turns = kwargs.pop('store_turns', _Ring_opt_dflt['store_turns'])
+        return momentum_by_turn
 
-        # Processing the momentum program and interpolating on the
-        # values defined by sample_func
-        momentum_processed = self.synchronous_data.preprocess(
-            self.Particle.mass,
-            self.circumference_design, sample_func,
-            interpolation, start, stop,
-            store_turns=store_turns)
+    def _derive_programs(self, momentum_processed, momentum_by_turn,
+                         store_turns, **kwargs):
+        """ Function to compute all the programs from the processed momentum
+        program of the form [turn numbers, time, momentum...].
+        """
 
         # Getting the cycle time from the interpolation
-        self.cycle_time = np.array(momentum_processed[1])
+        self.cycle_time = self._store(np.array(momentum_processed[1]),
+                                      'cycle_time')
 
         # The machine turn numbers corresponding to the cycle_time
         # are kept if the store_turns is enabled
         if store_turns:
             self.parameters_at_turn = self._parameters_at_turn
-            self.use_turns = momentum_processed[0].astype(int)
+            self.use_turns = self._store(momentum_processed[0].astype(int),
+                                         'use_turns')
         else:
             self.parameters_at_turn = self._no_parameters_at_turn
             self.use_turns = momentum_processed[0]
@@ -315,23 +366,31 @@ class Ring:
         self.n_turns = momentum_processed.n_turns - 1
 
         # Storing the momentum program and computing all associated values
+        # If the program is time based, it is identical in all sections and
+        # the values are computed once and broadcast to all sections
+        # as read-only views
         if momentum_by_turn:
             self.momentum = momentum_processed[2:]
         else:
-            self.momentum = ring_programs.momentum_program.zeros(
-                (self.n_sections, len(momentum_processed[2])))
-            for index_section in range(self.n_sections):
-                self.momentum[index_section] = momentum_processed[2]
+            self.momentum = momentum_processed[2:3]
 
         # Converting all values associated to momentum
-        self.beta = np.array(rt.mom_to_beta(
-            self.momentum, self.Particle.mass))
-        self.gamma = np.array(rt.mom_to_gamma(
-            self.momentum, self.Particle.mass))
-        self.energy = self.momentum.to_total_energy(
-            inPlace=False, rest_mass=self.Particle.mass)
-        self.kin_energy = self.momentum.to_kin_energy(
-            inPlace=False, rest_mass=self.Particle.mass)
+        self.beta = self._store(np.array(rt.mom_to_beta(
+            self.momentum, self.Particle.mass)), 'beta')
+        self.gamma = self._store(np.array(rt.mom_to_gamma(
+            self.momentum, self.Particle.mass)), 'gamma')
+        self.energy = self._store(self.momentum.to_total_energy(
+            inPlace=False, rest_mass=self.Particle.mass), 'energy')
+        self.kin_energy = self._store(self.momentum.to_kin_energy(
+            inPlace=False, rest_mass=self.Particle.mass), 'kin_energy')
+
+        if not momentum_by_turn:
+            for name in ['momentum', 'beta', 'gamma', 'energy',
+                         'kin_energy']:
+                program = getattr(self, name)
+                setattr(self, name, np.broadcast_to(
+                    program, (self.n_sections, program.shape[-1]),
+                    subok=True))
 
         # Extracting and combining the orbit length programs
         self.section_length = ring_programs.orbit_length_program.combine_single_sections(
@@ -340,37 +399,45 @@ class Ring:
 
         # Reshaping to match the dimensions of the synchronous data program
         self.section_length = self.section_length.reshape(
-            self.n_sections, self.cycle_time, self.use_turns)
+            self.n_sections, self.cycle_time, self.use_turns, broadcast=True)
 
         # Getting the circumference and radius (including potential orbit
         # bumps)
-        self.circumference = np.sum(self.section_length, axis=0)
-        self.radius = self.circumference / (2 * np.pi)
+        self.circumference = self._store(
+            np.sum(self.section_length, axis=0), 'circumference')
+        self.radius = self._store(self.circumference / (2 * np.pi),
+                                  'radius')
 
         # Getting orbit bump from comparison of circumference vs. design
-        self.orbit_bump = self.circumference - self.circumference_design
+        self.orbit_bump = self._store(
+            self.circumference - self.circumference_design, 'orbit_bump')
 
         # Computing the revolution period on the design orbit
         # as well as revolution frequency and angular frequency
-        self.t_rev_design = np.dot(self.section_length_design,
-                                   1 / (self.beta * c))
-        self.f_rev_design = 1 / self.t_rev_design
-        self.omega_rev_design = 2 * np.pi * self.f_rev_design
+        self.t_rev_design = self._store(np.dot(self.section_length_design,
+                                               1 / (self.beta * c)),
+                                        't_rev_design')
+        self.f_rev_design = self._store(1 / self.t_rev_design,
+                                        'f_rev_design')
+        self.omega_rev_design = self._store(2 * np.pi * self.f_rev_design,
+                                            'omega_rev_design')
 
         # Computing the time of flight in each section
         # and the revolution period on the beam orbit including
         # possible orbit bumps
-        self.t_rev = np.sum(np.array(
-            self.section_length / (self.beta * c)), axis=0)
-        self.f_rev = 1 / self.t_rev
-        self.omega_rev = 2 * np.pi * self.f_rev
+        self.t_rev = self._store(np.sum(np.array(
+            self.section_length / (self.beta * c)), axis=0), 't_rev')
+        self.f_rev = self._store(1 / self.t_rev, 'f_rev')
+        self.omega_rev = self._store(2 * np.pi * self.f_rev, 'omega_rev')
 
         # Recalculating the delta_E
         if (self.n_turns+1) > len(self.use_turns):
-            self.delta_E = np.zeros(self.energy.shape)
+            self.delta_E = _storage.zeros(self.energy.shape,
+                                          self.storage_dir, 'delta_E')
             self._recalc_delta_E()
         else:
-            self.delta_E = np.diff(self.energy, axis=1)
+            self.delta_E = self._store(np.diff(self.energy, axis=1),
+                                       'delta_E')
 
         # Determining the momentum compaction orders defined in all sections
         # The orders 1 and 2 are presently set by default to zeros if
@@ -413,13 +480,21 @@ class Ring:
                 *alpha_prog, interpolation='linear')
 
             setattr(self, alpha_name, alpha_prog.reshape(
-                self.n_sections, self.cycle_time, self.use_turns))
+                self.n_sections, self.cycle_time, self.use_turns,
+                broadcast=True))
 
         # Slippage factor derived from alpha, beta, gamma
         for order in range(self.eta_orders + 1):
-            setattr(self, 'eta_%d' % (order), np.zeros(self.momentum.shape))
+            setattr(self, 'eta_%d' % (order), _storage.zeros(
+                self.momentum.shape, self.storage_dir, 'eta_%d' % (order)))
         self._eta_generation()
 
+        # Replacing the sampled programs by their compressed version
+        self.compress_tolerance = kwargs.pop(
+            'compress_tolerance', _Ring_opt_dflt['compress_tolerance'])
+        if self.compress_tolerance is not None:
+            self._compress()
+
         # Warning if kwargs were unused
         if len(kwargs) > 0:
             warnings.warn(
@@ -504,6 +579,129 @@ class Ring:
 
         return cls(Particle, RingSection_list, **kwargs_ring)
 
+    def with_particle(self, Particle):
+        r""" Create the Ring with the same sections and options for another
+        particle (e.g. other ion species or charge state).
+
+        The programs already sampled are converted to the new particle
+        in one pass, from the type of synchronous data defined in each
+        section (momentum unchanged, bending field scaled by the charge,
+        energies converted with the new mass). Only the turn based
+        programs need their cycle time to be integrated again. The time based
+        programs sampled turn by turn (store_turns enabled) have sample
+        times that depend on the particle, and the time based energy
+        programs are interpolated in energy with a conversion to momentum
+        that depends on the particle: both are fully preprocessed again.
+
+        Parameters
+        ----------
+        Particle : class or str
+            The new synchronous particle.
+
+        Returns
+        -------
+        Ring
+            The new Ring object.
+
+        Examples
+        --------
+        >>> from blond_common.interfaces.beam.beam import Proton, Particle
+        >>>
+        >>> B_field = bending_field_program([[0, 1], [0.1, 1.]])
+        >>> section = RingSection(6911.5, 1/18**2, B_field,
+        >>>                       bending_radius=741.3)
+        >>> ring = Ring(Proton(), section, store_turns=False,
+        >>>             interp_time=1e-3)
+        >>> ring_lead = ring.with_particle(Particle(193.7e9, 54))
+        """
+
+        kwargs = dict(self._options)
+        store_turns = kwargs.pop('store_turns', _Ring_opt_dflt['store_turns'])
+
+        energy_program = any(
+            isinstance(section.synchronous_data,
+                       (ring_programs.total_energy_program,
+                        ring_programs.kinetic_energy_program))
+            for section in self.RingSection_list)
+
+        if self.synchronous_data.timebase == 'by_time' \
+                and (store_turns or energy_program):
+            return type(self)(Particle, self.RingSection_list,
+                              **self._options)
+
+        for option in ['t_start', 't_stop', 'interp_time', 'interpolation',
+                       'storage_dir', 'cache']:
+            kwargs.pop(option, None)
+
+        newRing = type(self).__new__(type(self))
+        newRing._options = dict(self._options)
+        newRing.storage_dir = self.storage_dir
+        momentum_by_turn = newRing._load_sections(Particle,
+                                                  self.RingSection_list)
+
+        # Converting the sampled momentum of all sections, time based
+        # programs are identical in all sections
+        if momentum_by_turn:
+            n_programs = self.n_sections
+        else:
+            n_programs = 1
+
+        momentum = np.zeros((n_programs, len(self.cycle_time)))
+        for section in range(n_programs):
+            momentum[section] = self._convert_momentum(
+                np.asarray(self.momentum[section]), newRing.Particle,
+                section)
+
+        # The cycle time of turn based programs depends on the
+        # revolution period
+        if self.synchronous_data.timebase == 'by_turn':
+            t_rev = rt.mom_to_trev(momentum[0], newRing.Particle.mass,
+                                   circ=newRing.circumference_design)
+            cycle_time = np.insert(np.cumsum(t_rev[:-1]), 0, 0)
+        else:
+            cycle_time = np.asarray(self.cycle_time)
+
+        momentum_processed = _storage.zeros(
+            [2 + n_programs, len(cycle_time)], self.storage_dir,
+            prefix='momentum_program')
+        momentum_processed[0, :] = np.asarray(self.use_turns)
+        momentum_processed[1, :] = cycle_time
+        momentum_processed[2:, :] = momentum
+        momentum_processed = momentum_processed.view(
+            ring_programs.momentum_program)
+        momentum_processed.n_turns = self.n_turns + 1
+
+        newRing._derive_programs(momentum_processed, momentum_by_turn,
+                                 store_turns, **kwargs)
+
+        return newRing
+
+    def _convert_momentum(self, momentum, Particle, section):
+        """ Function to convert the sampled momentum of one section to
+        another particle, going through the type of synchronous data
+        defined in the section.
+        """
+
+        synchronous_data = self.RingSection_list[section].synchronous_data
+        bending_radius = self.bending_radius[section]
+
+        if isinstance(synchronous_data, ring_programs.bending_field_program):
+            return rt.B_field_to_momentum(
+                rt.momentum_to_B_field(momentum, bending_radius,
+                                       self.Particle.charge),
+                bending_radius, Particle.charge)
+        elif isinstance(synchronous_data, ring_programs.total_energy_program):
+            return rt.energy_to_momentum(
+                rt.momentum_to_energy(momentum, self.Particle.mass),
+                Particle.mass)
+        elif isinstance(synchronous_data,
+                        ring_programs.kinetic_energy_program):
+            return rt.kin_energy_to_momentum(
+                rt.momentum_to_kin_energy(momentum, self.Particle.mass),
+                Particle.mass)
+        else:
+            return momentum
+
     def _eta_generation(self):
         """ Function to generate the slippage factors (zeroth, first, and
         second orders, see [1]_) from the momentum compaction and the
@@ -541,6 +739,75 @@ class Ring:
                 self.alpha_0[i]**2 * self.eta_0[i] - 3 * self.beta[i]**2 * \
                 self.alpha_0[i] / (2 * self.gamma[i]**2)
 
+    def _preprocess(self, sample_func, interp_time, interpolation, start,
+                    stop, store_turns, cache):
+        """ Function to preprocess the synchronous data. If a cache is
+        defined, the preprocessed program is loaded from it when the same
+        inputs were already processed, and saved to it otherwise.
+        """
+
+        if cache is None:
+            return self.synchronous_data.preprocess(
+                self.Particle.mass,
+                self.circumference_design, sample_func,
+                interpolation, start, stop,
+                store_turns=store_turns, storage_dir=self.storage_dir)
+
+        if not isinstance(cache, ProgramCache):
+            cache = ProgramCache(cache)
+
+        key = cache.key(
+            np.asarray(self.synchronous_data),
+            repr(sorted(self.synchronous_data.data_type.items())),
+            self.Particle.mass, self.Particle.charge,
+            self.circumference_design, interp_time, start, stop,
+            interpolation, store_turns)
+
+        cached = cache.load(key)
+
+        if cached is None:
+            momentum_processed = self.synchronous_data.preprocess(
+                self.Particle.mass,
+                self.circumference_design, sample_func,
+                interpolation, start, stop,
+                store_turns=store_turns, storage_dir=self.storage_dir)
+            cache.save(key, momentum_processed=momentum_processed,
+                       n_turns=momentum_processed.n_turns)
+        else:
+            momentum_processed = self._store(
+                cached['momentum_processed'], 'momentum_program').view(
+                    ring_programs.momentum_program)
+            momentum_processed.n_turns = cached['n_turns'].item()
+
+        return momentum_processed
+
+    def _store(self, program, name):
+        """ Function to write a program to a memory mapped file if the
+        storage_dir option is defined, the program is returned unchanged
+        otherwise.
+        """
+
+        return _storage.store(program, self.storage_dir, name)
+
+    def _compress(self):
+        """ Function to replace all the programs sampled along the cycle
+        by compressed_program objects, within the compress_tolerance.
+        """
+
+        programs = ['cycle_time', 'momentum', 'beta', 'gamma', 'energy',
+                    'kin_energy', 'section_length', 'circumference',
+                    'radius', 'orbit_bump', 't_rev_design', 'f_rev_design',
+                    'omega_rev_design', 't_rev', 'f_rev', 'omega_rev',
+                    'delta_E']
+        programs += ['alpha_%d' % (order) for order in self.alpha_orders]
+        programs += ['eta_%d' % (order)
+                     for order in range(self.eta_orders + 1)
+                     if hasattr(self, 'eta_%d' % (order))]
+
+        for name in programs:
+            setattr(self, name, cprog.compressed_program(
+                getattr(self, name), self.compress_tolerance))
+
     def parameters_at_time(self, cycle_moments):
         """ Function to return various cycle parameters at a specific moment in
         time. The cycle time is defined to start at zero in turn zero.
@@ -559,6 +826,9 @@ class Ring:
 
         """
 
+        if isinstance(self.cycle_time, cprog.compressed_program):
+            return self._parameters_at_time_compressed(cycle_moments)
+
         parameters = {}
         parameters['momentum'] = np.interp(cycle_moments, self.cycle_time,
                                            self.momentum[0])
@@ -591,6 +861,26 @@ class Ring:
 
         return parameters
 
+    def _parameters_at_time_compressed(self, cycle_moments):
+        """ Equivalent of parameters_at_time evaluated from the knots of
+        the compressed programs, without decompressing them.
+        """
+
+        # The cycle_time is monotonic, the moments are converted to
+        # fractional sample numbers at which all programs are evaluated
+        samples = self.cycle_time.inverse(cycle_moments)
+
+        parameters = {}
+        for name in ['momentum', 'beta', 'gamma', 'energy', 'kin_energy',
+                     'eta_0', 'delta_E']:
+            parameters[name] = getattr(self, name).sample(samples, 0)
+        for name in ['f_rev', 't_rev', 'omega_rev']:
+            parameters[name] = getattr(self, name).sample(samples)
+        parameters['charge'] = self.Particle.charge
+        parameters['cycle_time'] = cycle_moments
+
+        return parameters
+
     def _no_parameters_at_turn(self, turn):
         raise RuntimeError("parameters_at_turn only available if " +
                            "store_turns = True at object declaration")
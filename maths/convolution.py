@@ -0,0 +1,133 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to compute linear convolutions with FFTs, e.g. of a profile with a
+wake**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import numpy as np
+import scipy.fft as sfft
+
+# Below this number of points of the shortest input, the convolution is
+# computed directly
+direct_threshold = 64
+
+
+def convolve(signal, kernel, n_output=None):
+    r"""
+    Function returning the first n_output points of the linear convolution
+    of signal and kernel, identical to np.convolve(signal, kernel)[:n_output].
+
+    Only the first n_output points of the kernel contribute to the output,
+    the FFT length is the next fast length above n_output+min(n_kernel,
+    n_output)-1. For short inputs, the convolution is computed directly.
+
+    Parameters
+    ----------
+    signal : np.array
+        The signal, e.g. the profile, or a 2D array with one signal per row
+    kernel : np.array
+        The kernel, e.g. the wake
+    n_output : int
+        Optional: The number of output points. The default is None, the full
+        convolution of len(signal)+len(kernel)-1 points is returned
+
+    Returns
+    -------
+    output : np.array
+        The convolution
+
+    Examples
+    --------
+    >>> induced = -convolve(profile, wake, len(profile))
+    """
+
+    return FFTConvolution(kernel).convolve(signal, n_output)
+
+
+class FFTConvolution:
+    r"""
+    Class to convolve several signals with the same kernel, the FFT of the
+    kernel is computed once for each FFT length and kept.
+
+    Parameters
+    ----------
+    kernel : np.array
+        The kernel, e.g. the wake
+
+    Attributes
+    ----------
+    kernel : np.array
+        The kernel
+
+    Examples
+    --------
+    >>> wake_convolution = FFTConvolution(wake)
+    >>> for profile in profiles:
+    >>>     induced = -wake_convolution.convolve(profile, len(profile))
+    """
+
+    def __init__(self, kernel):
+
+        self.kernel = np.asarray(kernel)
+        self._kernel_fft = {}
+
+    def convolve(self, signal, n_output=None):
+        r"""
+        The first n_output points of the convolution of signal with the
+        kernel, see blond_common.maths.convolution.convolve. The signal can
+        also be a 2D array with one signal per row, convolved along the last
+        axis.
+        """
+
+        signal = np.asarray(signal)
+        n_signal = signal.shape[-1]
+        n_kernel = len(self.kernel)
+
+        if n_output is None:
+            n_output = n_signal + n_kernel - 1
+
+        # Only the points up to n_output contribute
+        n_signal = min(n_signal, n_output)
+        n_kernel = min(n_kernel, n_output)
+
+        if min(n_signal, n_kernel) <= direct_threshold:
+            rows = signal.reshape(-1, signal.shape[-1])[:, :n_signal]
+            output = np.array([np.convolve(row, self.kernel[:n_kernel])
+                               for row in rows])
+            output = output.reshape(signal.shape[:-1] + (output.shape[-1],))
+        else:
+            n_fft = sfft.next_fast_len(n_signal + n_kernel - 1, real=True)
+            output = sfft.irfft(sfft.rfft(signal[..., :n_signal], n_fft)
+                                * self.kernel_fft(n_kernel, n_fft), n_fft)
+
+        if output.shape[-1] < n_output:
+            output = np.concatenate(
+                (output, np.zeros(output.shape[:-1]
+                                  + (n_output - output.shape[-1],))),
+                axis=-1)
+
+        return output[..., :n_output]
+
+    def kernel_fft(self, n_kernel, n_fft):
+        r"""
+        The rfft of the first n_kernel points of the kernel, zero padded to
+        n_fft points.
+        """
+
+        try:
+            return self._kernel_fft[(n_kernel, n_fft)]
+        except KeyError:
+            kernel_fft = sfft.rfft(self.kernel[:n_kernel], n_fft)
+            self._kernel_fft[(n_kernel, n_fft)] = kernel_fft
+            return kernel_fft
@@ -22,4 +22,39 @@ def prep_interp_cubic(x, y, bc_type='not-a-knot', extrapolate=None):
     
     return interp.CubicSpline(x, y, bc_type=bc_type, 
                               extrapolate = extrapolate)
-    
\ No newline at end of file
+    
+
+def piecewise_linear_knots(y, tolerance=0):
+    '''
+    Function returning the indices of the samples of y to be kept such that
+    linear interpolation between them reproduces y within the absolute
+    tolerance. The knots are found by recursive splitting of each segment at
+    its sample of largest vertical error (Ramer-Douglas-Peucker), the first
+    and last samples are always kept.
+    '''
+
+    y = np.asarray(y, dtype=float)
+    n_samples = len(y)
+
+    keep = np.zeros(n_samples, dtype=bool)
+    keep[[0, -1]] = True
+
+    segments = [(0, n_samples - 1)]
+    while segments:
+        start, stop = segments.pop()
+        if stop - start < 2:
+            continue
+
+        # Linear interpolation evaluated as done by np.interp
+        slope = (y[stop] - y[start]) / (stop - start)
+        error = np.abs(y[start:stop+1]
+                       - (slope * np.arange(stop - start + 1) + y[start]))
+
+        worst = np.argmax(error)
+        if error[worst] > tolerance:
+            split = start + worst
+            keep[split] = True
+            segments.append((start, split))
+            segments.append((split, stop))
+
+    return np.flatnonzero(keep)
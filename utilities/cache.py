@@ -0,0 +1,206 @@
+# coding: utf8
+# Copyright 2014-2020 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**On-disk, content-addressed cache of preprocessed arrays.**
+
+:Authors: **Simon Albright**, **Alexandre Lasheen**
+'''
+
+# General imports
+import os
+import hashlib
+import tempfile
+import numbers
+import numpy as np
+
+# BLonD_Common imports
+from ..devtools import path
+from ..devtools import exceptions as excpt
+
+# Version of the cached data, to be incremented whenever the preprocessing
+# or the stored format is modified so that previous entries are not reused
+cache_version = 1
+
+
+class ProgramCache:
+    r"""
+    Class managing a directory of .npz files, each identified by the hash
+    of all the inputs that were used to compute its content. The total size
+    of the directory is limited, the least recently used entries are deleted
+    first.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The directory in which the entries are stored, created if needed.
+    max_size : int
+        The maximum total size of the entries in bytes, the default is 1 GB.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The directory in which the entries are stored.
+    max_size : int
+        The maximum total size of the entries in bytes.
+
+    Examples
+    --------
+    >>> cache = ProgramCache('/tmp/blond_cache')
+    >>> key = cache.key(np.arange(10), 'linear', 1E-3)
+    >>> cache.save(key, data=np.arange(10)**2)
+    >>> cache.load(key)['data']
+    """
+
+    def __init__(self, cache_dir, max_size=2**30):
+
+        self.cache_dir = str(cache_dir)
+        self.max_size = int(max_size)
+
+        path.makedir(self.cache_dir)
+
+    @staticmethod
+    def key(*inputs):
+        r"""
+        Compute the sha256 hash identifying an entry from its inputs. The
+        arrays are hashed with their content, shape and dtype, the other
+        inputs with their repr.
+
+        Parameters
+        ----------
+        *inputs : arrays, numbers, str, tuples...
+            All the inputs determining the entry content.
+
+        Returns
+        -------
+        str
+            The hexadecimal digest.
+        """
+
+        digest = hashlib.sha256()
+        digest.update(repr(('cache_version', cache_version)).encode())
+
+        for item in inputs:
+            if isinstance(item, np.ndarray):
+                digest.update(repr((item.shape, item.dtype.str)).encode())
+                digest.update(np.ascontiguousarray(item).tobytes())
+            elif isinstance(item, (str, numbers.Number, tuple, list, dict,
+                                   type(None))):
+                digest.update(repr(item).encode())
+            else:
+                raise excpt.InputDataError("Cannot compute the cache key of "
+                                           + "an object of type "
+                                           + type(item).__name__)
+
+        return digest.hexdigest()
+
+    def file_name(self, key):
+        """
+        The path of the file corresponding to the key.
+        """
+
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def load(self, key):
+        r"""
+        Load an entry, its access time is updated for the LRU eviction.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        dict or None
+            The arrays stored in the entry, None if it does not exist or
+            cannot be read.
+        """
+
+        fileName = self.file_name(key)
+
+        try:
+            with np.load(fileName, allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files}
+        except (OSError, ValueError):
+            return None
+
+        os.utime(fileName)
+
+        return arrays
+
+    def save(self, key, **arrays):
+        r"""
+        Save the arrays in a new entry (replacing the previous one with the
+        same key), the least recently used entries are then evicted if the
+        total size exceeds max_size.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        **arrays : arrays
+            The arrays to be stored.
+        """
+
+        # Writing to a temporary file first so that concurrent processes
+        # never read a partially written entry
+        handle, tempName = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(handle, 'wb') as dataFile:
+                np.savez(dataFile, **arrays)
+            os.replace(tempName, self.file_name(key))
+        except BaseException:
+            if os.path.exists(tempName):
+                os.remove(tempName)
+            raise
+
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        r"""
+        Delete the least recently used entries until the total size is below
+        max_size.
+
+        Parameters
+        ----------
+        keep : str, optional
+            The key of an entry that should not be deleted.
+        """
+
+        entries = []
+        for fileName in os.listdir(self.cache_dir):
+            if not fileName.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, fileName))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fileName))
+
+        totalSize = sum(e[1] for e in entries)
+        for mtime, size, fileName in sorted(entries):
+            if totalSize <= self.max_size:
+                break
+            if keep is not None and fileName == keep + '.npz':
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, fileName))
+            except OSError:
+                continue
+            totalSize -= size
+
+    def clear(self):
+        """
+        Delete all entries.
+        """
+
+        for fileName in os.listdir(self.cache_dir):
+            if fileName.endswith('.npz'):
+                os.remove(os.path.join(self.cache_dir, fileName))